@@ -0,0 +1,160 @@
+"""
+Concurrent-request latency of the API, before and after moving work off the event loop.
+
+Writes synthetic ``solprices_df.csv`` / ``metadata_df.csv`` files to a
+temporary directory, then starts uvicorn twice on them: once with
+``benchmarks.legacy_app`` (pandas work inline in the handlers) and once with
+``main``. Each server gets the same load: ``--concurrency`` keep-alive
+connections cycling through a mix of heavy data endpoints and a trivial
+probe (``/``). The probe's latency is what a cheap request waits for while
+heavy ones share its worker.
+
+Run from ``back/``::
+
+    python -m benchmarks.bench_concurrency
+    python -m benchmarks.bench_concurrency --tokens 2000 --timestamps 800 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from state import good_tags
+from benchmarks.synthetic import make_metadata, make_prices
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS = {"before": "benchmarks.legacy_app:app", "after": "main:app"}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def fetch(reader, writer, path):
+    """One GET over a keep-alive HTTP/1.1 connection; returns the status code."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def run_load(port, paths, concurrency, duration):
+    """
+    Hit the server from ``concurrency`` connections for ``duration`` seconds.
+
+    Returns:
+        Dict of path to a list of latencies in seconds
+    """
+    latencies = {path: [] for path in paths}
+    deadline = time.perf_counter() + duration
+
+    async def client(offset):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            start = time.perf_counter()
+            status = await fetch(reader, writer, path)
+            if status != 200:
+                raise RuntimeError(f"{path} returned {status}")
+            latencies[path].append(time.perf_counter() - start)
+            i += 1
+        writer.close()
+
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    return latencies
+
+
+def start_server(app, port, data_dir):
+    env = dict(
+        os.environ,
+        PYTHONPATH=BACK_DIR,
+        PRICE_POLL_SECONDS="0",
+        SNAPSHOT_DIR=os.path.join(data_dir, ".snapshots"),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        cwd=data_dir, env=env, stdout=subprocess.DEVNULL,
+    )
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"{app} exited with {server.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+
+
+def percentiles(values):
+    ms = np.array(values) * 1000
+    return len(ms), np.percentile(ms, 50), np.percentile(ms, 95), np.percentile(ms, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--timestamps", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    tags = list(good_tags)[:20]
+    token_id = 10_000
+    paths = [
+        "/api/tokens?limit=30",
+        f"/api/tokens/{token_id}",
+        "/api/index/overall",
+        f"/api/index/tag/{tags[0]}",
+        "/api/best-performer",
+        "/api/market-chart-data?points=200",
+        "/api/market-state",
+        "/",
+        "/",
+        "/",
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_prices(args.tokens, args.timestamps).to_csv(os.path.join(tmp, "solprices_df.csv"), index=False)
+        make_metadata(args.tokens, tags=tags).to_csv(os.path.join(tmp, "metadata_df.csv"), index=False)
+        print(f"{args.tokens} tokens x {args.timestamps} snapshots, "
+              f"{args.concurrency} connections for {args.duration:.0f}s per server")
+
+        for label, app in APPS.items():
+            port = free_port()
+            server = start_server(app, port, tmp)
+            try:
+                # Warm up (first requests import lazily and fill caches)
+                asyncio.run(run_load(port, paths, 1, 1.0))
+                latencies = asyncio.run(run_load(port, paths, args.concurrency, args.duration))
+            finally:
+                server.terminate()
+                server.wait()
+
+            total = sum(len(values) for values in latencies.values())
+            print(f"\n{label} ({app}): {total / args.duration:.0f} req/s")
+            print(f"  {'endpoint':<36} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            for path in dict.fromkeys(paths):
+                n, p50, p95, p99 = percentiles(latencies[path])
+                print(f"  {path:<36} {n:>6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
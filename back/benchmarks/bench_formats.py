@@ -0,0 +1,82 @@
+"""
+Payload size and encode time of the response formats for the bulk endpoints.
+
+Builds a synthetic overall index and token listing and encodes them the way
+the endpoints used to (``to_dict(orient="records")`` through FastAPI's
+``jsonable_encoder`` and ``JSONResponse``), as pre-encoded records, and in
+each columnar media type available here (see columnar.py). Sizes are given
+raw and gzipped.
+
+Run from ``back/``::
+
+    python -m benchmarks.bench_formats
+    python -m benchmarks.bench_formats --tokens 5000 --timestamps 3000
+"""
+import argparse
+import gzip
+import json
+import warnings
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from calculations import mcap_weighted_index, token_metrics
+from columnar import COLUMNS_JSON, MEDIA_TYPES, encode_columns
+from series import IndexSeries
+from state import build_token_df, encode_records, good_tags
+from token_index import TokenIndex, dumps
+from benchmarks.bench_index import best_of
+from benchmarks.synthetic import make_metadata, make_prices
+
+
+def report(name, encoders, repeat):
+    print(f"\n{name}")
+    print(f"  {'format':<40} {'bytes':>10} {'gzip':>10} {'encode ms':>10}")
+    for label, encode in encoders.items():
+        elapsed, body = best_of(encode, repeat)
+        print(f"  {label:<40} {len(body):>10} {len(gzip.compress(body)):>10} {elapsed * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--timestamps", type=int, default=2920)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", FutureWarning)
+    prices = make_prices(args.tokens, args.timestamps, as_strings=False)
+    metadata = make_metadata(args.tokens, tags=list(good_tags)[:20])
+    overall_index = mcap_weighted_index(prices)
+    series = IndexSeries.from_frame(overall_index)
+    token_index = TokenIndex(build_token_df(metadata, token_metrics(prices, overall_index)), good_tags)
+    columnar_types = [media_type for media_type in MEDIA_TYPES if media_type != "application/json"]
+    print(f"{len(overall_index)} index rows, {token_index.total} tokens; columnar types: {', '.join(columnar_types)}")
+
+    index_encoders = {
+        "records, to_dict + jsonable_encoder": lambda: JSONResponse(jsonable_encoder(overall_index.to_dict(orient="records"))).body,
+        "records, encode_records": lambda: encode_records(overall_index),
+    }
+    for media_type in columnar_types:
+        index_encoders[media_type] = lambda media_type=media_type: series.encode(media_type)
+    report("/api/index/overall", index_encoders, args.repeat)
+
+    limit = token_index.total
+    token_encoders = {
+        "records, jsonable_encoder": lambda: JSONResponse(jsonable_encoder(token_index.page(0, limit))).body,
+        "records, pre-encoded page_json": lambda: token_index.page_json(0, limit),
+    }
+    for media_type in columnar_types:
+        token_encoders[media_type] = lambda media_type=media_type: encode_columns(
+            token_index.page_columns(0, limit), media_type, {"total": token_index.total})
+    report(f"/api/tokens?limit={limit}", token_encoders, args.repeat)
+
+    # Same values either way
+    columns = token_index.page_columns(0, limit)
+    assert dumps([dict(zip(columns, row)) for row in zip(*columns.values())]) == dumps(token_index.page(0, limit)["tokens"])
+    decoded = json.loads(series.encode(COLUMNS_JSON))["columns"]
+    assert [dict(zip(decoded, row)) for row in zip(*decoded.values())] == json.loads(encode_records(overall_index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark of incremental snapshot updates.
+
+Bootstraps ``IncrementalEngine`` from histories of growing length, times
+appending the same number of new snapshots to each, and checks the result
+against a full batch recomputation over the whole history.
+
+Run from ``back/``::
+
+    python -m benchmarks.bench_incremental
+    python -m benchmarks.bench_incremental --tokens 1000 --history 500 2000 8000
+"""
+import argparse
+import time
+import warnings
+
+import pandas as pd
+
+from calculations import mcap_weighted_index, mcap_weighted_tag_indices, token_metrics
+from incremental import IncrementalEngine
+from benchmarks.bench_index import assert_same_index
+from benchmarks.bench_metrics import assert_same_metrics
+from benchmarks.synthetic import make_metadata, make_prices, make_tags
+
+
+def check_against_batch(engine, prices, metadata, tags):
+    overall_index = mcap_weighted_index(prices)
+    assert_same_index(overall_index, engine.overall_index)
+    tag_indices = mcap_weighted_tag_indices(prices, metadata, tags)
+    assert set(tag_indices) == set(engine.tag_indices)
+    for tag, index_df in tag_indices.items():
+        assert_same_index(index_df, engine.tag_indices[tag])
+    assert_same_metrics(
+        token_metrics(prices, overall_index).sort_values('id', ignore_index=True),
+        engine.token_metrics_df.sort_values('id', ignore_index=True),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--tags", type=int, default=20)
+    parser.add_argument("--history", type=int, nargs="+", default=[250, 1000, 3000],
+                        help="timestamps already in the engine before appending")
+    parser.add_argument("--snapshots", type=int, default=20, help="new snapshots appended one by one")
+    parser.add_argument("--skip-check", action="store_true", help="skip the batch recomputation check")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", FutureWarning)
+    metadata = make_metadata(args.tokens, n_tags=args.tags)
+    tags = make_tags(args.tags)
+    print(f"{'history':>8} {'bootstrap (s)':>14} {'append (ms/snapshot)':>21} {'full rebuild (s)':>17}")
+    for history in args.history:
+        prices = make_prices(args.tokens, history + args.snapshots)
+        timestamps = pd.to_datetime(prices['timestamp'])
+        cut = timestamps.drop_duplicates().sort_values().iloc[history]
+
+        start = time.perf_counter()
+        engine = IncrementalEngine(prices[timestamps < cut], metadata, tags)
+        bootstrap_time = time.perf_counter() - start
+
+        new_rows = prices[timestamps >= cut]
+        start = time.perf_counter()
+        for _, snapshot in new_rows.groupby('timestamp', sort=True):
+            engine.append(snapshot)
+        append_time = (time.perf_counter() - start) / args.snapshots
+
+        start = time.perf_counter()
+        IncrementalEngine(prices, metadata, tags)
+        rebuild_time = time.perf_counter() - start
+        if not args.skip_check:
+            check_against_batch(engine, prices, metadata, tags)
+        print(f"{history:>8} {bootstrap_time:>14.3f} {append_time * 1000:>21.2f} {rebuild_time:>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
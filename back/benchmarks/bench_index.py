@@ -0,0 +1,65 @@
+"""
+Benchmark of the market cap weighted index engine.
+
+Times ``calculations.mcap_weighted_index`` against the original
+groupby-apply implementation over a grid of token x timestamp counts and
+checks that both return the same numbers.
+
+Run from ``back/``::
+
+    python -m benchmarks.bench_index
+    python -m benchmarks.bench_index --tokens 100 1000 --timestamps 500 3000
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from calculations import mcap_weighted_index
+from benchmarks import reference
+from benchmarks.synthetic import make_prices
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def assert_same_index(expected, actual):
+    assert list(expected.columns) == list(actual.columns), (expected.columns, actual.columns)
+    assert (expected['timestamp'].values == actual['timestamp'].values).all()
+    for column in expected.columns.drop('timestamp'):
+        np.testing.assert_allclose(actual[column].values, expected[column].values, rtol=1e-12, atol=1e-15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--timestamps", type=int, nargs="+", default=[240, 1000, 3000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-reference", action="store_true",
+                        help="only time the vectorized engine")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", FutureWarning)
+    print(f"{'tokens':>7} {'stamps':>7} {'rows':>10} {'apply (s)':>10} {'vector (s)':>11} {'speedup':>8}")
+    for n_tokens in args.tokens:
+        for n_timestamps in args.timestamps:
+            prices = make_prices(n_tokens, n_timestamps)
+            new_time, new_result = best_of(lambda: mcap_weighted_index(prices), args.repeat)
+            if args.skip_reference:
+                old_time = float("nan")
+            else:
+                old_time, old_result = best_of(lambda: reference.calculate_mcap_weighted_index(prices), 1)
+                assert_same_index(old_result, new_result)
+            print(f"{n_tokens:>7} {n_timestamps:>7} {len(prices):>10} {old_time:>10.3f} "
+                  f"{new_time:>11.3f} {old_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
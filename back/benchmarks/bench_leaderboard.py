@@ -0,0 +1,59 @@
+"""
+Incremental top-K leaderboard vs. re-sorting every token on each refresh.
+
+For growing token universes, changes the scores of a fraction of the tokens
+(like one price snapshot touching the tokens that traded) and times reading
+the top K from ``TopK`` against ``sorted`` over all scores, checking both
+agree.
+
+Run from ``back/``::
+
+    python -m benchmarks.bench_leaderboard
+    python -m benchmarks.bench_leaderboard --tokens 1000 100000 --touched 0.01
+"""
+import argparse
+import time
+
+import numpy as np
+
+from leaderboard import LEADERBOARD_SIZE, TopK
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--touched", type=float, default=0.05, help="fraction of tokens updated per refresh")
+    parser.add_argument("--refreshes", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'tokens':>8} {'full sort (ms)':>15} {'TopK (ms)':>10} {'speedup':>8}")
+    for n_tokens in args.tokens:
+        scores = dict(enumerate(np.round(rng.normal(0, 30, n_tokens), 2).tolist()))
+        board = TopK(LEADERBOARD_SIZE)
+        board.update(scores.items())
+        board.top()
+
+        sort_time = topk_time = 0.0
+        for _ in range(args.refreshes):
+            ids = rng.choice(n_tokens, size=max(1, int(n_tokens * args.touched)), replace=False).tolist()
+            changes = [(token_id, round(scores[token_id] + rng.normal(0, 10), 2)) for token_id in ids]
+            scores.update(changes)
+
+            start = time.perf_counter()
+            expected = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:LEADERBOARD_SIZE]
+            sort_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            board.update(changes)
+            top = board.top()
+            topk_time += time.perf_counter() - start
+            assert top == expected
+
+        sort_ms = sort_time / args.refreshes * 1000
+        topk_ms = topk_time / args.refreshes * 1000
+        print(f"{n_tokens:>8} {sort_ms:>15.2f} {topk_ms:>10.2f} {sort_ms / topk_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Cold vs warm load timings of the columnar frame cache.
+
+Writes a synthetic ``solprices_df.csv`` to a temporary directory and times
+the plain ``read_csv`` + ``to_datetime`` path the app used to take, a
+cold ``load_frame`` (parse and build the cache) and a warm one (cache hit).
+
+Run from ``back/``::
+
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --tokens 1200 --timestamps 3000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from frame_cache import CACHE_FORMAT, load_frame, prepare_prices
+from benchmarks.synthetic import make_prices
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--timestamps", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "solprices_df.csv")
+        make_prices(args.tokens, args.timestamps).to_csv(path, index=False)
+        print(f"{os.path.getsize(path) / 1e6:.1f} MB CSV, cache format: {CACHE_FORMAT}")
+
+        def csv_path():
+            df = pd.read_csv(path)
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            return df
+
+        csv_time, expected = timed(csv_path)
+        cold_time, (cold, _) = timed(lambda: load_frame(path, prepare_prices))
+        warm_time, (warm, _) = timed(lambda: load_frame(path, prepare_prices))
+        assert warm.equals(cold)
+        assert (warm['timestamp'].values == expected['timestamp'].values).all()
+
+        print(f"read_csv + to_datetime: {csv_time:8.3f} s")
+        print(f"cold load (+ cache):    {cold_time:8.3f} s")
+        print(f"warm load:              {warm_time:8.3f} s  ({csv_time / warm_time:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
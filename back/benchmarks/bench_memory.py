@@ -0,0 +1,131 @@
+"""
+Boot time and resident memory per API worker for each way of loading the state.
+
+Writes synthetic CSVs to a temporary directory, builds their state snapshot
+once (``snapshot.py build``) and starts ``--workers`` processes that import
+the app, the way uvicorn workers do:
+
+- ``build per worker``: no snapshot, every worker computes the state itself
+- ``private float64``: workers load the snapshot and copy the price history
+  into their own float64 arrays, as each one held it before
+- ``mapped float32``: workers load the snapshot and serve its read-only
+  float32 price arrays, which the page cache shares between them
+- ``attached``: ``STATE_MODE=attach`` workers load the state a builder
+  published (see shared_state.py) and never touch the inputs
+
+All of them touch the whole price history, like requests eventually do.
+
+Memory is read from ``/proc/<pid>/smaps_rollup``: RSS counts shared pages in
+full for every worker, PSS splits them between the processes mapping them,
+so the PSS total is what the workers really cost together.
+
+Run from ``back/``::
+
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory --tokens 2000 --timestamps 2920 --workers 8
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_metadata, make_prices
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import dataclasses, sys, time
+start = time.perf_counter()
+import numpy as np
+sys.path.insert(0, {back_dir!r})
+import main
+from price_store import PriceStore
+
+store = main.refresher.state.price_store
+if {private!r}:
+    store = PriceStore(np.array(store.ids), np.array(store.offsets), np.array(store.timestamps),
+                       store.prices.astype(np.float64))
+    main.refresher.market.price_store = store
+    main.refresher.state = main.refresher.market.state = dataclasses.replace(main.refresher.state, price_store=store)
+float(store.timestamps.sum()), float(store.prices.sum())
+print("ready", time.perf_counter() - start, flush=True)
+sys.stdin.read()
+"""
+
+
+def memory_kb(pid):
+    """Rss, Pss and shared kB of a process (Pss and shared only where smaps_rollup exists)."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as rollup:
+            fields = dict(line.split(":", 1) for line in rollup if ":" in line and not line.startswith(" "))
+        kb = {name: int(value.split()[0]) for name, value in fields.items() if value.strip().endswith("kB")}
+        return kb["Rss"], kb["Pss"], kb["Shared_Clean"] + kb["Shared_Dirty"]
+    except FileNotFoundError:
+        with open(f"/proc/{pid}/status") as status:
+            rss = next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+        return rss, None, None
+
+
+def measure(tmp, workers, private=False, **env):
+    """Boot seconds and ``memory_kb`` of each of ``workers`` app processes started together."""
+    env = dict(os.environ, PRICE_POLL_SECONDS="0", STATE_REBUILD_SECONDS="0", **env)
+    code = WORKER.format(back_dir=BACK_DIR, private=private)
+    processes = [
+        subprocess.Popen([sys.executable, "-c", code], cwd=tmp, env=env, text=True,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        for _ in range(workers)
+    ]
+    try:
+        boot = []
+        for process in processes:
+            line = process.stdout.readline()
+            while not line.startswith("ready"):
+                if process.poll() is not None:
+                    raise RuntimeError("worker exited before loading the state")
+                line = process.stdout.readline()
+            boot.append(float(line.split()[1]))
+        return boot, [memory_kb(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--timestamps", type=int, default=2920)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_prices(args.tokens, args.timestamps).to_csv(os.path.join(tmp, "solprices_df.csv"), index=False)
+        make_metadata(args.tokens).to_csv(os.path.join(tmp, "metadata_df.csv"), index=False)
+        subprocess.run([sys.executable, os.path.join(BACK_DIR, "snapshot.py"), "build"], cwd=tmp, check=True)
+        publish = f"import sys; sys.path.insert(0, {BACK_DIR!r}); from shared_state import publish; from snapshot import load_or_build; publish(load_or_build().state)"
+        subprocess.run([sys.executable, "-c", publish], cwd=tmp, check=True, stdout=subprocess.DEVNULL)
+
+        layouts = {
+            "build per worker": lambda: measure(tmp, args.workers, SNAPSHOT_DIR=f"empty-{time.time_ns()}"),
+            "private float64": lambda: measure(tmp, args.workers, private=True),
+            "mapped float32": lambda: measure(tmp, args.workers),
+            "attached": lambda: measure(tmp, args.workers, STATE_MODE="attach"),
+        }
+        print(f"\n{args.workers} workers{'':<12} {'boot s':>7} {'RSS/worker MB':>14} {'PSS/worker MB':>14} "
+              f"{'shared/worker MB':>17} {'PSS total MB':>13}")
+        for label, run in layouts.items():
+            boot, usage = run()
+            boot = sum(boot) / len(boot)
+            rss = sum(u[0] for u in usage) / len(usage) / 1024
+            if usage[0][1] is None:
+                print(f"{label:<22} {boot:>7.2f} {rss:>14.1f} {'n/a':>14} {'n/a':>17} {'n/a':>13}")
+                continue
+            pss = [u[1] / 1024 for u in usage]
+            shared = sum(u[2] for u in usage) / len(usage) / 1024
+            print(f"{label:<22} {boot:>7.2f} {rss:>14.1f} {sum(pss) / len(pss):>14.1f} {shared:>17.1f} {sum(pss):>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark and equivalence check of the cross-sectional token metrics engine.
+
+Times ``calculations.token_metrics`` against the original per-token loop
+(one filter, merge and ``LinearRegression`` fit per token) and checks
+that both return the same rounded metrics for every token.
+
+Run from ``back/``::
+
+    python -m benchmarks.bench_metrics
+    python -m benchmarks.bench_metrics --tokens 200 1000 --timestamps 500
+"""
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from calculations import mcap_weighted_index, token_metrics
+from benchmarks import reference
+from benchmarks.bench_index import best_of
+from benchmarks.synthetic import make_prices
+
+METRIC_COLUMNS = ['usens', 'dsens', 'beta', 'change24h', 'change7d', 'overbought_coef']
+
+
+def assert_same_metrics(expected, actual):
+    """
+    Rounded metrics must match exactly, except beta, whose closed-form slope
+    may differ from the sklearn fit in the last bits and so land on the other
+    side of a rounding boundary (off by one cent at most).
+    """
+    assert list(expected.columns) == list(actual.columns), (expected.columns, actual.columns)
+    assert (expected['id'].values == actual['id'].values).all()
+    for column in METRIC_COLUMNS:
+        a, b = expected[column].values.astype(float), actual[column].values.astype(float)
+        same = (a == b) | (np.isnan(a) & np.isnan(b))
+        if column == 'beta':
+            assert (same | (np.abs(a - b) <= 0.010000001)).all(), column
+        else:
+            assert same.all(), (column, np.flatnonzero(~same)[:10])
+
+
+def make_edge_cases(prices):
+    """
+    Sprinkle the missing values and short histories real data has into ``prices``,
+    plus a token seen once and one whose price never moves.
+    """
+    rng = np.random.default_rng(1)
+    prices = prices.copy()
+    prices.loc[rng.random(len(prices)) < 0.01, 'price'] = np.nan
+    prices.loc[rng.random(len(prices)) < 0.01, 'volume_24h'] = np.nan
+    # A handful of freshly listed tokens with fewer than 10 / 56 / 90 rows, one
+    # seen only once, and one whose price never moves
+    latest = prices['timestamp'].sort_values().unique()
+    for token_id, n_rows in zip(range(1, 8), (5, 12, 60, 95, 9, 1, 100)):
+        rows = prices.iloc[:n_rows].copy()
+        rows['id'] = token_id
+        rows['timestamp'] = latest[-n_rows:]
+        if token_id == 7:
+            rows['price'] = 1.5
+        prices = pd.concat([prices, rows], ignore_index=True)
+    return prices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--timestamps", type=int, nargs="+", default=[240, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-reference", action="store_true",
+                        help="only time the vectorized engine")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", FutureWarning)
+    print(f"{'tokens':>7} {'stamps':>7} {'loop (s)':>9} {'vector (s)':>11} {'speedup':>8}")
+    for n_tokens in args.tokens:
+        for n_timestamps in args.timestamps:
+            prices = make_edge_cases(make_prices(n_tokens, n_timestamps))
+            market_index = mcap_weighted_index(prices)
+            new_time, new_result = best_of(lambda: token_metrics(prices, market_index), args.repeat)
+            if args.skip_reference:
+                old_time = float("nan")
+            else:
+                old_time, old_result = best_of(
+                    lambda: reference.calculate_token_metrics(market_index, prices), 1)
+                assert_same_metrics(old_result, new_result)
+            print(f"{n_tokens:>7} {n_timestamps:>7} {old_time:>9.3f} {new_time:>11.3f} "
+                  f"{old_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
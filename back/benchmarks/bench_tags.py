@@ -0,0 +1,61 @@
+"""
+Benchmark of the batched tag index engine.
+
+Times ``calculations.mcap_weighted_tag_indices`` against one
+``calculate_mcap_weighted_index_by_tag`` rescan per tag (as ``main.py``
+used to do at startup) for a growing number of tags, and checks that
+both produce the same indices.
+
+Run from ``back/``::
+
+    python -m benchmarks.bench_tags
+    python -m benchmarks.bench_tags --tokens 1000 --timestamps 1000 --tags 5 20 55
+"""
+import argparse
+import warnings
+
+from calculations import mcap_weighted_tag_indices
+from benchmarks import reference
+from benchmarks.bench_index import assert_same_index, best_of
+from benchmarks.synthetic import make_metadata, make_prices, make_tags
+
+
+def per_tag_loop(prices, metadata, tags):
+    indices = {}
+    for tag in tags:
+        tag_index = reference.calculate_mcap_weighted_index_by_tag(tag, prices, metadata)
+        if not tag_index.empty:
+            indices[tag] = tag_index
+    return indices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--timestamps", type=int, default=500)
+    parser.add_argument("--tags", type=int, nargs="+", default=[5, 20, 55])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-reference", action="store_true",
+                        help="only time the batched engine")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", FutureWarning)
+    prices = make_prices(args.tokens, args.timestamps)
+    print(f"{len(prices)} price rows, {args.tokens} tokens, {args.timestamps} timestamps")
+    print(f"{'tags':>5} {'per-tag (s)':>12} {'batched (s)':>12} {'speedup':>8}")
+    for n_tags in args.tags:
+        metadata = make_metadata(args.tokens, n_tags=n_tags)
+        tags = make_tags(n_tags)
+        new_time, new_result = best_of(lambda: mcap_weighted_tag_indices(prices, metadata, tags), args.repeat)
+        if args.skip_reference:
+            old_time = float("nan")
+        else:
+            old_time, old_result = best_of(lambda: per_tag_loop(prices, metadata, tags), 1)
+            assert list(old_result) == list(new_result)
+            for tag in old_result:
+                assert_same_index(old_result[tag], new_result[tag])
+        print(f"{n_tags:>5} {old_time:>12.3f} {new_time:>12.3f} {old_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+The data endpoints as they were before their work moved off the event loop.
+
+Same state as ``main`` (importing it loads or builds the state), but every
+request redoes the pandas work inline in its ``async def`` handler:
+``iterrows`` formatting for ``/api/tokens``, a boolean scan for a single
+token, ``to_dict(orient="records")`` for the indices and the per-tag loop of
+``/api/best-performer``. Only used as the "before" side of
+``benchmarks.bench_concurrency``::
+
+    uvicorn benchmarks.legacy_app:app
+"""
+from fastapi import FastAPI
+
+import main
+from state import good_tags
+
+app = FastAPI(title="Legacy endpoints")
+
+
+@app.get("/")
+async def root():
+    return {"message": "Welcome to the Web3 Material Backend API"}
+
+
+@app.get("/api/tokens")
+async def get_tokens(skip: int = 0, limit: int = 30):
+    formatted_tokens = []
+    for _, row in main.current_state().token_df.iterrows():
+        formatted_token = {
+            "id": row['id'],
+            "name": row['name'],
+            "symbol": row['symbol'],
+            "fdv": row['fdv'] if 'fdv' in row else 0,
+            "change24h": row['change24h'],
+            "change7d": row['change7d'],
+            "underScore": int(row['usens'] * 100),
+            "scoreRating": "Great" if row['usens'] > 0.7 else "Good" if row['usens'] > 0.5 else "Fair",
+            "tags": [tag.strip() for tag in row['tags'].split(',') if isinstance(row['tags'], str) and tag.strip() in good_tags] if isinstance(row['tags'], str) else [],
+            "usens": row['usens'],
+            "dsens": row['dsens'],
+            "beta": row['beta'],
+            "betaDesc": "HR" if row['beta'] > 2.0 else "MR" if row['beta'] > 1.0 else "LR",
+            "overboughtOversold": row['overbought_coef']
+        }
+        formatted_tokens.append(formatted_token)
+    sorted_tokens = sorted(formatted_tokens, key=lambda x: x["underScore"], reverse=True)
+    return {"tokens": sorted_tokens[skip:skip+limit], "total": len(sorted_tokens)}
+
+
+@app.get("/api/tokens/{token_id}")
+async def get_token(token_id: str):
+    token_df = main.current_state().token_df
+    token_data = token_df[token_df['id'] == int(token_id)]
+    if token_data.empty:
+        return {"error": "Token not found"}
+    token_data = token_data.iloc[0].to_dict()
+    return {
+        "id": token_data['id'],
+        "name": token_data['name'],
+        "symbol": token_data['symbol'],
+        "fdv": token_data['fdv'] if 'fdv' in token_data else 0,
+        "change24h": token_data['change24h'],
+        "change7d": token_data['change7d'],
+        "underScore": int(token_data['usens'] * 100) if 'usens' in token_data else 0,
+        "scoreRating": "Great" if token_data['usens'] > 0.7 else "Good" if token_data['usens'] > 0.5 else "Fair",
+        "tags": token_data['tags'].split(',') if isinstance(token_data['tags'], str) else [],
+        "usens": token_data['usens'],
+        "dsens": token_data['dsens'],
+        "beta": token_data['beta'],
+        "betaDesc": "HR" if token_data['beta'] > 2.0 else "MR" if token_data['beta'] > 1.0 else "LR",
+        "overboughtOversold": token_data['overbought_coef']
+    }
+
+
+@app.get("/api/market-state")
+async def get_market_state():
+    return {
+        "name": "Comeback",
+        "status": "Comeback",
+        "changePercent": main.current_state().overall_index["index_return"].iloc[-8:].sum() * 100,
+        "indexName": "Solana Leaders Index"
+    }
+
+
+@app.get("/api/market-chart-data")
+async def get_chart_data(points: int = 20):
+    last_n_points = main.current_state().overall_index.iloc[-points:].reset_index()
+    min_value = last_n_points["index_value"].min()
+    max_value = last_n_points["index_value"].max()
+    chart_data = []
+    for i in range(len(last_n_points)):
+        normalized_value = 0
+        if max_value > min_value:
+            normalized_value = ((last_n_points["index_value"].iloc[i] - min_value) /
+                                (max_value - min_value)) * 100
+        chart_data.append({"x": i, "y": normalized_value})
+    return chart_data
+
+
+@app.get("/api/best-performer")
+async def get_best_performer():
+    best_tag = None
+    best_change24h = -float('inf')
+    best_change7d = -float('inf')
+    for tag, index_df in main.current_state().tag_indices.items():
+        if len(index_df) >= 2:
+            change24h = index_df["index_return"].iloc[-8:].sum() * 100
+            last_n = min(7, len(index_df))
+            change7d = ((1 + index_df["index_return"].iloc[-last_n:]).prod() - 1) * 100
+            if change24h > best_change24h:
+                best_tag = tag
+                best_change24h = change24h
+                best_change7d = change7d
+    if best_tag:
+        return {
+            "id": best_tag.lower().replace(" ", "-"),
+            "name": best_tag.title(),
+            "change24h": round(best_change24h, 2),
+            "change7d": round(best_change7d, 2)
+        }
+    return {"id": "defi", "name": "DeFi", "change24h": 15.8, "change7d": 42.3}
+
+
+@app.get("/api/market-heatmap")
+async def get_market_heatmap():
+    return main.current_state().heatmap_markets
+
+
+@app.get("/api/index/overall")
+async def get_overall_index():
+    return main.current_state().overall_index.to_dict(orient="records")
+
+
+@app.get("/api/index/tag/{tag}")
+async def get_tag_index(tag: str):
+    tag_indices = main.current_state().tag_indices
+    if tag in tag_indices:
+        return tag_indices[tag].to_dict(orient="records")
+    return {"error": f"No index data available for tag: {tag}"}
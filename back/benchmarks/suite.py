@@ -0,0 +1,287 @@
+"""
+Benchmark suite: precalc micro-benchmarks and in-process HTTP load, saved as JSON.
+
+Generates a synthetic universe (see synthetic.py) of ``--tokens`` tokens,
+``--timestamps`` 3-hour snapshots and ``--tags`` tags, then
+
+- times each precalc engine (the functions behind ``precalc.py``'s
+  ``calculate_mcap_weighted_index``, ``calculate_mcap_weighted_index_by_tag``
+  and ``calculate_token_metrics``) and the structures the served state is
+  built from, best of ``--repeat`` runs; ``--reference`` adds the original
+  implementations from reference.py;
+- imports the app on the same data and sends ``--requests`` requests per
+  endpoint through ``httpx.ASGITransport`` (no sockets, no server process)
+  from ``--concurrency`` concurrent clients, recording throughput and
+  latency percentiles.
+
+Results go to ``benchmarks/results/<commit>.json`` (or ``--output``) along
+with the parameters, commit and library versions. ``--compare`` prints the
+change between two result files so a regression shows up next to the commit
+that caused it.
+
+Run from ``back/``::
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --tokens 2000 --timestamps 2920 --tags 40 --requests 500
+    python -m benchmarks.suite --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from calculations import mcap_weighted_index, mcap_weighted_tag_indices, token_metrics
+from frame_cache import load_frame, prepare_metadata, prepare_prices
+from incremental import IncrementalEngine
+from leaderboard import OverboughtLeaderboards
+from price_store import PriceStore, price_dynamics
+from series import IndexSeries
+from state import MarketData, build_token_df, collect_tags, good_tags, listing_tags
+from token_index import TokenIndex
+from benchmarks import reference
+from benchmarks.synthetic import write_dataset
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Relative change --compare reports as a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+def best_of(fn, repeat, setup=None):
+    """Fastest of ``repeat`` runs of ``fn(setup())`` (or ``fn()``); setup isn't timed."""
+    timings = []
+    for _ in range(repeat):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def micro_benchmarks(prices_path, metadata_path, repeat, include_reference):
+    """Seconds per call of each precalc step, keyed by name."""
+    prices, _ = load_frame(prices_path, prepare_prices)
+    metadata, _ = load_frame(metadata_path, prepare_metadata)
+    tags = [tag for tag in collect_tags(metadata) if tag in good_tags]
+    overall = mcap_weighted_index(prices)
+    metrics = token_metrics(prices, overall)
+
+    last = prices['timestamp'].max()
+    history, snapshot = prices[prices['timestamp'] < last], prices[prices['timestamp'] == last]
+    token_df = build_token_df(metadata, metrics)
+    token_index = TokenIndex(token_df, good_tags)
+    store = PriceStore.from_frame(prices)
+    series = IndexSeries.from_frame(overall)
+    token_id = int(metrics['id'].iloc[0])
+
+    cases = {
+        "load_frame (cached)": lambda: load_frame(prices_path, prepare_prices),
+        "mcap_weighted_index": lambda: mcap_weighted_index(prices),
+        "mcap_weighted_index_by_tag (one tag)": lambda: mcap_weighted_tag_indices(prices, metadata, tags[:1]),
+        "mcap_weighted_tag_indices (all tags)": lambda: mcap_weighted_tag_indices(prices, metadata, tags),
+        "token_metrics": lambda: token_metrics(prices, overall),
+        "MarketData.build": lambda: MarketData.build(prices_path, metadata_path),
+        "TokenIndex": lambda: TokenIndex(token_df, good_tags),
+        "TokenIndex.select": lambda: token_index.select(tags=tags[:1], sort=(("change24h", True),)),
+        "OverboughtLeaderboards": lambda: OverboughtLeaderboards({}, listing_tags(metadata)).update(metrics),
+        "PriceStore.from_frame": lambda: PriceStore.from_frame(prices),
+        "price_dynamics": lambda: price_dynamics(store, token_id, series, None, 30),
+        "IndexSeries.query (1d, 500 points)": lambda: series.query(None, None, pd.Timedelta("1d").value, 500, "lttb"),
+    }
+    results = {name: best_of(fn, repeat) for name, fn in cases.items()}
+    results["IncrementalEngine.append (one snapshot)"] = best_of(
+        lambda engine: engine.append(snapshot), repeat,
+        setup=lambda: IncrementalEngine(history, metadata, tags),
+    )
+    if include_reference:
+        raw = prices.assign(id=prices['id'].astype(np.int64))
+        results["reference calculate_mcap_weighted_index"] = best_of(
+            lambda: reference.calculate_mcap_weighted_index(raw), 1)
+        results["reference calculate_mcap_weighted_index_by_tag (one tag)"] = best_of(
+            lambda: reference.calculate_mcap_weighted_index_by_tag(tags[0], raw, metadata), 1)
+        results["reference calculate_token_metrics"] = best_of(
+            lambda: reference.calculate_token_metrics(overall, raw), 1)
+    return results
+
+
+def endpoints(state):
+    """Paths of the main endpoints, with parameters that hit real data."""
+    token_id = int(state.token_metrics_df['id'].iloc[0])
+    tag = next(iter(state.tag_series), "memes")
+    return [
+        "/api/tokens",
+        f"/api/tokens?tag={tag}&sort=change24h:desc&limit=50",
+        f"/api/tokens/{token_id}",
+        "/api/market-state",
+        "/api/overbought",
+        "/api/oversold",
+        "/api/market-chart-data",
+        "/api/best-performer",
+        "/api/market-heatmap",
+        f"/api/top-market-tokens/{tag}",
+        f"/api/price-dynamics/{token_id}",
+        "/api/index/overall",
+        "/api/index/overall?resolution=1d",
+        f"/api/index/tag/{tag}?points=200",
+    ]
+
+
+async def load_test(app, path, requests, concurrency):
+    """Send ``requests`` GETs of ``path`` from ``concurrency`` clients; throughput and latencies."""
+    import httpx
+
+    latencies = []
+    remaining = iter(range(requests))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} answered {response.status_code}")
+                # Endpoints report bad parameters as a 200 with an error body
+                body = response.json()
+                if isinstance(body, dict) and "error" in body:
+                    raise RuntimeError(f"{path} answered {body['error']!r}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "requests_per_second": requests / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def http_benchmarks(data_dir, requests, concurrency):
+    """Import the app on ``data_dir`` and load-test each endpoint in ``endpoints``."""
+    os.environ.update(PRICE_POLL_SECONDS="0", SNAPSHOT_DIR=os.path.join(data_dir, ".snapshots"))
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main
+    finally:
+        os.chdir(cwd)
+    state = main.current_state()
+
+    async def run_all():
+        results = {}
+        for path in endpoints(state):
+            await load_test(main.app, path, min(requests, 20), concurrency)  # warm the response cache
+            results[path] = await load_test(main.app, path, requests, concurrency)
+        return results
+
+    return asyncio.run(run_all())
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old_path, new_path):
+    """Print the change of every result between two suite runs."""
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    if old['meta']['params'] != new['meta']['params']:
+        print(f"warning: parameters differ: {old['meta']['params']} vs {new['meta']['params']}")
+
+    regressions = 0
+    print(f"\n{'micro-benchmark':<52} {'old ms':>10} {'new ms':>10} {'change':>8}")
+    for name, seconds in new['micro'].items():
+        if name not in old['micro']:
+            continue
+        change = seconds / old['micro'][name] - 1
+        flag = " !" if change > REGRESSION_THRESHOLD else ""
+        regressions += bool(flag)
+        print(f"{name:<52} {old['micro'][name] * 1000:>10.2f} {seconds * 1000:>10.2f} {change:>+7.0%}{flag}")
+
+    print(f"\n{'endpoint':<52} {'old req/s':>10} {'new req/s':>10} {'change':>8}")
+    for path, result in new['http'].items():
+        if path not in old['http']:
+            continue
+        before, after = old['http'][path]['requests_per_second'], result['requests_per_second']
+        change = after / before - 1
+        flag = " !" if change < -REGRESSION_THRESHOLD else ""
+        regressions += bool(flag)
+        print(f"{path:<52} {before:>10.0f} {after:>10.0f} {change:>+7.0%}{flag}")
+    print(f"\n{regressions} result(s) more than {REGRESSION_THRESHOLD:.0%} worse")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--timestamps", type=int, default=2920)
+    parser.add_argument("--tags", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--reference", action="store_true", help="also time the original implementations")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--output", help="result file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    warnings.simplefilter("ignore", FutureWarning)
+    params = {name: getattr(args, name) for name in ("tokens", "timestamps", "tags", "repeat", "requests", "concurrency")}
+    with tempfile.TemporaryDirectory() as data_dir:
+        prices_path, metadata_path = write_dataset(
+            data_dir, args.tokens, args.timestamps, args.tags, tags=list(good_tags)[:args.tags])
+        micro = micro_benchmarks(prices_path, metadata_path, args.repeat, args.reference)
+        print(f"{'micro-benchmark':<52} {'ms':>10}")
+        for name, seconds in micro.items():
+            print(f"{name:<52} {seconds * 1000:>10.2f}")
+
+        http = {}
+        if not args.skip_http:
+            http = http_benchmarks(data_dir, args.requests, args.concurrency)
+            print(f"\n{'endpoint':<52} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+            for path, result in http.items():
+                print(f"{path:<52} {result['requests_per_second']:>8.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+
+    commit = git_commit()
+    results = {
+        "meta": {
+            "commit": commit,
+            "created": pd.Timestamp.now(tz="UTC").isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "params": params,
+        },
+        "micro": micro,
+        "http": http,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"\nSaved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Synthetic ``solprices_df`` / ``metadata_df`` shaped data for benchmarks.
+
+Also writes both CSVs to a directory, for running the app or the benchmarks
+on a universe of a chosen size. From ``back/``::
+
+    python -m benchmarks.synthetic /tmp/synthetic --tokens 2000 --timestamps 2920 --tags 40
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FREQ = "3h"
+
+
+def make_tags(n_tags: int):
+    """Tag names for the synthetic universe, ``tag-000``, ``tag-001``, ..."""
+    return [f"tag-{i:03d}" for i in range(n_tags)]
+
+
+def make_metadata(n_tokens: int, n_tags: int = 20, max_tags_per_token: int = 4, seed: int = 0, tags=None):
+    """Build a frame with the same columns as ``metadata_df.csv``.
+
+    Tags are drawn from ``tags`` when given (e.g. the app's ``good_tags``),
+    otherwise from ``make_tags(n_tags)``.
+    """
+    rng = np.random.default_rng(seed)
+    tags = list(tags) if tags is not None else make_tags(n_tags)
+    n_tags = len(tags)
+    ids = np.arange(10_000, 10_000 + n_tokens)
+    tag_strings = []
+    for _ in range(n_tokens):
+        k = rng.integers(1, max_tags_per_token + 1)
+        tag_strings.append(",".join(rng.choice(tags, size=min(k, n_tags), replace=False)))
+    # A few tokens without any tags, as in the real metadata
+    tag_strings = [s if rng.random() > 0.02 else np.nan for s in tag_strings]
+    return pd.DataFrame({
+        "Unnamed: 0": np.arange(n_tokens),
+        "id": ids,
+        "name": [f"Token {i}" for i in ids],
+        "symbol": [f"T{i}" for i in ids],
+        "slug": [f"token-{i}" for i in ids],
+        "token_address": [f"addr{i}" for i in ids],
+        "tags": tag_strings,
+    })
+
+
+def make_prices(n_tokens: int, n_timestamps: int, missing_frac: float = 0.05, seed: int = 0,
+                start: str = "2024-01-01", as_strings: bool = True):
+    """Build a frame with the same columns as ``solprices_df.csv``.
+
+    Every token gets a geometric random walk over ``n_timestamps`` 3-hour
+    snapshots; ``missing_frac`` of the rows are dropped so tokens have gaps
+    and different listing dates, like the real history.
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(10_000, 10_000 + n_tokens)
+    timestamps = pd.date_range(start, periods=n_timestamps, freq=SNAPSHOT_FREQ)
+
+    log_returns = rng.normal(0, 0.03, size=(n_timestamps, n_tokens))
+    price = np.exp(np.cumsum(log_returns, axis=0)) * rng.lognormal(-3, 2, size=n_tokens)
+    supply = rng.lognormal(18, 2, size=n_tokens)
+    market_cap = price * supply
+    volume = market_cap * rng.uniform(0.01, 0.5, size=(n_timestamps, n_tokens))
+
+    df = pd.DataFrame({
+        "id": np.tile(ids, n_timestamps),
+        "timestamp": np.repeat(timestamps, n_tokens),
+        "price": price.ravel(),
+        "market_cap": market_cap.ravel(),
+        "volume_24h": volume.ravel(),
+    })
+    if missing_frac:
+        df = df[rng.random(len(df)) >= missing_frac].reset_index(drop=True)
+    if as_strings:
+        df["timestamp"] = df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df
+
+
+def write_dataset(directory, n_tokens, n_timestamps, n_tags=20, seed=0, tags=None):
+    """Write ``solprices_df.csv`` and ``metadata_df.csv`` to ``directory``.
+
+    Returns:
+        Paths of the prices and metadata files
+    """
+    os.makedirs(directory, exist_ok=True)
+    prices_path = os.path.join(directory, "solprices_df.csv")
+    metadata_path = os.path.join(directory, "metadata_df.csv")
+    make_prices(n_tokens, n_timestamps, seed=seed).to_csv(prices_path, index=False)
+    make_metadata(n_tokens, n_tags, seed=seed, tags=tags).to_csv(metadata_path, index=False)
+    return prices_path, metadata_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic solprices_df.csv / metadata_df.csv files")
+    parser.add_argument("directory")
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--timestamps", type=int, default=2920)
+    parser.add_argument("--tags", type=int, default=20, help="number of distinct tags")
+    parser.add_argument("--app-tags", action="store_true",
+                        help="draw tags from the app's good_tags (up to --tags of them) instead of tag-000, ...")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tags = None
+    if args.app_tags:
+        from state import good_tags
+        tags = list(good_tags)[:args.tags]
+    prices_path, metadata_path = write_dataset(args.directory, args.tokens, args.timestamps, args.tags, args.seed, tags)
+    print(f"Wrote {prices_path} ({os.path.getsize(prices_path) / 1e6:.1f} MB) and {metadata_path}")
+
+
+if __name__ == "__main__":
+    main()
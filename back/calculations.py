@@ -0,0 +1,317 @@
+import numpy as np
+import pandas as pd
+
+
+def prepare_returns(df):
+    """
+    Sort a price frame by token and time and add the per-token columns every index needs.
+
+    Adds ``return`` (simple return, missing -> 0), ``mcap_lag`` (previous
+    period's market cap, missing -> 0) and ``weighted_return``
+    (``mcap_lag * return``).
+
+    Args:
+        df: DataFrame in the ``solprices_df`` schema
+
+    Returns:
+        A new, sorted DataFrame with id, timestamp, price, market_cap and the
+        extra columns
+    """
+    # Gather only the columns the indices need, in sorted order, in one copy
+    ids = df['id']
+    timestamps = pd.to_datetime(df['timestamp']).values
+    id_keys = ids.cat.codes.values if isinstance(ids.dtype, pd.CategoricalDtype) else ids.values
+    order = np.lexsort((timestamps, id_keys))
+    df = pd.DataFrame({
+        'id': ids.values.take(order),
+        'timestamp': timestamps.take(order),
+        'price': df['price'].values.take(order),
+        'market_cap': df['market_cap'].values.take(order),
+    })
+
+    grouped = df.groupby('id', observed=True)
+    df['return'] = grouped['price'].pct_change().fillna(0)
+    df['mcap_lag'] = grouped['market_cap'].shift(1).fillna(0)
+    df['weighted_return'] = df['mcap_lag'] * df['return']
+    return df
+
+
+def aggregate_index(df, by=('timestamp',), base_value=100):
+    """
+    Reduce prepared rows to index values with grouped sums only.
+
+    The index return of a group is ``sum(mcap_lag * return) / sum(mcap_lag)``
+    (0 when the lagged cap is 0) and the index value compounds those returns
+    from ``base_value``. When ``by`` has more than one key, the leading keys
+    identify independent indices and compounding restarts for each of them.
+
+    Args:
+        df: Output of ``prepare_returns``, optionally with extra key columns
+        by: Grouping keys, the last one must be ``timestamp``
+        base_value: Starting value of every index
+
+    Returns:
+        DataFrame with ``by`` columns followed by index_return, total_market_cap,
+        index_value, normalized_index and total_mcap
+    """
+    by = list(by)
+    sums = df.groupby(by, sort=True, observed=True)[['weighted_return', 'mcap_lag', 'market_cap']].sum()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index_return = sums['weighted_return'] / sums['mcap_lag']
+    agg = pd.DataFrame({
+        'index_return': index_return.where(sums['mcap_lag'] != 0, 0.0),
+        'total_market_cap': sums['market_cap'],
+    })
+
+    growth = 1 + agg['index_return']
+    if len(by) > 1:
+        growth = growth.groupby(level=by[:-1], sort=False, observed=True).cumprod()
+    else:
+        growth = growth.cumprod()
+    agg['index_value'] = growth * base_value
+    agg['normalized_index'] = agg['index_value']
+    agg['total_mcap'] = agg['total_market_cap']
+    return agg.reset_index()
+
+
+def mcap_weighted_index(df, base_value=100):
+    """
+    Market cap weighted index of all tokens in ``df``, one row per timestamp.
+
+    Args:
+        df: DataFrame in the ``solprices_df`` schema
+        base_value: Index value at the first timestamp
+
+    Returns:
+        DataFrame with timestamp, index_return, total_market_cap, index_value,
+        normalized_index and total_mcap columns
+    """
+    return aggregate_index(prepare_returns(df), base_value=base_value)
+
+
+def tag_membership(metadata_df, tags):
+    """
+    Token x tag membership matrix.
+
+    A token belongs to a tag when the tag occurs in its comma separated
+    ``tags`` string, using the same ``str.contains`` match as the per-tag
+    index always has.
+
+    Args:
+        metadata_df: DataFrame in the ``metadata_df`` schema
+        tags: Tags to build columns for
+
+    Returns:
+        Boolean DataFrame indexed by token id with one column per tag
+    """
+    tag_strings = metadata_df['tags']
+    matrix = {tag: tag_strings.str.contains(tag, na=False).values for tag in tags}
+    return pd.DataFrame(matrix, index=pd.Index(metadata_df['id'].values, name='id'), columns=list(tags))
+
+
+def mcap_weighted_tag_indices(prices_df, metadata_df, tags, base_value=100):
+    """
+    Market cap weighted index of every tag in one pass over the price table.
+
+    Returns and lagged caps are computed once for all tagged tokens. The rows
+    are then joined with the (id, tag) pairs of the membership matrix and a
+    single grouped reduction over (tag, timestamp) produces every index.
+
+    Args:
+        prices_df: DataFrame in the ``solprices_df`` schema
+        metadata_df: DataFrame in the ``metadata_df`` schema
+        tags: Tags to compute indices for
+        base_value: Index value at each tag's first timestamp
+
+    Returns:
+        Dict of tag -> index DataFrame (same columns as ``mcap_weighted_index``),
+        in ``tags`` order; tags without any priced token are left out
+    """
+    tags = list(dict.fromkeys(tags))
+    membership = tag_membership(metadata_df, tags)
+    pairs = membership.rename_axis(columns='tag').stack()
+    pairs = pairs[pairs].index.to_frame(index=False).drop_duplicates()
+    pairs['tag'] = pd.Categorical(pairs['tag'], categories=tags)
+
+    tagged = prices_df['id'].isin(pairs['id'].unique())
+    prepared = prepare_returns(prices_df.loc[tagged, ['id', 'timestamp', 'price', 'market_cap']])
+    expanded = prepared[['id', 'timestamp', 'weighted_return', 'mcap_lag', 'market_cap']].merge(pairs, on='id')
+    agg = aggregate_index(expanded, by=('tag', 'timestamp'), base_value=base_value)
+
+    indices = {}
+    for tag, index_df in agg.groupby('tag', sort=False, observed=True):
+        indices[tag] = index_df.drop(columns='tag').reset_index(drop=True)
+    return {tag: indices[tag] for tag in tags if tag in indices}
+
+
+# Rows of history the price change and overbought metrics look back on
+RECENT_ROWS = 90
+
+
+def _latest_rows(values, ends, counts, n):
+    """Each token's ``n`` most recent values, newest first, NaN-padded for short histories."""
+    offsets = ends[:, None] - 1 - np.arange(n)
+    valid = np.arange(n) < counts[:, None]
+    return np.where(valid, values[np.where(valid, offsets, 0)], np.nan)
+
+
+def token_metric_stats(prices_df, market_index_df):
+    """
+    Per-token sufficient statistics behind ``token_metrics``.
+
+    Prices are pivoted once into a timestamp x token matrix; per-token returns
+    are taken between consecutive rows of the token (missing prices forward
+    filled, first row 0) and every statistic is a masked NumPy reduction over
+    that matrix. The statistics can be extended one row at a time (see
+    incremental.py) and turned into metrics with ``token_metrics_frame``.
+    Assumes at most one row per token and timestamp.
+
+    Args:
+        prices_df: DataFrame in the ``solprices_df`` schema
+        market_index_df: DataFrame containing the market index values
+
+    Returns:
+        Dict of per-token arrays, aligned with ``id`` (tokens in order of first
+        appearance): row counts and up/down market counts of the rows merged with
+        the market index, means and co-moments of market and token returns, the
+        last forward-filled price and the ``RECENT_ROWS`` latest prices/volumes
+    """
+    market = market_index_df[['timestamp', 'index_value']].copy()
+    market['timestamp'] = pd.to_datetime(market['timestamp'])
+    market = market.sort_values('timestamp')
+    market_return = pd.Series(market['index_value'].pct_change().fillna(0).values, index=market['timestamp'].values)
+
+    # Pivot once: rows are sorted timestamps, columns tokens in order of first appearance
+    token_codes, token_ids = pd.factorize(prices_df['id'])
+    time_codes, timestamps = pd.factorize(pd.to_datetime(prices_df['timestamp']), sort=True)
+    valid = time_codes >= 0
+    token_codes, time_codes = token_codes[valid], time_codes[valid]
+    shape = (len(timestamps), len(token_ids))
+
+    observed = np.zeros(shape, dtype=bool)
+    observed[time_codes, token_codes] = True
+    price = np.full(shape, np.nan)
+    price[time_codes, token_codes] = prices_df['price'].values[valid]
+    volume = np.full(shape, np.nan)
+    volume[time_codes, token_codes] = prices_df['volume_24h'].values[valid]
+
+    # Token returns between consecutive rows of the token (pct_change with forward fill)
+    filled = pd.DataFrame(price).ffill().values
+    previous = np.vstack([np.full((1, shape[1]), np.nan), filled[:-1]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        token_return = filled / previous - 1
+    token_return[np.isnan(token_return)] = 0
+
+    # Inner join with the market index on timestamp
+    in_market = timestamps.isin(market_return.index)
+    x = market_return.reindex(timestamps).fillna(0).values[:, None]
+    merged = observed & in_market[:, None]
+    n_merged = merged.sum(axis=0)
+
+    up = merged & (x > 0)
+    down = merged & (x < 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Means and co-moments of market (x) and token (y) returns over the merged rows
+        x_mean = np.where(merged, x, 0.0).sum(axis=0) / n_merged
+        y_mean = np.where(merged, token_return, 0.0).sum(axis=0) / n_merged
+        x_dev = np.where(merged, x - x_mean, 0.0)
+        sxx = (x_dev ** 2).sum(axis=0)
+        sxy = (x_dev * np.where(merged, token_return - y_mean, 0.0)).sum(axis=0)
+
+    # Rows of each token, oldest to newest and contiguous per token
+    cols, rows = np.nonzero(observed.T)
+    counts = observed.sum(axis=0)
+    ends = np.cumsum(counts)
+
+    return {
+        'id': pd.Index(np.asarray(token_ids), name='id'),
+        'n_merged': n_merged,
+        'up_count': up.sum(axis=0),
+        'up_hits': (up & (token_return > 0)).sum(axis=0),
+        'down_count': down.sum(axis=0),
+        'down_hits': (down & (token_return < 0)).sum(axis=0),
+        'x_mean': x_mean,
+        'y_mean': y_mean,
+        'sxx': sxx,
+        'sxy': sxy,
+        'non_finite': (merged & ~np.isfinite(token_return)).any(axis=0),
+        'counts': counts,
+        'last_price': filled[-1] if shape[0] else np.full(shape[1], np.nan),
+        'recent_price': _latest_rows(price[rows, cols], ends, counts, RECENT_ROWS),
+        'recent_volume': _latest_rows(volume[rows, cols], ends, counts, RECENT_ROWS),
+    }
+
+
+def token_metrics_frame(stats):
+    """
+    Turn ``token_metric_stats`` output into the token metrics DataFrame.
+
+    Tokens with fewer than 10 rows on market index timestamps are left out.
+
+    Args:
+        stats: Dict of per-token arrays from ``token_metric_stats``
+
+    Returns:
+        DataFrame with id, usens, dsens, beta, change24h, change7d and
+        overbought_coef columns
+    """
+    columns = ['id', 'usens', 'dsens', 'beta', 'change24h', 'change7d', 'overbought_coef']
+    keep = stats['n_merged'] >= 10  # Skip tokens with insufficient data
+    if not keep.any():
+        return pd.DataFrame(columns=columns)
+
+    up_count, down_count = stats['up_count'][keep], stats['down_count'][keep]
+    sxx, counts = stats['sxx'][keep], stats['counts'][keep]
+    recent_price, recent_volume = stats['recent_price'][keep], stats['recent_volume'][keep]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # USens / DSens: share of up (down) market periods where the token also moved up (down)
+        usens = np.where(up_count > 0, stats['up_hits'][keep] / up_count, 0.0)
+        dsens = np.where(down_count > 0, stats['down_hits'][keep] / down_count, 0.0)
+
+        # Beta: closed-form OLS slope cov(x, y) / var(x)
+        beta = np.where(sxx != 0, stats['sxy'][keep] / sxx, 0.0)
+        # Non-finite returns made the regression fail before, leaving beta undefined
+        beta[stats['non_finite'][keep] & (sxx != 0)] = np.nan
+
+        current_price = recent_price[:, 0]
+        # 24h price change (8 observations)
+        price_24h_ago = recent_price[:, 7]
+        change24h = np.where((counts >= 8) & (price_24h_ago > 0), (current_price / price_24h_ago - 1) * 100, 0.0)
+        # 7d price change (56 observations)
+        price_7d_ago = recent_price[:, 55]
+        change7d = np.where((counts >= 56) & (price_7d_ago > 0), (current_price / price_7d_ago - 1) * 100, 0.0)
+
+        # Overbought coefficient: 7d change plus past week / week before volume ratio (needs 2 weeks)
+        past_week_volume = np.nansum(recent_volume[:, :45], axis=1)
+        week_before_volume = np.nansum(recent_volume[:, 45:90], axis=1)
+        volume_ratio = np.where(week_before_volume > 0, past_week_volume / week_before_volume, 0.0)
+        overbought_coef = np.where(counts >= 90, change7d + volume_ratio, 0.0)
+
+    return pd.DataFrame({
+        'id': stats['id'][keep],
+        'usens': [round(value, 2) for value in usens.tolist()],
+        'dsens': [round(value, 2) for value in dsens.tolist()],
+        'beta': np.round(beta, 2),
+        'change24h': np.round(change24h, 2),
+        'change7d': np.round(change7d, 2),
+        'overbought_coef': np.round(overbought_coef, 2),
+    }, columns=columns)
+
+
+def token_metrics(prices_df, market_index_df):
+    """
+    USens, DSens, Beta, price changes and overbought coefficient for all tokens at once.
+
+    Cross-sectional over a timestamp x token return matrix, see
+    ``token_metric_stats`` and ``token_metrics_frame``.
+
+    Args:
+        prices_df: DataFrame in the ``solprices_df`` schema
+        market_index_df: DataFrame containing the market index values
+
+    Returns:
+        DataFrame with id, usens, dsens, beta, change24h, change7d and
+        overbought_coef columns, one row per token in order of first appearance
+    """
+    return token_metrics_frame(token_metric_stats(prices_df, market_index_df))
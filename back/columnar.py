@@ -0,0 +1,101 @@
+"""
+Columnar encodings of the bulk endpoints, picked by content negotiation.
+
+Records (``[{"timestamp": ..., "index_value": ...}, ...]``) stay the default.
+Clients that send a matching ``Accept`` header get the same data column by
+column instead, without the key names repeated on every row:
+
+- ``application/vnd.columns+json``: ``{"columns": {name: [values]}, "length": n, ...}``
+- ``application/vnd.apache.arrow.stream``: Arrow IPC stream (needs ``pyarrow``)
+- ``application/msgpack``: the JSON-of-arrays layout as msgpack (needs ``msgpack``)
+
+Values are the same as in the records, so ``zip`` over the columns gives the
+records back; Arrow keeps timestamps as ``timestamp[ns]`` instead of strings.
+"""
+import numpy as np
+import pandas as pd
+
+from token_index import _native, dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+COLUMNS_JSON = "application/vnd.columns+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+
+MEDIA_TYPES = [JSON, COLUMNS_JSON]
+if pa is not None:
+    MEDIA_TYPES.append(ARROW_STREAM)
+if msgpack is not None:
+    MEDIA_TYPES.append(MSGPACK)
+
+
+def negotiate(accept: str) -> str:
+    """
+    Media type to answer with for an ``Accept`` header.
+
+    The highest-quality supported type wins (earlier in the header on ties);
+    anything else, including ``*/*`` and a missing header, gets records as JSON.
+    """
+    best, best_q = JSON, 0.0
+    for item in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type.lower() in MEDIA_TYPES and q > best_q:
+            best, best_q = media_type.lower(), q
+    return best
+
+
+def _plain(values):
+    """Column as a list of JSON/msgpack-ready values."""
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind == "M":
+            return [pd.Timestamp(value).isoformat() for value in values]
+        return [_native(value) for value in values.tolist()]
+    return [_native(value) for value in values]
+
+
+def encode_columns(columns, media_type, extra=None) -> bytes:
+    """
+    Encode equal-length columns in one of the columnar media types.
+
+    Args:
+        columns: Dict of column name to a NumPy array (datetime64 for
+            timestamps) or a list of plain values
+        media_type: ``COLUMNS_JSON``, ``ARROW_STREAM`` or ``MSGPACK``
+        extra: Top-level fields next to the columns (``total`` of a page, ...);
+            Arrow streams carry them as schema metadata
+
+    Returns:
+        Encoded body
+    """
+    extra = extra or {}
+    length = len(next(iter(columns.values()))) if columns else 0
+    if media_type == ARROW_STREAM:
+        table = pa.table({name: pa.array(values) for name, values in columns.items()})
+        table = table.replace_schema_metadata({key: str(value) for key, value in extra.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    payload = {"columns": {name: _plain(values) for name, values in columns.items()}, "length": length, **extra}
+    if media_type == MSGPACK:
+        return msgpack.packb(payload)
+    return dumps(payload)
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Parquet when pyarrow is installed, pickle otherwise; both keep the column dtypes
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = "parquet"
+except ImportError:
+    CACHE_FORMAT = "pickle"
+
+CACHE_VERSION = 1
+
+
+def prepare_prices(df):
+    """Typed price history: categorical ids, datetime64 timestamps, float64 values."""
+    df['id'] = df['id'].astype('category')
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    for column in ('price', 'market_cap', 'volume_24h'):
+        if column in df:
+            df[column] = df[column].astype('float64')
+    return df
+
+
+def prepare_metadata(df):
+    """Metadata is small and already well typed by ``read_csv``."""
+    return df
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(path, hash_contents=False):
+    """
+    Identify the current contents of a source file.
+
+    Args:
+        path: Source CSV
+        hash_contents: Also hash the file, for sources whose mtime can't be trusted
+
+    Returns:
+        Dict with size, mtime_ns and optionally sha256
+    """
+    stat = os.stat(path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if hash_contents:
+        fingerprint["sha256"] = _sha256(path)
+    return fingerprint
+
+
+def _cache_paths(path, cache_dir):
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), ".frame_cache")
+    name = os.path.splitext(os.path.basename(path))[0]
+    return cache_dir, os.path.join(cache_dir, f"{name}.{CACHE_FORMAT}"), os.path.join(cache_dir, f"{name}.json")
+
+
+def _read_cache(data_path, meta_path, prepare, fingerprint):
+    try:
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+    expected = {"version": CACHE_VERSION, "format": CACHE_FORMAT, "prepare": prepare.__name__, "source": fingerprint}
+    if meta != expected:
+        return None
+    try:
+        if CACHE_FORMAT == "parquet":
+            df = pd.read_parquet(data_path)
+        else:
+            df = pd.read_pickle(data_path)
+    except (OSError, ValueError):
+        return None
+    # Cheap on already typed columns, and restores categoricals the parquet
+    # reader may hand back as plain integers
+    return prepare(df)
+
+
+def _write_cache(df, cache_dir, data_path, meta_path, prepare, fingerprint):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{data_path}.tmp-{os.getpid()}"
+    if CACHE_FORMAT == "parquet":
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, data_path)
+    meta = {"version": CACHE_VERSION, "format": CACHE_FORMAT, "prepare": prepare.__name__, "source": fingerprint}
+    tmp_path = f"{meta_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(tmp_path, meta_path)
+
+
+def load_frame(path, prepare, cache_dir=None, hash_contents=False):
+    """
+    Load a CSV through a typed columnar cache.
+
+    A warm load reads the cache directly, skipping CSV and datetime parsing.
+    The cache is rebuilt whenever the source file's size or mtime (and,
+    with ``hash_contents``, its SHA-256) no longer match.
+
+    Args:
+        path: Source CSV
+        prepare: Function typing the freshly parsed frame (``prepare_prices``, ...)
+        cache_dir: Where to keep the cache, ``.frame_cache`` next to the CSV by default
+        hash_contents: Include the file hash in the cache key
+
+    Returns:
+        Tuple of the DataFrame and the fingerprint of the source it was read
+        from; its ``size`` is the number of bytes of the CSV that were loaded
+    """
+    cache_dir, data_path, meta_path = _cache_paths(path, cache_dir)
+    fingerprint = source_fingerprint(path, hash_contents)
+
+    df = _read_cache(data_path, meta_path, prepare, fingerprint)
+    if df is not None:
+        return df, fingerprint
+
+    with open(path, "rb") as source:
+        df = prepare(pd.read_csv(source))
+        loaded_size = source.tell()
+    # Only cache what is known to match the fingerprint; a file that changed
+    # while it was being read is simply parsed again next time
+    if source_fingerprint(path, hash_contents) == fingerprint and loaded_size == fingerprint["size"]:
+        try:
+            _write_cache(df, cache_dir, data_path, meta_path, prepare, fingerprint)
+        except OSError as exc:
+            print(f"Could not write frame cache for {path}: {exc}")
+    return df, dict(fingerprint, size=loaded_size)
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+from calculations import (
+    RECENT_ROWS,
+    mcap_weighted_index,
+    mcap_weighted_tag_indices,
+    tag_membership,
+    token_metric_stats,
+    token_metrics_frame,
+)
+from series import IndexBuffer
+
+
+class IncrementalEngine:
+    """
+    Overall index, tag indices and token metrics that can be extended snapshot by snapshot.
+
+    The engine bootstraps once from the full price history with the batch
+    engines in calculations.py. After that ``append`` only touches the new
+    rows: each token carries its last (forward-filled) price and market cap,
+    each index compounds from its last ``index_value`` and gets one row
+    appended to its ``IndexBuffer`` (no copy of its history), and the token metrics
+    are rebuilt from running per-token statistics (Welford co-moments for
+    beta, up/down counters for USens/DSens and the last ``RECENT_ROWS``
+    prices/volumes for price changes and the overbought coefficient).
+    """
+
+    def __init__(self, prices_df, metadata_df, tags, base_value=100):
+        self.base_value = base_value
+        self.tags = list(dict.fromkeys(tags))
+
+        overall_index = mcap_weighted_index(prices_df, base_value=base_value)
+        self.overall = IndexBuffer.from_frame(overall_index)
+        self.tag_buffers = {
+            tag: IndexBuffer.from_frame(index_df)
+            for tag, index_df in mcap_weighted_tag_indices(prices_df, metadata_df, self.tags, base_value=base_value).items()
+        }
+        self.stats = token_metric_stats(prices_df, overall_index)
+        self.token_metrics_df = token_metrics_frame(self.stats)
+
+        # Token x tag membership for every known token, including ones without prices yet
+        membership = tag_membership(metadata_df, self.tags)
+        self.membership = membership.groupby(level=0).any()
+
+        ids = self.stats['id']
+        self.codes = {token_id: code for code, token_id in enumerate(ids.tolist())}
+        self.token_tags = self.membership.reindex(ids, fill_value=False).values
+
+        # Last row's market cap of each token becomes its lagged cap in the next snapshot
+        timestamps = pd.to_datetime(prices_df['timestamp'])
+        last_rows = (
+            prices_df[['id', 'market_cap']]
+            .assign(timestamp=timestamps)
+            .sort_values('timestamp', kind='stable')
+            .drop_duplicates('id', keep='last')
+            .set_index('id')
+        )
+        self.last_market_cap = last_rows['market_cap'].reindex(ids).values.astype(float)
+        self.last_timestamp = timestamps.max()
+
+    @property
+    def overall_index(self):
+        """Overall index DataFrame (columns are views of its buffer)."""
+        return self.overall.frame()
+
+    @property
+    def tag_indices(self):
+        """Dict of tag to index DataFrame; tags not extended since the last call return the same frame."""
+        return {tag: buffer.frame() for tag, buffer in self.tag_buffers.items()}
+
+    def append(self, prices_df):
+        """
+        Extend every index and the token metrics with newer price rows.
+
+        Args:
+            prices_df: New rows in the ``solprices_df`` schema, all newer than
+                the last timestamp seen; one or more snapshots
+
+        Returns:
+            Set of token ids that had a row in the new data
+        """
+        if prices_df.empty:
+            return set()
+        batch = prices_df.copy()
+        batch['timestamp'] = pd.to_datetime(batch['timestamp'])
+        if pd.notna(self.last_timestamp) and (batch['timestamp'] <= self.last_timestamp).any():
+            raise ValueError(f"Incremental updates must be newer than {self.last_timestamp}")
+
+        touched = set()
+        for timestamp, rows in batch.groupby('timestamp', sort=True):
+            rows = rows.drop_duplicates('id', keep='last')
+            self._append_snapshot(timestamp, rows)
+            touched.update(rows['id'].tolist())
+
+        self.token_metrics_df = token_metrics_frame(self.stats)
+        return touched
+
+    def _token_codes(self, ids):
+        new_ids = [token_id for token_id in pd.unique(ids) if token_id not in self.codes]
+        if new_ids:
+            self._add_tokens(new_ids)
+        return np.array([self.codes[token_id] for token_id in ids], dtype=np.intp)
+
+    def _add_tokens(self, new_ids):
+        n = len(new_ids)
+        for token_id in new_ids:
+            self.codes[token_id] = len(self.codes)
+
+        stats = self.stats
+        stats['id'] = stats['id'].append(pd.Index(new_ids))
+        for key in ('n_merged', 'up_count', 'up_hits', 'down_count', 'down_hits', 'counts'):
+            stats[key] = np.concatenate([stats[key], np.zeros(n, dtype=stats[key].dtype)])
+        for key in ('x_mean', 'y_mean', 'sxx', 'sxy'):
+            stats[key] = np.concatenate([stats[key], np.zeros(n)])
+        stats['non_finite'] = np.concatenate([stats['non_finite'], np.zeros(n, dtype=bool)])
+        stats['last_price'] = np.concatenate([stats['last_price'], np.full(n, np.nan)])
+        for key in ('recent_price', 'recent_volume'):
+            stats[key] = np.vstack([stats[key], np.full((n, RECENT_ROWS), np.nan)])
+
+        self.last_market_cap = np.concatenate([self.last_market_cap, np.full(n, np.nan)])
+        new_tags = self.membership.reindex(pd.Index(new_ids), fill_value=False).values
+        self.token_tags = np.vstack([self.token_tags, new_tags])
+
+    def _append_snapshot(self, timestamp, rows):
+        codes = self._token_codes(rows['id'].values)
+        price = rows['price'].values.astype(float)
+        market_cap = rows['market_cap'].values.astype(float)
+        volume = rows['volume_24h'].values.astype(float)
+        stats = self.stats
+
+        # Returns against each token's previous row (forward-filled price, first row 0)
+        last_price = stats['last_price'][codes]
+        filled = np.where(np.isnan(price), last_price, price)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            token_return = filled / last_price - 1
+        token_return[np.isnan(token_return)] = 0
+        mcap_lag = self.last_market_cap[codes]
+        mcap_lag[np.isnan(mcap_lag)] = 0
+        weighted_return = mcap_lag * token_return
+
+        stats['last_price'][codes] = filled
+        self.last_market_cap[codes] = market_cap
+        self.last_timestamp = timestamp
+
+        # Overall index
+        timestamp = pd.Timestamp(timestamp).value
+        previous_value = self.overall.last('index_value')
+        self._extend_index(
+            self.overall, timestamp,
+            np.nansum(weighted_return), np.nansum(mcap_lag), np.nansum(market_cap),
+        )
+        current_value = self.overall.last('index_value')
+        market_return = current_value / previous_value - 1 if previous_value is not None else 0.0
+
+        # Tag indices: one bincount per sum over the (row, tag) membership pairs
+        row_positions, tag_codes = np.nonzero(self.token_tags[codes])
+        n_tags = len(self.tags)
+        present = np.bincount(tag_codes, minlength=n_tags)
+        sums = [
+            np.bincount(tag_codes, weights=np.where(np.isnan(values), 0, values)[row_positions], minlength=n_tags)
+            for values in (weighted_return, mcap_lag, market_cap)
+        ]
+        for tag_code in np.flatnonzero(present):
+            tag = self.tags[tag_code]
+            if tag not in self.tag_buffers:
+                self.tag_buffers[tag] = IndexBuffer.empty()
+            self._extend_index(
+                self.tag_buffers[tag], timestamp,
+                sums[0][tag_code], sums[1][tag_code], sums[2][tag_code],
+            )
+
+        # Token metric statistics; every new row is on a market index timestamp
+        n_before = stats['n_merged'][codes]
+        n = n_before + 1
+        stats['n_merged'][codes] = n
+        if market_return > 0:
+            stats['up_count'][codes] += 1
+            stats['up_hits'][codes] += token_return > 0
+        elif market_return < 0:
+            stats['down_count'][codes] += 1
+            stats['down_hits'][codes] += token_return < 0
+
+        x_mean = np.where(n_before > 0, stats['x_mean'][codes], 0.0)
+        y_mean = np.where(n_before > 0, stats['y_mean'][codes], 0.0)
+        dx = market_return - x_mean
+        x_mean = x_mean + dx / n
+        y_mean = y_mean + (token_return - y_mean) / n
+        stats['sxx'][codes] += dx * (market_return - x_mean)
+        stats['sxy'][codes] += dx * (token_return - y_mean)
+        stats['x_mean'][codes] = x_mean
+        stats['y_mean'][codes] = y_mean
+        stats['non_finite'][codes] |= ~np.isfinite(token_return)
+
+        stats['counts'][codes] += 1
+        stats['recent_price'][codes] = np.column_stack([price, stats['recent_price'][codes, :-1]])
+        stats['recent_volume'][codes] = np.column_stack([volume, stats['recent_volume'][codes, :-1]])
+
+    def _extend_index(self, buffer, timestamp, weighted_return, mcap_lag, market_cap):
+        index_return = weighted_return / mcap_lag if mcap_lag != 0 else 0.0
+        previous_value = buffer.last('index_value')
+        index_value = (previous_value if previous_value is not None else self.base_value) * (1 + index_return)
+        buffer.append(timestamp, {
+            'index_return': index_return,
+            'total_market_cap': market_cap,
+            'index_value': index_value,
+            'normalized_index': index_value,
+            'total_mcap': market_cap,
+        })
@@ -0,0 +1,123 @@
+import heapq
+import math
+
+from token_index import dumps
+
+# Entries kept per leaderboard; /api/overbought and /api/oversold serve at most this many
+LEADERBOARD_SIZE = 50
+
+
+class TopK:
+    """
+    The ``k`` highest (or lowest) scores of a population whose scores change.
+
+    Backed by a heap with lazy deletion: an update pushes the new score and
+    leaves the old entry in place, and ``top`` skips entries that no longer
+    match the current score. Updating m items costs O(m log n) and reading
+    the top K costs O(K log n) plus the stale entries it drops on the way,
+    instead of re-sorting all n items on every refresh. The heap is rebuilt
+    once stale entries outnumber live ones.
+    """
+
+    def __init__(self, k, largest=True):
+        self.k = k
+        self.sign = -1 if largest else 1
+        self.scores = {}
+        self.heap = []
+
+    def update(self, items):
+        """Set the scores of ``(key, score)`` pairs; a None or NaN score removes the key."""
+        for key, score in items:
+            if score is None or math.isnan(score):
+                self.scores.pop(key, None)
+                continue
+            if self.scores.get(key) == score:
+                continue
+            self.scores[key] = score
+            heapq.heappush(self.heap, (self.sign * score, key))
+        if len(self.heap) > 2 * len(self.scores) + self.k:
+            self.heap = [(self.sign * score, key) for key, score in self.scores.items()]
+            heapq.heapify(self.heap)
+
+    def top(self):
+        """Up to ``k`` ``(key, score)`` pairs, best first (ties by key)."""
+        best, kept, seen = [], [], set()
+        while self.heap and len(best) < self.k:
+            entry = heapq.heappop(self.heap)
+            signed_score, key = entry
+            # Stale entries (and repeats of a score the key went back to) are dropped for good
+            if key in seen or self.scores.get(key) != self.sign * signed_score:
+                continue
+            seen.add(key)
+            best.append((key, self.sign * signed_score))
+            kept.append(entry)
+        for entry in kept:
+            heapq.heappush(self.heap, entry)
+        return best
+
+
+class OverboughtLeaderboards:
+    """
+    Overbought (highest ``overbought_coef``) and oversold (lowest) token lists.
+
+    One ``TopK`` per direction for all tokens and one per tag, fed with the
+    coefficients of the tokens that changed since the last refresh. Encoded
+    lists are kept per board and only rebuilt for boards an update touched.
+    """
+
+    def __init__(self, symbols, token_tags, k=LEADERBOARD_SIZE):
+        """
+        Args:
+            symbols: Dict of token id to symbol
+            token_tags: Dict of token id to the tags it is listed under
+            k: Entries kept per board
+        """
+        self.symbols = symbols
+        self.token_tags = token_tags
+        self.k = k
+        self.boards = {}
+        self.encoded = {}
+
+    def _board(self, tag, largest):
+        board = self.boards.get((tag, largest))
+        if board is None:
+            board = self.boards[(tag, largest)] = TopK(self.k, largest)
+        return board
+
+    def update(self, token_metrics_df, ids=None):
+        """
+        Feed the current coefficients of ``ids`` (every token when None) into the boards.
+
+        Tokens in ``ids`` without a row in ``token_metrics_df`` are removed.
+        """
+        coefs = dict(zip(token_metrics_df['id'].tolist(), token_metrics_df['overbought_coef'].tolist()))
+        ids = coefs.keys() if ids is None else ids
+        changes = {}
+        for token_id in ids:
+            score = coefs.get(token_id)
+            for tag in (None, *self.token_tags.get(token_id, ())):
+                changes.setdefault(tag, []).append((token_id, score))
+        for tag, items in changes.items():
+            for largest in (True, False):
+                self._board(tag, largest).update(items)
+                self.encoded.pop((tag, largest), None)
+
+    def _ticker(self, token_id):
+        # "$SYMBOL", as the leaderboard cards show it
+        symbol = str(self.symbols.get(token_id, token_id))
+        return symbol if symbol.startswith("$") else f"${symbol}"
+
+    def lists(self):
+        """Dict of ``(tag or None, largest)`` to the board's encoded entries, best first."""
+        for key, board in self.boards.items():
+            if key not in self.encoded:
+                self.encoded[key] = [
+                    dumps({"id": token_id, "symbol": self._ticker(token_id), "change": score})
+                    for token_id, score in board.top()
+                ]
+        return dict(self.encoded)
+
+
+def leaderboard_json(entries, limit):
+    """Encoded JSON list of the first ``limit`` entries (none for a negative ``limit``)."""
+    return b"[" + b",".join(entries[:max(limit, 0)]) + b"]"
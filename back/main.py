@@ -1,13 +1,94 @@
-from fastapi import FastAPI
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any, Optional, Union
-import json
-import random
-import math
-import pandas as pd
-from precalc import calculate_mcap_weighted_index, calculate_mcap_weighted_index_by_tag, solprices_df, metadata_df, calculate_token_metrics
-
-app = FastAPI(title="Web3 Material Backend API")
+from typing import List, Optional
+import asyncio
+import os
+from columnar import JSON, encode_columns, negotiate
+from leaderboard import leaderboard_json
+from price_store import price_dynamics
+from refresh import StateRefresher
+from response_cache import ResponseCache, cached_response
+from series import DOWNSAMPLE_METHODS, parse_resolution, parse_time
+from shared_state import StateFollower
+from snapshot import load_or_build
+from token_index import DEFAULT_SORT, dumps, parse_sort
+
+# How often to check the input CSVs for new price snapshots or other changes (0 disables)
+PRICE_POLL_SECONDS = float(os.getenv("PRICE_POLL_SECONDS", "60"))
+# Full background recomputation interval, on top of rebuilds triggered by input changes (0 disables)
+STATE_REBUILD_SECONDS = float(os.getenv("STATE_REBUILD_SECONDS", "86400"))
+# "local": this process loads or builds the state and keeps it current itself;
+# "attach": it serves the state a builder process publishes (see shared_state.py)
+STATE_MODE = os.getenv("STATE_MODE", "local")
+# Threads for request-time work that depends on query parameters and can't be precomputed
+REQUEST_WORKERS = int(os.getenv("REQUEST_WORKERS", "4"))
+
+# Execution model: the event loop only does I/O. Everything derived from the
+# price history is computed when the state is (re)built and served from the
+# immutable ServedState, mostly as pre-encoded JSON. Whatever work is left per
+# request runs in this bounded pool via ``run_in_pool``, and state rebuilds run
+# in the refresher's own thread or process (see refresh.py).
+request_pool = ThreadPoolExecutor(max_workers=REQUEST_WORKERS, thread_name_prefix="request")
+
+
+async def run_in_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(request_pool, fn, *args)
+
+
+# Encoded responses of the endpoints that only change with the data version
+response_cache = ResponseCache()
+
+
+async def serve_cached(request, state, key, encode, media_type=JSON):
+    """
+    Serve ``encode(state)`` (the body, of ``media_type``) from the response cache.
+
+    The body and its compressed variants are built once per data version in
+    the request pool; repeated requests only pick the variant to send, or
+    answer 304 when the client's ETag is current.
+    """
+    key = (key, media_type)
+    entry = response_cache.get(state.data_version, key)
+    if entry is None:
+        entry = await run_in_pool(lambda: response_cache.put(state.data_version, key, encode(state), media_type))
+    return cached_response(request, entry)
+
+
+async def serve_series(request, state, key, series, start, end, resolution, points, downsample, media_type=JSON):
+    """
+    Serve a window of an index series, optionally resampled and/or downsampled.
+
+    ``series(state)`` picks the IndexSeries; results are cached per data
+    version under ``key``, the parsed query and the negotiated media type.
+    """
+    try:
+        start, end = parse_time(start), parse_time(end)
+        resolution = parse_resolution(resolution)
+    except ValueError as exc:
+        return {"error": str(exc)}
+    if points is not None and points < 3:
+        return {"error": "points must be at least 3"}
+    if downsample not in DOWNSAMPLE_METHODS:
+        return {"error": f"downsample must be one of {', '.join(DOWNSAMPLE_METHODS)}"}
+    return await serve_cached(
+        request, state, (key, start, end, resolution, points, downsample),
+        lambda state: series(state).query(start, end, resolution, points, downsample).encode(media_type),
+        media_type,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app):
+    poller = asyncio.create_task(refresher.run()) if PRICE_POLL_SECONDS > 0 else None
+    yield
+    if poller is not None:
+        poller.cancel()
+    request_pool.shutdown(wait=False)
+
+
+app = FastAPI(title="Web3 Material Backend API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -18,108 +99,25 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Calculate indices on startup
-# Overall weighted index
-overall_index = calculate_mcap_weighted_index(solprices_df)
-
-# Get all unique tags from metadata_df
-all_tags = []
-for tags_str in metadata_df['tags'].dropna():
-    tags = [tag.strip() for tag in tags_str.split(',')]
-    all_tags.extend(tags)
-all_tags = list(set(all_tags))
-
-good_tags = {
- 'memes': 1075,
- 'ai-big-data': 166,
- 'animal-memes': 156,
- 'pump-fun': 104,
- 'gaming': 86,
- 'defi': 85,
- 'collectibles-nfts': 81,
- 'cat-themed': 78,
- 'ai-memes': 71,
- 'doggone-doggerel': 59,
- 'ai-agents': 58,
- 'political-memes': 49,
- 'play-to-earn': 35,
- 'web3': 31,
- 'metaverse': 30,
- 'depin': 28,
- 'rehypothecated-crypto': 21,
- 'defai': 20,
- 'distributed-computing': 18,
- 'celebrity-memes': 13,
- 'payments': 13,
- 'ip-memes': 12,
- 'entertainment': 12,
- 'real-world-assets': 11,
- 'derivatives': 11,
- 'amm': 11,
- 'desci': 11,
- 'zodiac-themed': 11,
- 'generative-ai': 10,
- 'ai-agent-launchpad': 10,
- 'dex': 10,
- 'oracles': 9,
- 'yield-farming': 9,
- 'lending-borowing': 9,
- 'interoperability': 9,
- 'wallet': 9,
- 'launchpad': 8,
- 'move-to-earn': 8,
- 'art': 7,
- 'content-creation': 7,
- 'telegram-bot': 7,
- 'media': 6,
- 'asset-management': 6,
- 'communications-social-media': 6,
- 'gambling': 6,
- 'vr-ar': 5,
- 'enterprise-solutions': 5,
- 'storage': 5,
- 'analytics': 4,
- 'filesharing': 4,
- 'store-of-value': 4,
- 'pow': 4,
- 'presale-memes': 4,
- 'sports': 4,
- 'adult': 4,
- }
-
-
-# Calculate weighted indices for all tags
-tag_indices = {}
-for tag in all_tags:
-    if tag not in good_tags:
-        continue
-    tag_index = calculate_mcap_weighted_index_by_tag(tag)
-    if not tag_index.empty:
-        tag_indices[tag] = tag_index
-
-# Calculate token metrics for all tokens
-token_metrics_df = calculate_token_metrics(overall_index)
-
-# Merge token metrics with metadata
-token_df = pd.merge(
-    metadata_df,
-    token_metrics_df,
-    on='id',
-    how='left'
-)
+# Calculate indices on startup, or load them from the snapshot of the current
+# input data (see snapshot.py). The refresher keeps them current in the
+# background and swaps in a new immutable state object when they change.
+# Attached workers leave all of that to the builder and follow what it publishes.
+if STATE_MODE == "attach":
+    refresher = StateFollower(PRICE_POLL_SECONDS)
+else:
+    refresher = StateRefresher(load_or_build(), PRICE_POLL_SECONDS, STATE_REBUILD_SECONDS)
+
+
+def current_state():
+    # Read once per request: every value used to answer it comes from one version
+    return refresher.state
 
-# Fill NaN values with defaults
-token_df['usens'] = token_df['usens'].fillna(0)
-token_df['dsens'] = token_df['dsens'].fillna(0)
-token_df['beta'] = token_df['beta'].fillna(0)
-token_df['change24h'] = token_df['change24h'].fillna(0)
-token_df['change7d'] = token_df['change7d'].fillna(0)
-token_df['overbought_coef'] = token_df['overbought_coef'].fillna(0)
 
 # Print summary of token metrics calculation
-print(f"Calculated metrics for {len(token_metrics_df)} tokens")
-print(token_df.columns)
-print(token_df.head())
+print(f"Calculated metrics for {len(current_state().token_metrics_df)} tokens")
+print(current_state().token_df.columns)
+print(current_state().token_df.head())
 
 
 
@@ -191,20 +189,6 @@ print(token_df.head())
 #     }
 # ]
 
-overbought = [
-    {"symbol": "$GNOME", "change": 3.2},
-    {"symbol": "$GNOME", "change": 5.7},
-    {"symbol": "$GNOME", "change": 12.4},
-    {"symbol": "$GNOME", "change": 7.1}
-]
-
-oversold = [
-    {"symbol": "$GNOME", "change": -4.8},
-    {"symbol": "$GNOME", "change": -7.3},
-    {"symbol": "$GNOME", "change": -9.6},
-    {"symbol": "$GNOME", "change": -3.2}
-]
-
 underradar_picks = [
     {"name": "ATO", "hasReport": True},
     {"name": "GHI", "hasReport": True},
@@ -240,121 +224,78 @@ underradar_markets = [
     {"id": "gamefi", "name": "GameFi", "size": "sm"}
 ]
 
-# Market heatmap data - calculated from real market data
-heatmap_markets = []
-all_market_ids = list(good_tags.keys())
-for market_id in all_market_ids:
-    # Use the trending_markets and underradar_markets to build the heatmap
-    # Get market data from precalculations based on tags
-    market_data = tag_indices.get(market_id, pd.DataFrame())
-    if not market_data.empty:
-        # Get the latest market cap and 24h change
-        latest_data = market_data.iloc[-1]
-        prev_data = market_data.iloc[-2] if len(market_data) > 1 else market_data.iloc[-1]
-        
-        # Calculate 24h change percentage
-        change_24h = ((latest_data['index_value'] - prev_data['index_value']) / prev_data['index_value']) * 100
-        last_total_mcap = latest_data['total_mcap']
-        
-        heatmap_markets.append({
-            "id": market_id,
-            "name": market_id,
-            "size": (last_total_mcap / 1e9) / 3 + 2,
-            "marketCap": latest_data['total_market_cap'],
-            "change24h": change_24h
-        })
-
 # API endpoints
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Web3 Material Backend API"}
 
+# Filters: ``tag`` (repeatable, the token must have all), ``betaDesc`` (repeatable:
+# HR/MR/LR), ``change24h_min``/``change24h_max`` and ``overbought_min``/
+# ``overbought_max`` (inclusive). ``sort`` is ``field[:asc|desc],...`` over
+# underScore, change24h, change7d, beta, usens, dsens, fdv, overboughtOversold;
+# the default is underScore:desc. ``total`` counts the matching tokens.
 @app.get("/api/tokens")
-async def get_tokens(skip: int = 0, limit: int = 30):
-    # Convert token_df to a list of dictionaries with the required format
-    formatted_tokens = []
-    for _, row in token_df.iterrows():
-        formatted_token = {
-            "id": row['id'],
-            "name": row['name'],
-            "symbol": row['symbol'],
-            "fdv": row['fdv'] if 'fdv' in row else 0,
-            "change24h": row['change24h'],
-            "change7d": row['change7d'],
-            "underScore": int(row['usens'] * 100),
-            "scoreRating": "Great" if row['usens'] > 0.7 else "Good" if row['usens'] > 0.5 else "Fair",
-            "tags": [tag.strip() for tag in row['tags'].split(',') if isinstance(row['tags'], str) and tag.strip() in good_tags] if isinstance(row['tags'], str) else [],
-            "usens": row['usens'],
-            "dsens": row['dsens'],
-            "beta": row['beta'],
-            "betaDesc": "HR" if row['beta'] > 2.0 else "MR" if row['beta'] > 1.0 else "LR",
-            "overboughtOversold": row['overbought_coef']
-        }
-        formatted_tokens.append(formatted_token)
-    
-    # Sort tokens by underScore in descending order
-    sorted_tokens = sorted(formatted_tokens, key=lambda x: x["underScore"], reverse=True)
-    
-    # Get total count for pagination
-    total_count = len(sorted_tokens)
-    
-    # Return the requested segment
-    return {
-        "tokens": sorted_tokens[skip:skip+limit],
-        "total": total_count
-    }
+async def get_tokens(request: Request, skip: int = 0, limit: int = 30,
+                     tag: Optional[List[str]] = Query(None), betaDesc: Optional[List[str]] = Query(None),
+                     change24h_min: Optional[float] = None, change24h_max: Optional[float] = None,
+                     overbought_min: Optional[float] = None, overbought_max: Optional[float] = None,
+                     sort: Optional[str] = None):
+    state = current_state()
+    media_type = negotiate(request.headers.get("accept"))
+    try:
+        sort_keys = parse_sort(sort) if sort else DEFAULT_SORT
+    except ValueError as exc:
+        return {"error": str(exc)}
+    query = (
+        tuple(sorted(set(tag or ()))), tuple(sorted(set(betaDesc or ()))),
+        (change24h_min, change24h_max), (overbought_min, overbought_max), sort_keys,
+    )
+    # Listings aren't put in the response cache: every filter / page is a key
+    # of its own and would push out the index and chart bodies kept there
+    if query == ((), (), (None, None), (None, None), DEFAULT_SORT):
+        if media_type == JSON:
+            # Slice the precomputed underScore ranking; records are already encoded
+            return Response(content=state.token_index.page_json(skip, limit), media_type=JSON, headers={"Vary": "Accept"})
+
+        def encode():
+            return encode_columns(state.token_index.page_columns(skip, limit), media_type, {"total": state.token_index.total})
+    else:
+        def encode():
+            positions = state.token_index.select(*query)
+            if media_type == JSON:
+                return state.token_index.positions_json(positions, skip, limit)
+            return encode_columns(state.token_index.positions_columns(positions, skip, limit), media_type, {"total": len(positions)})
+
+    return Response(content=await run_in_pool(encode), media_type=media_type, headers={"Vary": "Accept"})
 
 @app.get("/api/tokens/{token_id}")
 async def get_token(token_id: str):
-    # Try to find token in our calculated token metrics dataframe
-    token_data = token_df[token_df['id'] == int(token_id)]
-    if not token_data.empty:
-        token_data = token_data.iloc[0].to_dict()
-    else:
-        token_data = {}
-    
-    if token_data:
-        # Convert to dictionary format matching the mock data structure
-        return {
-            "id": token_data['id'],
-            "name": token_data['name'],
-            "symbol": token_data['symbol'],
-            "fdv": token_data['fdv'] if 'fdv' in token_data else 0,
-            "change24h": token_data['change24h'],
-            "change7d": token_data['change7d'],
-            "underScore": int(token_data['usens'] * 100) if 'usens' in token_data else 0,
-            "scoreRating": "Great" if token_data['usens'] > 0.7 else "Good" if token_data['usens'] > 0.5 else "Fair",
-            "tags": token_data['tags'].split(',') if isinstance(token_data['tags'], str) else [],
-            "usens": token_data['usens'],
-            "dsens": token_data['dsens'],
-            "beta": token_data['beta'],
-            "betaDesc": "HR" if token_data['beta'] > 2.0 else "MR" if token_data['beta'] > 1.0 else "LR",
-            "overboughtOversold": token_data['overbought_coef']
-        }
-    
-    # Fallback to mock data if not found in calculated metrics
-    for token in tokens:
-        if token["id"] == token_id:
-            return token
-            
-    return {"error": "Token not found"}
+    # O(1) lookup of the pre-encoded record in the id index
+    token_data = current_state().token_index.get_json(token_id)
+    if token_data is None:
+        return {"error": "Token not found"}
+    return Response(content=token_data, media_type="application/json")
 
 @app.get("/api/market-state")
 async def get_market_state():
     return {
     "name": "Comeback",
     "status": "Comeback",
-    "changePercent": overall_index["index_return"].iloc[-8:].sum() * 100,
+    "changePercent": current_state().market_change_percent,
     "indexName": "Solana Leaders Index"
 }
 
+# Tokens with the highest / lowest overbought coefficient, optionally within one
+# tag; ``limit`` is capped at leaderboard.LEADERBOARD_SIZE
 @app.get("/api/overbought")
-async def get_overbought():
-    return overbought
+async def get_overbought(limit: int = Query(4, ge=0), tag: Optional[str] = None):
+    entries = current_state().leaderboards.get((tag, True), [])
+    return Response(content=leaderboard_json(entries, limit), media_type="application/json")
 
 @app.get("/api/oversold")
-async def get_oversold():
-    return oversold
+async def get_oversold(limit: int = Query(4, ge=0), tag: Optional[str] = None):
+    entries = current_state().leaderboards.get((tag, False), [])
+    return Response(content=leaderboard_json(entries, limit), media_type="application/json")
 
 @app.get("/api/underradar-picks")
 async def get_underradar_picks():
@@ -372,91 +313,52 @@ async def get_trending_markets():
 async def get_underradar_markets():
     return underradar_markets
 
+def normalized_chart(index_values, points):
+    # Get the last N points from the overall market index
+    last_n_points = index_values[-points:]
+    if len(last_n_points) == 0:
+        return []
+
+    # Normalize the index values between 0 and 100
+    min_value = last_n_points.min()
+    max_value = last_n_points.max()
+    if max_value > min_value:  # Avoid division by zero
+        normalized = ((last_n_points - min_value) / (max_value - min_value)) * 100
+        return [{"x": i, "y": y} for i, y in enumerate(normalized.tolist())]
+    return [{"x": i, "y": 0} for i in range(len(last_n_points))]
+
 # Generate mock chart data
 @app.get("/api/market-chart-data")
-async def get_chart_data(points: int = 20):
-    # Get the last N points from the overall market index
-    last_n_points = overall_index.iloc[-points:].reset_index()
-    
-    # Calculate the min and max values for normalization
-    min_value = last_n_points["index_value"].min()
-    max_value = last_n_points["index_value"].max()
-    
-    chart_data = []
-    
-    for i in range(len(last_n_points)):
-        # Normalize the index value between 0 and 100
-        normalized_value = 0
-        if max_value > min_value:  # Avoid division by zero
-            normalized_value = ((last_n_points["index_value"].iloc[i] - min_value) / 
-                               (max_value - min_value)) * 100
-        
-        chart_data.append({
-            "x": i,
-            "y": normalized_value
-        })
-    
-    return chart_data
+async def get_chart_data(request: Request, points: int = 20):
+    return await serve_cached(request, current_state(), ("market-chart-data", points),
+                              lambda state: dumps(normalized_chart(state.index_values, points)))
 
 # Best performer token
 @app.get("/api/best-performer")
 async def get_best_performer():
-    # Find the best performing tag based on the most recent index return
-    best_tag = None
-    best_change24h = -float('inf')
-    best_change7d = -float('inf')
-    
-    for tag, index_df in tag_indices.items():
-        if len(index_df) >= 2:  # Need at least 2 data points for 24h change
-            # Calculate 24h change (most recent return)
-            change24h = index_df["index_return"].iloc[-8:].sum() * 100
-            
-            # Calculate 7d change (compound last 7 returns if available)
-            last_n = min(7, len(index_df))
-            change7d = ((1 + index_df["index_return"].iloc[-last_n:]).prod() - 1) * 100
-            
-            # Update best performer if this tag has better 24h performance
-            if change24h > best_change24h:
-                best_tag = tag
-                best_change24h = change24h
-                best_change7d = change7d
-    
-    if best_tag:
-        return {
-            "id": best_tag.lower().replace(" ", "-"),
-            "name": best_tag.title(),
-            "change24h": round(best_change24h, 2),
-            "change7d": round(best_change7d, 2)
-        }
-    else:
-        # Fallback if no tags with sufficient data
-        return {
-            "id": "defi",
-            "name": "DeFi",
-            "change24h": 15.8,
-            "change7d": 42.3
-        }
-
-# Price dynamics data
+    # Ranked over the tag indices whenever the state is built (state.build_best_performer)
+    return current_state().best_performer
+
+# Price dynamics data: the token's price next to the overall market index and
+# its group (first listed tag with an index), daily, relative to the first day
 @app.get("/api/price-dynamics/{token_id}")
 async def get_price_dynamics(token_id: str, days: int = 30):
-    # Find the token
-    token = next((t for t in tokens if t["id"] == token_id), None)
-    if not token:
+    state = current_state()
+    try:
+        token_id = int(token_id)
+    except ValueError:
         return {"error": "Token not found"}
-    
-    # Generate price dynamics data similar to frontend mock
-    data = []
-    for i in range(days):
-        data.append({
-            "day": i + 1,
-            "price": 0.9 + math.sin(i / 5) * 0.1 + random.random() * 0.1,
-            "market": 0.85 + math.sin(i / 7) * 0.05 + random.random() * 0.1,
-            "group": 0.88 + math.sin(i / 6) * 0.06 + random.random() * 0.1,
-        })
-    
+    group = next((tag for tag in state.token_tags.get(token_id, ()) if tag in state.tag_series), None)
+    data = await run_in_pool(
+        price_dynamics, state.price_store, token_id, state.overall_series,
+        state.tag_series[group] if group else None, days,
+    )
+    if data is None:
+        return {"error": "Token not found"}
+
     return {
         "data": data,
+        "group": group,
         "score": ai_report["finalScore"],
         "scoreRating": ai_report["scoreRating"]
     }
@@ -480,30 +382,46 @@ async def get_fundamentals(token_id: str):
 
 # Market heatmap data
 @app.get("/api/market-heatmap")
-async def get_market_heatmap():
-    return heatmap_markets
+async def get_market_heatmap(request: Request):
+    return await serve_cached(request, current_state(), "market-heatmap", lambda state: dumps(state.heatmap_markets))
 
 # Top tokens for a specific market
 @app.get("/api/top-market-tokens/{market_id}")
 async def get_top_market_tokens(market_id: str, limit: int = 3):
-    # In a real app, you'd filter tokens by market/category
-    # For this mock, just return top tokens by underScore
-    sorted_tokens = sorted(tokens, key=lambda x: x["underScore"], reverse=True)
-    return sorted_tokens[:limit] if sorted_tokens else []
-
-# Get overall market cap weighted index
+    # Markets are tags; the first ``limit`` entries of the tag's underScore ranking
+    return Response(content=current_state().token_index.top_json(market_id, limit), media_type="application/json")
+
+# Get overall market cap weighted index. Without parameters the full history is
+# returned; ``start``/``end`` (ISO timestamps, inclusive) select a window,
+# ``resolution`` (3h, 1d, 1w, ...) keeps the last snapshot of each bucket and
+# ``points`` downsamples to at most that many rows (``downsample``: lttb or minmax).
+# Clients can ask for a columnar encoding through ``Accept`` (see columnar.py)
 @app.get("/api/index/overall")
-async def get_overall_index():
-    return overall_index.to_dict(orient="records")
+async def get_overall_index(request: Request, start: Optional[str] = None, end: Optional[str] = None,
+                            resolution: Optional[str] = None, points: Optional[int] = None,
+                            downsample: str = "lttb"):
+    state = current_state()
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type == JSON and all(param is None for param in (start, end, resolution, points)):
+        return await serve_cached(request, state, "index/overall", lambda state: state.overall_index_json)
+    return await serve_series(request, state, "index/overall", lambda state: state.overall_series,
+                              start, end, resolution, points, downsample, media_type)
 
 # Get list of all available tag indices
 @app.get("/api/index/tags")
 async def get_available_tag_indices():
-    return list(tag_indices.keys())
+    return list(current_state().tag_indices.keys())
 
-# Get market cap weighted index for a specific tag
+# Get market cap weighted index for a specific tag (same query parameters as the overall index)
 @app.get("/api/index/tag/{tag}")
-async def get_tag_index(tag: str):
-    if tag in tag_indices:
-        return tag_indices[tag].to_dict(orient="records")
+async def get_tag_index(request: Request, tag: str, start: Optional[str] = None, end: Optional[str] = None,
+                        resolution: Optional[str] = None, points: Optional[int] = None,
+                        downsample: str = "lttb"):
+    state = current_state()
+    if tag in state.tag_index_json:
+        media_type = negotiate(request.headers.get("accept"))
+        if media_type == JSON and all(param is None for param in (start, end, resolution, points)):
+            return await serve_cached(request, state, ("index/tag", tag), lambda state: state.tag_index_json[tag])
+        return await serve_series(request, state, ("index/tag", tag), lambda state: state.tag_series[tag],
+                                  start, end, resolution, points, downsample, media_type)
     return {"error": f"No index data available for tag: {tag}"} 
\ No newline at end of file
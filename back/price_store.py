@@ -0,0 +1,223 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+DAY_NS = pd.Timedelta("1d").value
+# Prices are only served relative to each other (see price_dynamics); float32's
+# ~7 significant digits are plenty and halve the largest array
+PRICE_DTYPE = np.float32
+ARRAYS = ("ids", "offsets", "timestamps", "prices")
+
+
+class PriceStore:
+    """
+    Price history laid out token by token.
+
+    Rows are sorted by (id, timestamp) into flat arrays, and an offset table
+    gives each token's contiguous slice: ``offsets[i]:offsets[i + 1]`` for
+    the i-th id in ``ids``. Looking a token up is a dict hit plus two array
+    views, and any window of its history is a binary search on its own
+    timestamps, independent of how many other tokens there are.
+
+    Stores are never modified: ``append`` returns a new one, so served states
+    can keep using theirs. Appended rows go to a small in-memory ``tail``
+    store layered over the base arrays, which are shared as they are; the
+    two are only merged when the store is saved (i.e. at a rebuild or
+    snapshot), so an incremental update costs time in the new rows and a
+    memory-mapped base stays mapped.
+
+    Timestamps are int64 epoch nanoseconds and prices float32. ``save`` writes
+    the arrays as ``.npy`` files and returns a store memory-mapping them
+    read-only; a file-backed store pickles as its directory (plus its tail)
+    and maps the files again when unpickled, so every process loading the
+    same snapshot shares one copy of the history through the page cache.
+    """
+
+    def __init__(self, ids, offsets, timestamps, prices, directory=None, tail=None):
+        self.ids = ids
+        self.offsets = offsets
+        self.timestamps = timestamps
+        self.prices = prices
+        self.directory = directory
+        self.tail = tail
+        self.codes = {token_id: code for code, token_id in enumerate(ids.tolist())}
+
+    def __getstate__(self):
+        if self.directory is not None:
+            return {"directory": self.directory, "tail": self.tail}
+        return {name: getattr(self, name) for name in ARRAYS} | {"tail": self.tail}
+
+    def __setstate__(self, state):
+        if "directory" in state:
+            state = {name: np.load(os.path.join(state["directory"], f"{name}.npy"), mmap_mode="r") for name in ARRAYS} | state
+        self.__init__(**state)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS) + (self.tail.nbytes if self.tail is not None else 0)
+
+    def save(self, directory):
+        """
+        Write the arrays, with the tail merged in, to ``directory`` (replacing it) and map them back.
+
+        Returns:
+            File-backed PriceStore over the written arrays
+        """
+        merged = self.merged()
+        tmp_directory = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_directory, f"{name}.npy"), np.ascontiguousarray(getattr(merged, name)))
+        # Processes still mapping the old files keep them until they unmap
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_directory, directory)
+        return PriceStore.open(directory)
+
+    @classmethod
+    def open(cls, directory):
+        """Map a store written by ``save`` read-only."""
+        store = cls.__new__(cls)
+        store.__setstate__({"directory": directory})
+        return store
+
+    @classmethod
+    def from_frame(cls, prices_df):
+        """Build from rows in the ``solprices_df`` schema."""
+        ids = np.asarray(prices_df['id'])
+        timestamps = pd.to_datetime(prices_df['timestamp']).values.astype("datetime64[ns]").view(np.int64)
+        order = np.lexsort((timestamps, ids))
+        sorted_ids = ids[order]
+        unique_ids, starts = np.unique(sorted_ids, return_index=True)
+        offsets = np.append(starts, len(sorted_ids)).astype(np.int64)
+        prices = prices_df['price'].to_numpy(dtype=PRICE_DTYPE)[order]
+        return cls(unique_ids, offsets, timestamps[order], prices)
+
+    def __contains__(self, token_id):
+        return token_id in self.codes or (self.tail is not None and token_id in self.tail)
+
+    def series(self, token_id):
+        """
+        Timestamps (epoch ns) and prices of ``token_id``; None if unknown.
+
+        Views of the base arrays, or, for a token with rows in the tail, a
+        concatenation of its own base and tail slices.
+        """
+        code = self.codes.get(token_id)
+        tail = self.tail.series(token_id) if self.tail is not None else None
+        if code is None:
+            return tail
+        lo, hi = self.offsets[code], self.offsets[code + 1]
+        if tail is None:
+            return self.timestamps[lo:hi], self.prices[lo:hi]
+        return np.concatenate([self.timestamps[lo:hi], tail[0]]), np.concatenate([self.prices[lo:hi], tail[1]])
+
+    def append(self, prices_df):
+        """
+        Store with ``prices_df``'s rows added; they must be newer than each token's history.
+
+        The rows are merged into the tail only; the base arrays are shared
+        with this store.
+        """
+        if prices_df.empty:
+            return self
+        new = PriceStore.from_frame(prices_df)
+        tail = new if self.tail is None else self.tail._merge(new)
+        return PriceStore(self.ids, self.offsets, self.timestamps, self.prices, self.directory, tail)
+
+    def merged(self):
+        """In-memory store with the tail merged into the base arrays (itself when there is no tail)."""
+        if self.tail is None:
+            return self
+        return PriceStore(self.ids, self.offsets, self.timestamps, self.prices)._merge(self.tail)
+
+    def _merge(self, new):
+        # Rows of known tokens are inserted at the end of their slices and new
+        # tokens get slices after the existing ones, in one linear pass
+        known = np.array([token_id in self.codes for token_id in new.ids.tolist()], dtype=bool)
+        counts = np.diff(new.offsets)
+        rows_known = np.repeat(known, counts)
+
+        # Every known token's new rows go right before the start of the next token's slice
+        codes = np.array([self.codes[token_id] for token_id in new.ids[known].tolist()], dtype=np.intp)
+        positions = np.repeat(self.offsets[codes + 1], counts[known])
+        timestamps = np.insert(self.timestamps, positions, new.timestamps[rows_known])
+        prices = np.insert(self.prices, positions, new.prices[rows_known])
+        added = np.zeros(len(self.ids), dtype=np.int64)
+        added[codes] = counts[known]
+        offsets = self.offsets + np.concatenate([[0], np.cumsum(added)])
+
+        if not known.all():
+            timestamps = np.concatenate([timestamps, new.timestamps[~rows_known]])
+            prices = np.concatenate([prices, new.prices[~rows_known]])
+            new_offsets = offsets[-1] + np.cumsum(counts[~known])
+            offsets = np.concatenate([offsets, new_offsets])
+        ids = np.concatenate([self.ids, new.ids[~known]])
+        return PriceStore(ids, offsets, timestamps, prices)
+
+
+def _as_of(timestamps, values, at):
+    # Last value at or before each of ``at``, NaN before the first one
+    positions = np.searchsorted(timestamps, at, side="right") - 1
+    result = np.full(len(at), np.nan)
+    found = positions >= 0
+    result[found] = values[positions[found]]  # widened to float64
+    return result
+
+
+def _relative(values):
+    # Relative to the first available value, so every line starts at 1
+    finite = np.flatnonzero(np.isfinite(values) & (values != 0))
+    if len(finite) == 0:
+        return np.full(len(values), np.nan)
+    return values / values[finite[0]]
+
+
+def price_dynamics(store, token_id, market_series, group_series, days=30):
+    """
+    Daily price, market and group lines of a token over its last ``days`` days.
+
+    The days are those of the market index: each point is taken at the last
+    index snapshot of the day, with the token's price and the group index as
+    of that time. Every line is divided by its first value in the window.
+
+    Args:
+        store: PriceStore with the token's history
+        token_id: Token id
+        market_series: IndexSeries of the overall market index
+        group_series: IndexSeries of the token's tag index, or None
+        days: Number of days to return
+
+    Returns:
+        List of dicts with day, timestamp, price, market and group (None where
+        there is no data), or None when the token has no price history
+    """
+    series = store.series(token_id)
+    if series is None:
+        return None
+    if days <= 0 or len(market_series) == 0:
+        return []
+    timestamps, prices = series
+
+    last_day = market_series.timestamps[-1] // DAY_NS
+    window = market_series.window(start=(last_day - days + 1) * DAY_NS).resample(DAY_NS)
+    at = window.timestamps
+    price = _relative(_as_of(timestamps, prices, at))
+    market = _relative(window.columns["index_value"])
+    if group_series is not None:
+        group = _relative(_as_of(group_series.timestamps, group_series.columns["index_value"], at))
+    else:
+        group = np.full(len(at), np.nan)
+
+    return [
+        {
+            "day": day + 1,
+            "timestamp": pd.Timestamp(at[day]).isoformat(),
+            "price": None if np.isnan(price[day]) else float(price[day]),
+            "market": None if np.isnan(market[day]) else float(market[day]),
+            "group": None if np.isnan(group[day]) else float(group[day]),
+        }
+        for day in range(len(at))
+    ]
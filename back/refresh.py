@@ -0,0 +1,71 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from snapshot import load_or_build
+
+
+def _build_market(prices_path, metadata_path):
+    # Runs in the rebuild worker process; loads the snapshot if one matches
+    return load_or_build(prices_path, metadata_path)
+
+
+class StateRefresher:
+    """
+    Keeps the served state current in the background and swaps it atomically.
+
+    Endpoints read ``state`` once per request and only use that object. It is
+    an immutable ``ServedState``, so a request always sees one consistent
+    version of every index and metric. The refresh loop polls the inputs:
+    appended price snapshots are folded in incrementally on a worker thread,
+    while changed metadata, a rewritten price file or the periodic full
+    rebuild recompute everything in a separate process, keeping the event
+    loop (and the GIL) free to serve requests. Either way the new state is
+    published with a single reference assignment.
+    """
+
+    def __init__(self, market, poll_seconds=60, rebuild_seconds=0):
+        self.market = market
+        self.state = market.state
+        self.poll_seconds = poll_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.last_rebuild = time.monotonic()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.refresh()
+            except Exception as exc:
+                print(f"State refresh failed: {exc}")
+
+    async def refresh(self):
+        """Bring the served state up to date with the inputs on disk."""
+        rebuild_due = self.rebuild_seconds and time.monotonic() - self.last_rebuild >= self.rebuild_seconds
+        if rebuild_due or await asyncio.to_thread(self.market.needs_rebuild):
+            await self.rebuild()
+        else:
+            await self.apply_new_prices()
+
+    async def apply_new_prices(self):
+        new_rows, offset = await asyncio.to_thread(self.market.read_new_prices)
+        touched = await asyncio.to_thread(self.market.apply_new_prices, new_rows, offset)
+        if new_rows.empty:
+            return
+        self.state = self.market.state
+        print(f"Applied {len(new_rows)} new price rows for {len(touched)} tokens")
+
+    async def rebuild(self):
+        loop = asyncio.get_running_loop()
+        # Spawned, not forked: the parent runs an event loop and worker threads
+        pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            market = await loop.run_in_executor(pool, _build_market, self.market.prices_path, self.market.metadata_path)
+        finally:
+            # Joining the worker blocks, so keep it off the event loop too
+            await asyncio.to_thread(pool.shutdown)
+        self.market = market
+        self.state = market.state
+        self.last_rebuild = time.monotonic()
+        print(f"Rebuilt state {self.state.data_version}")
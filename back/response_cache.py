@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Response
+
+# Brotli is optional; without it clients asking for br get gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this aren't worth compressing (same default as GZipMiddleware)
+MIN_COMPRESS_SIZE = 500
+# Superseded data versions remembered to tell a late put from a new version
+RETIRED_VERSIONS = 16
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """An encoded response body with its ETag and compressed variants."""
+    body: bytes
+    etag: str
+    media_type: str = "application/json"
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+
+    @classmethod
+    def encode(cls, body: bytes, media_type="application/json"):
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        if len(body) < MIN_COMPRESS_SIZE:
+            return cls(body, etag, media_type)
+        return cls(
+            body,
+            etag,
+            media_type,
+            gzip=gzip.compress(body, compresslevel=6, mtime=0),
+            br=brotli.compress(body, quality=5) if brotli is not None else None,
+        )
+
+
+def _accepted_encodings(header: str):
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _etag_matches(header: str, etag: str):
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+class ResponseCache:
+    """
+    Encoded responses of the read-only endpoints, keyed by data version.
+
+    Entries are looked up by ``(data_version, key)``, where ``key`` names the
+    endpoint and its parameters, and hold the JSON body together with its
+    ETag and gzip/brotli variants, all computed once. Publishing a new state
+    changes the data version, which drops every entry of the previous one;
+    versions only move forward, so a put for a version the cache has already
+    moved past (a request still finishing on an older state) is served but
+    not cached. At most ``max_entries`` responses of the current version are kept, least
+    recently used first out.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.data_version = None
+        self.retired = OrderedDict()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, data_version, key):
+        with self._lock:
+            if data_version != self.data_version:
+                return None
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def put(self, data_version, key, body: bytes, media_type="application/json"):
+        """Encode ``body`` and cache it as the response for ``key`` at ``data_version``."""
+        entry = CachedResponse.encode(body, media_type)
+        with self._lock:
+            self.misses += 1
+            if data_version != self.data_version:
+                if data_version in self.retired:
+                    return entry
+                if self.data_version is not None:
+                    self.retired[self.data_version] = None
+                    while len(self.retired) > RETIRED_VERSIONS:
+                        self.retired.popitem(last=False)
+                self.data_version = data_version
+                self.entries.clear()
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+
+def cached_response(request, entry: CachedResponse) -> Response:
+    """
+    Serve ``entry``: 304 when the client has it already, else the best encoding it accepts.
+    """
+    headers = {"ETag": entry.etag, "Vary": "Accept, Accept-Encoding", "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    if entry.br is not None and "br" in accepted:
+        return Response(content=entry.br, media_type=entry.media_type, headers=dict(headers, **{"Content-Encoding": "br"}))
+    if entry.gzip is not None and "gzip" in accepted:
+        return Response(content=entry.gzip, media_type=entry.media_type, headers=dict(headers, **{"Content-Encoding": "gzip"}))
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
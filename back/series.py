@@ -0,0 +1,290 @@
+import numpy as np
+import pandas as pd
+
+from columnar import JSON, encode_columns
+from token_index import _native, dumps
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def parse_time(value):
+    """ISO date/datetime to epoch nanoseconds (naive, as in the price data); None passes through."""
+    if value is None:
+        return None
+    timestamp = pd.Timestamp(value)
+    if timestamp is pd.NaT:
+        raise ValueError(f"Invalid timestamp: {value}")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp.value
+
+
+def parse_resolution(value):
+    """Bucket width like ``3h``, ``1d`` or ``1w`` in nanoseconds; None passes through."""
+    if value is None:
+        return None
+    step = pd.Timedelta(value).value
+    if step <= 0:
+        raise ValueError(f"Resolution must be positive: {value}")
+    return step
+
+
+def lttb(x, y, n):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Args:
+        x: Increasing x values (float)
+        y: Values to keep the visual shape of
+        n: Number of points to keep, at least 3
+
+    Returns:
+        Sorted positions of the kept points, always including the first and last
+    """
+    length = len(x)
+    if n >= length or n < 3:
+        return np.arange(length)
+    keep = np.empty(n, dtype=np.intp)
+    keep[0], keep[-1] = 0, length - 1
+    # Inner points split into n - 2 buckets; bucket i covers edges[i]:edges[i + 1]
+    edges = (np.arange(n - 1) * (length - 2) / (n - 2)).astype(np.intp) + 1
+    edges[-1] = length - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Third corner: average of the next bucket (or the last point)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else length
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(y, n):
+    """
+    Min/max downsampling: the lowest and highest point of each of ``(n - 2) // 2`` equal buckets.
+
+    Returns:
+        Sorted positions of at most ``n`` kept points, always including the first and last
+    """
+    length = len(y)
+    if n >= length or n < 2:
+        return np.arange(length)
+    edges = np.linspace(0, length, (n - 2) // 2 + 1).astype(np.intp)
+    keep = [0, length - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            keep.append(lo + int(np.argmin(y[lo:hi])))
+            keep.append(lo + int(np.argmax(y[lo:hi])))
+    return np.unique(keep)
+
+
+class IndexSeries:
+    """
+    Index history as timestamp-sorted arrays, for windowed and downsampled queries.
+
+    Timestamps are epoch nanoseconds, so a ``start``/``end`` window is two
+    binary searches. Resampling to a coarser resolution and downsampling
+    both keep a subset of rows (the last snapshot of each bucket, or the
+    points LTTB / min-max pick); ``index_return`` of a kept row is
+    compounded over the rows dropped since the previous kept one, so the
+    returns still chain up to ``index_value``.
+    """
+
+    COLUMNS = ("index_return", "total_market_cap", "index_value", "normalized_index", "total_mcap")
+
+    def __init__(self, timestamps, columns):
+        self.timestamps = timestamps
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, index_df):
+        timestamps = pd.to_datetime(index_df["timestamp"]).values.astype("datetime64[ns]").view(np.int64)
+        columns = {column: index_df[column].to_numpy(dtype=float) for column in cls.COLUMNS if column in index_df}
+        return cls(timestamps, columns)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def window(self, start=None, end=None):
+        """Rows with ``start <= timestamp <= end`` (epoch ns, either bound optional)."""
+        lo = 0 if start is None else np.searchsorted(self.timestamps, start, side="left")
+        hi = len(self) if end is None else np.searchsorted(self.timestamps, end, side="right")
+        return IndexSeries(self.timestamps[lo:hi], {name: values[lo:hi] for name, values in self.columns.items()})
+
+    def take(self, keep):
+        """Rows at the sorted positions ``keep``, with returns compounded between them."""
+        if len(keep) == 0:
+            return IndexSeries(self.timestamps[:0], {name: values[:0] for name, values in self.columns.items()})
+        columns = {name: values[keep] for name, values in self.columns.items()}
+        if "index_return" in self.columns:
+            starts = np.concatenate([[0], keep[:-1] + 1])
+            growth = 1 + self.columns["index_return"][:keep[-1] + 1]
+            columns["index_return"] = np.multiply.reduceat(growth, starts) - 1
+        return IndexSeries(self.timestamps[keep], columns)
+
+    def resample(self, step):
+        """The last row of every ``step``-wide bucket (aligned to the epoch)."""
+        if len(self) == 0:
+            return self
+        buckets = self.timestamps // step
+        keep = np.flatnonzero(np.diff(buckets, append=buckets[-1] + 1))
+        return self.take(keep)
+
+    def downsample(self, points, method="lttb"):
+        """At most ``points`` rows that keep the shape of ``index_value``."""
+        if len(self) <= points:
+            return self
+        values = self.columns["index_value"]
+        if method == "minmax":
+            keep = minmax(values, points)
+        else:
+            keep = lttb(self.timestamps.astype(float), values, points)
+        return self.take(keep)
+
+    def query(self, start=None, end=None, resolution=None, points=None, method="lttb"):
+        """Window, then resample, then downsample; every step is optional."""
+        series = self.window(start, end)
+        if resolution is not None:
+            series = series.resample(resolution)
+        if points is not None:
+            series = series.downsample(points, method)
+        return series
+
+    def records(self):
+        """Rows in the ``to_dict(orient="records")`` layout of the index DataFrames."""
+        timestamps = [pd.Timestamp(value).isoformat() for value in self.timestamps.tolist()]
+        columns = {name: [_native(value) for value in values.tolist()] for name, values in self.columns.items()}
+        return [
+            {"timestamp": timestamp, **{name: values[i] for name, values in columns.items()}}
+            for i, timestamp in enumerate(timestamps)
+        ]
+
+    def to_json(self) -> bytes:
+        return dumps(self.records())
+
+    def encode(self, media_type=JSON) -> bytes:
+        """Body in a negotiated media type: records as JSON, or one of the columnar encodings."""
+        if media_type == JSON:
+            return self.to_json()
+        return encode_columns({"timestamp": self.timestamps.view("datetime64[ns]"), **self.columns}, media_type)
+
+
+class IndexBuffer:
+    """
+    Append-only index history in capacity-doubling arrays.
+
+    The incremental engine extends an index by one row per snapshot; with
+    spare capacity that is a write past the current length instead of a copy
+    of the whole history. ``series``, ``frame`` and ``to_json`` hand out views
+    of (or bytes built from) the first ``len`` rows and are cached until the
+    next append, so unchanged indices cost nothing to serve again. Rows are
+    only ever written past the length, never in place, so views handed out
+    earlier stay valid while the buffer grows.
+
+    Every row is also kept JSON encoded as a record, so the records body is a
+    join of already encoded rows.
+    """
+
+    COLUMNS = IndexSeries.COLUMNS
+
+    def __init__(self, timestamps, columns, records, capacity=None):
+        length = len(timestamps)
+        capacity = max(capacity or 0, length, 16)
+        self.length = length
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.timestamps[:length] = timestamps
+        self.columns = {}
+        for name in self.COLUMNS:
+            self.columns[name] = np.empty(capacity)
+            self.columns[name][:length] = columns[name]
+        self.records = list(records)
+        self._cache = {}
+
+    @classmethod
+    def from_frame(cls, index_df):
+        """Buffer holding the rows of an index DataFrame (see calculations.aggregate_index)."""
+        timestamps = pd.to_datetime(index_df["timestamp"]).values.astype("datetime64[ns]").view(np.int64)
+        columns = {name: index_df[name].to_numpy(dtype=float) for name in cls.COLUMNS}
+        records = [cls._encode(timestamp, {name: values[i] for name, values in columns.items()})
+                   for i, timestamp in enumerate(timestamps.tolist())]
+        return cls(timestamps, columns, records)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), {name: np.empty(0) for name in cls.COLUMNS}, [])
+
+    @classmethod
+    def _encode(cls, timestamp, values):
+        record = {"timestamp": pd.Timestamp(timestamp).isoformat()}
+        record.update((name, _native(float(values[name]))) for name in cls.COLUMNS)
+        return dumps(record)
+
+    def __len__(self):
+        return self.length
+
+    def __getstate__(self):
+        # Spare capacity and cached views aren't worth pickling
+        length = self.length
+        return {
+            "timestamps": self.timestamps[:length].copy(),
+            "columns": {name: values[:length].copy() for name, values in self.columns.items()},
+            "records": self.records[:length],
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["timestamps"], state["columns"], state["records"])
+
+    def last(self, name):
+        """Value of ``name`` in the last row, None when empty."""
+        return float(self.columns[name][self.length - 1]) if self.length else None
+
+    def append(self, timestamp, values):
+        """
+        Add one row.
+
+        Args:
+            timestamp: Epoch nanoseconds, after the last row's
+            values: Dict with a value for every column in ``COLUMNS``
+        """
+        if self.length == len(self.timestamps):
+            # Fresh arrays: views of the old ones handed out earlier stay as they were
+            capacity = 2 * len(self.timestamps)
+            timestamps = np.empty(capacity, dtype=np.int64)
+            timestamps[:self.length] = self.timestamps[:self.length]
+            self.timestamps = timestamps
+            for name, old in self.columns.items():
+                grown = np.empty(capacity)
+                grown[:self.length] = old[:self.length]
+                self.columns[name] = grown
+        self.timestamps[self.length] = timestamp
+        for name in self.COLUMNS:
+            self.columns[name][self.length] = values[name]
+        self.records.append(self._encode(timestamp, values))
+        self.length += 1
+        self._cache = {}
+
+    def series(self):
+        """``IndexSeries`` over the rows so far (views, no copy)."""
+        if "series" not in self._cache:
+            length = self.length
+            self._cache["series"] = IndexSeries(
+                self.timestamps[:length], {name: values[:length] for name, values in self.columns.items()})
+        return self._cache["series"]
+
+    def frame(self):
+        """The rows so far as an index DataFrame whose columns are views of the buffer."""
+        if "frame" not in self._cache:
+            length = self.length
+            columns = {"timestamp": self.timestamps[:length].view("datetime64[ns]")}
+            columns.update((name, values[:length]) for name, values in self.columns.items())
+            self._cache["frame"] = pd.DataFrame(columns, copy=False)
+        return self._cache["frame"]
+
+    def to_json(self) -> bytes:
+        """Rows as the JSON records body (``to_dict(orient="records")`` layout)."""
+        if "json" not in self._cache:
+            self._cache["json"] = b"[" + b",".join(self.records) + b"]"
+        return self._cache["json"]
@@ -0,0 +1,211 @@
+"""
+One builder process, any number of read-only API workers.
+
+Started as several uvicorn workers, every worker would load (or, without a
+snapshot, compute) the whole state and then keep it current on its own, so
+boot time and memory grow with the worker count. In the shared mode a single
+builder process owns the ``MarketData``: it loads or builds the snapshot,
+follows the inputs with a ``StateRefresher`` and publishes every new
+``ServedState`` to the snapshot directory. Workers started with
+``STATE_MODE=attach`` never read the CSVs: they load the published state,
+with the price history memory-mapped (see price_store.py), and switch to a
+newer one whenever the builder publishes it.
+
+From ``back/``::
+
+    python shared_state.py serve --workers 4     # builder + 4 attached uvicorn workers
+    python shared_state.py builder               # only the builder, e.g. as its own service
+    STATE_MODE=attach uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import dataclasses
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import time
+
+from refresh import StateRefresher
+from snapshot import SNAPSHOT_DIR, load_or_build
+
+# Name of the file pointing at the published state
+CURRENT_FILE = "current"
+# Published states kept for workers that are still loading an older one
+KEEP_PUBLISHED = 2
+# How long an attaching worker waits for the builder's first state
+ATTACH_TIMEOUT = float(os.getenv("STATE_ATTACH_TIMEOUT", "600"))
+
+
+def published_path(data_version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"served-{data_version}.pkl")
+
+
+def publish(state, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Write ``state`` for attached workers and point ``current`` at it.
+
+    A price history that isn't file-backed yet (after incremental updates)
+    is saved next to the state first.
+
+    Returns:
+        The published ServedState, with its file-backed price history
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = published_path(state.data_version, snapshot_dir)
+    if state.price_store.directory is None:
+        price_store = state.price_store.save(f"{path[:-len('.pkl')]}.prices")
+        state = dataclasses.replace(state, price_store=price_store)
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as state_file:
+        pickle.dump(state, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    current_path = os.path.join(snapshot_dir, CURRENT_FILE)
+    with open(f"{current_path}.tmp-{os.getpid()}", "w") as current_file:
+        current_file.write(os.path.basename(path))
+    os.replace(f"{current_path}.tmp-{os.getpid()}", current_path)
+
+    published = sorted(
+        (entry.path for entry in os.scandir(snapshot_dir) if entry.name.startswith("served-") and entry.name.endswith(".pkl")),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for old_path in published[KEEP_PUBLISHED:]:
+        os.remove(old_path)
+        shutil.rmtree(f"{old_path[:-len('.pkl')]}.prices", ignore_errors=True)
+    return state
+
+
+def current_name(snapshot_dir=SNAPSHOT_DIR):
+    """File name of the published state, or None before the first publication."""
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_FILE)) as current_file:
+            return current_file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_published(name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Load a published state by file name.
+
+    Returns:
+        ServedState, or None when it has been pruned in the meantime
+    """
+    try:
+        with open(os.path.join(snapshot_dir, name), "rb") as state_file:
+            return pickle.load(state_file)
+    except FileNotFoundError:
+        return None
+
+
+class StateFollower:
+    """
+    Read-only counterpart of ``StateRefresher`` for attached workers.
+
+    Serves the state the builder published last: ``state`` is loaded at
+    construction (waiting up to ``ATTACH_TIMEOUT`` seconds for the first
+    publication) and ``run`` polls the ``current`` pointer, swapping in each
+    newly published state with a single reference assignment.
+    """
+
+    def __init__(self, poll_seconds=60, snapshot_dir=SNAPSHOT_DIR, timeout=ATTACH_TIMEOUT):
+        self.poll_seconds = poll_seconds
+        self.snapshot_dir = snapshot_dir
+        deadline = time.monotonic() + timeout
+        self.name, self.state = None, None
+        while not self.load():
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"No published state in {snapshot_dir} after {timeout:.0f}s; is the builder running?")
+            time.sleep(0.5)
+        print(f"Attached to published state {self.state.data_version}")
+
+    def load(self):
+        """Switch to the published state if it changed; False when there is none to load."""
+        name = current_name(self.snapshot_dir)
+        if name is None:
+            return False
+        if name != self.name:
+            state = load_published(name, self.snapshot_dir)
+            if state is None:
+                return False
+            self.name, self.state = name, state
+        return True
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            previous = self.state
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception as exc:
+                print(f"Loading the published state failed: {exc}")
+            if self.state is not previous:
+                print(f"Switched to published state {self.state.data_version}")
+
+
+async def run_builder(poll_seconds, rebuild_seconds, snapshot_dir=SNAPSHOT_DIR):
+    """Build or load the state, publish it, then keep publishing every update."""
+    refresher = StateRefresher(load_or_build(snapshot_dir=snapshot_dir), poll_seconds, rebuild_seconds)
+    while True:
+        state = await asyncio.to_thread(publish, refresher.state, snapshot_dir)
+        # The builder keeps the published (memory-mapped) price history too, not a private copy
+        refresher.market.price_store = state.price_store
+        refresher.market.state = refresher.state = state
+        print(f"Published state {state.data_version}", flush=True)
+        while refresher.state.data_version == state.data_version:
+            await asyncio.sleep(poll_seconds)
+            try:
+                await refresher.refresh()
+            except Exception as exc:
+                print(f"State refresh failed: {exc}", flush=True)
+
+
+def serve(args):
+    """Start the builder, wait for its first publication, then run attached uvicorn workers."""
+    import uvicorn
+
+    current_path = os.path.join(args.dir, CURRENT_FILE)
+    previous = os.stat(current_path).st_mtime_ns if os.path.exists(current_path) else None
+    builder = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "builder", "--dir", args.dir,
+        "--poll", str(args.poll), "--rebuild", str(args.rebuild),
+    ])
+    try:
+        while not os.path.exists(current_path) or os.stat(current_path).st_mtime_ns == previous:
+            if builder.poll() is not None:
+                raise SystemExit(f"State builder exited with code {builder.returncode}")
+            time.sleep(0.5)
+        os.environ.update(STATE_MODE="attach", SNAPSHOT_DIR=args.dir, PRICE_POLL_SECONDS=str(args.poll))
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        builder.terminate()
+        builder.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the state builder, or the builder plus attached API workers")
+    parser.add_argument("command", choices=["builder", "serve"])
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--poll", type=float, default=float(os.getenv("PRICE_POLL_SECONDS", "60")),
+                        help="seconds between input checks (builder) and state checks (workers)")
+    parser.add_argument("--rebuild", type=float, default=float(os.getenv("STATE_REBUILD_SECONDS", "86400")))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.command == "builder":
+        if args.poll <= 0:
+            raise SystemExit("The builder needs --poll > 0")
+        # Rebuilds run in a spawned process that reads its snapshot directory from the environment
+        os.environ["SNAPSHOT_DIR"] = args.dir
+        asyncio.run(run_builder(args.poll, args.rebuild, args.dir))
+    else:
+        serve(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Persisted snapshots of the startup-computed state.
+
+The API loads a snapshot instead of recomputing the indices and token
+metrics when the input CSVs haven't changed since it was built. Build one
+offline (e.g. in the deploy pipeline) from ``back/`` with::
+
+    python snapshot.py build
+    python snapshot.py info
+
+The price history is written next to the pickle as ``.npy`` arrays
+(``state-<version>.prices/``) and memory-mapped read-only when the snapshot
+is loaded, so workers loading the same snapshot share it instead of each
+holding a copy.
+"""
+import argparse
+import dataclasses
+import os
+import pickle
+import shutil
+import time
+
+from frame_cache import source_fingerprint
+from state import METADATA_PATH, PRICES_PATH, MarketData, input_version
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".snapshots")
+# Older snapshots kept around for workers that are still booting from them
+KEEP_SNAPSHOTS = 2
+
+
+def current_version(prices_path=PRICES_PATH, metadata_path=METADATA_PATH):
+    """Input version of the CSVs as they are on disk right now, from their contents."""
+    return input_version(source_fingerprint(prices_path, hash_contents=True),
+                         source_fingerprint(metadata_path, hash_contents=True))
+
+
+def snapshot_path(version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"state-{version}.pkl")
+
+
+def price_store_dir(version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"state-{version}.prices")
+
+
+def save_snapshot(market, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Write ``market`` (engine, frames and served state) under its input version.
+
+    ``market`` switches to the memory-mapped copy of its price history, which
+    the pickle then refers to by directory.
+
+    Returns:
+        Path of the snapshot file
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    price_store = market.price_store.save(price_store_dir(market.input_version, snapshot_dir))
+    market.price_store = price_store
+    market.state = dataclasses.replace(market.state, price_store=price_store)
+
+    path = snapshot_path(market.input_version, snapshot_dir)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as snapshot_file:
+        pickle.dump(market, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+    snapshots = sorted(
+        (entry.path for entry in os.scandir(snapshot_dir) if entry.name.startswith("state-") and entry.name.endswith(".pkl")),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for old_path in snapshots[KEEP_SNAPSHOTS:]:
+        os.remove(old_path)
+        # Workers still mapping these arrays keep them until they let go
+        shutil.rmtree(f"{old_path[:-len('.pkl')]}.prices", ignore_errors=True)
+    return path
+
+
+def load_snapshot(prices_path=PRICES_PATH, metadata_path=METADATA_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Load the snapshot matching the current inputs.
+
+    Returns:
+        MarketData, or None when no snapshot for the current input version exists
+    """
+    path = snapshot_path(current_version(prices_path, metadata_path), snapshot_dir)
+    try:
+        with open(path, "rb") as snapshot_file:
+            market = pickle.load(snapshot_file)
+    except FileNotFoundError:
+        # No snapshot, or its price arrays were pruned
+        return None
+    market.prices_path = prices_path
+    market.metadata_path = metadata_path
+    return market
+
+
+def load_or_build(prices_path=PRICES_PATH, metadata_path=METADATA_PATH, snapshot_dir=SNAPSHOT_DIR, save=True):
+    """
+    Load the current snapshot, or compute the state and (optionally) save it.
+
+    Returns:
+        MarketData for the current inputs
+    """
+    market = load_snapshot(prices_path, metadata_path, snapshot_dir)
+    if market is not None:
+        print(f"Loaded state snapshot {market.input_version}")
+        return market
+    market = MarketData.build(prices_path, metadata_path)
+    if save:
+        try:
+            save_snapshot(market, snapshot_dir)
+        except OSError as exc:
+            print(f"Could not save state snapshot: {exc}")
+    return market
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect state snapshots")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--prices", default=PRICES_PATH)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    version = current_version(args.prices, args.metadata)
+    path = snapshot_path(version, args.dir)
+    if args.command == "info":
+        status = "present" if os.path.exists(path) else "missing"
+        print(f"input version {version}: {path} ({status})")
+        return
+
+    start = time.perf_counter()
+    market = MarketData.build(args.prices, args.metadata)
+    built = time.perf_counter() - start
+    path = save_snapshot(market, args.dir)
+    print(f"Built snapshot {market.input_version} in {built:.1f}s -> {path} "
+          f"({os.path.getsize(path) / 1e6:.1f} MB, price history {market.price_store.nbytes / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
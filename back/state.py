@@ -0,0 +1,492 @@
+import hashlib
+import io
+import json
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from frame_cache import load_frame, prepare_metadata, prepare_prices, source_fingerprint
+from incremental import IncrementalEngine
+from leaderboard import OverboughtLeaderboards
+from price_store import PriceStore
+from series import IndexSeries
+from token_index import TokenIndex, _native, dumps
+
+PRICES_PATH = "solprices_df.csv"
+METADATA_PATH = "metadata_df.csv"
+# Bump whenever the derived state changes shape, so older snapshots stop matching
+STATE_VERSION = 12
+# Bytes hashed at the start of the price file and just before the loaded offset
+IDENTITY_BYTES = 64 * 1024
+# Written next to the price file by writers that append whole snapshots (see
+# scripts/data_processing/solana_etl.py): the file size after the last one
+COMMITTED_SUFFIX = ".committed"
+
+good_tags = {
+ 'memes': 1075,
+ 'ai-big-data': 166,
+ 'animal-memes': 156,
+ 'pump-fun': 104,
+ 'gaming': 86,
+ 'defi': 85,
+ 'collectibles-nfts': 81,
+ 'cat-themed': 78,
+ 'ai-memes': 71,
+ 'doggone-doggerel': 59,
+ 'ai-agents': 58,
+ 'political-memes': 49,
+ 'play-to-earn': 35,
+ 'web3': 31,
+ 'metaverse': 30,
+ 'depin': 28,
+ 'rehypothecated-crypto': 21,
+ 'defai': 20,
+ 'distributed-computing': 18,
+ 'celebrity-memes': 13,
+ 'payments': 13,
+ 'ip-memes': 12,
+ 'entertainment': 12,
+ 'real-world-assets': 11,
+ 'derivatives': 11,
+ 'amm': 11,
+ 'desci': 11,
+ 'zodiac-themed': 11,
+ 'generative-ai': 10,
+ 'ai-agent-launchpad': 10,
+ 'dex': 10,
+ 'oracles': 9,
+ 'yield-farming': 9,
+ 'lending-borowing': 9,
+ 'interoperability': 9,
+ 'wallet': 9,
+ 'launchpad': 8,
+ 'move-to-earn': 8,
+ 'art': 7,
+ 'content-creation': 7,
+ 'telegram-bot': 7,
+ 'media': 6,
+ 'asset-management': 6,
+ 'communications-social-media': 6,
+ 'gambling': 6,
+ 'vr-ar': 5,
+ 'enterprise-solutions': 5,
+ 'storage': 5,
+ 'analytics': 4,
+ 'filesharing': 4,
+ 'store-of-value': 4,
+ 'pow': 4,
+ 'presale-memes': 4,
+ 'sports': 4,
+ 'adult': 4,
+ }
+
+
+def input_version(prices_source, metadata_source):
+    """
+    Version of the inputs the derived state is computed from.
+
+    Only the size and content hash of each file count, not its mtime, so a
+    snapshot built in the deploy pipeline still matches the same files
+    after a checkout or copy to another host.
+
+    Args:
+        prices_source: Fingerprint of the price CSV, with ``hash_contents``
+            (see frame_cache.source_fingerprint)
+        metadata_source: Fingerprint of the metadata CSV, likewise
+
+    Returns:
+        Short hex digest covering both files, the tag set and ``STATE_VERSION``
+    """
+    key = {
+        "state": STATE_VERSION,
+        "prices": {name: prices_source[name] for name in ("size", "sha256")},
+        "metadata": {name: metadata_source[name] for name in ("size", "sha256")},
+        "tags": sorted(good_tags),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def prices_identity(path, offset):
+    """
+    Hashes of the part of the price file that was already loaded.
+
+    Taken over the first and the last ``IDENTITY_BYTES`` before ``offset``: an
+    append leaves both alone, while a rewritten file (even one that grew)
+    almost certainly changes one of them. File metadata can't be used: the
+    mtime changes with every append and a snapshot may be loaded on a host
+    where the same file has another inode.
+
+    Returns:
+        Tuple of the two hex digests, or None when the file is shorter than ``offset``
+    """
+    with open(path, "rb") as prices_file:
+        head = prices_file.read(min(offset, IDENTITY_BYTES))
+        tail_start = max(offset - IDENTITY_BYTES, 0)
+        prices_file.seek(tail_start)
+        tail = prices_file.read(offset - tail_start)
+    if len(tail) < offset - tail_start:
+        return None
+    return hashlib.sha256(head).hexdigest(), hashlib.sha256(tail).hexdigest()
+
+
+def committed_size(path):
+    """Size of the price file up to its last complete snapshot, from its marker; None without one."""
+    try:
+        with open(path + COMMITTED_SUFFIX) as marker:
+            return int(marker.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _complete_snapshots(header, chunk):
+    # Cut off the rows of the chunk's last timestamp: a snapshot is only known
+    # to be complete once a later one has started
+    rows = pd.read_csv(io.BytesIO(header + chunk), usecols=['timestamp'], dtype=str)['timestamp']
+    last = rows.iloc[-1]
+    held = int((rows.iloc[::-1] != last).to_numpy().argmax()) if (rows != last).any() else len(rows)
+    end = len(chunk)
+    for _ in range(held):
+        end = chunk.rfind(b"\n", 0, end - 1) + 1
+    return chunk[:end]
+
+
+def collect_tags(metadata_df):
+    # Get all unique tags from metadata_df
+    all_tags = []
+    for tags_str in metadata_df['tags'].dropna():
+        tags = [tag.strip() for tag in tags_str.split(',')]
+        all_tags.extend(tags)
+    return list(set(all_tags))
+
+
+# Metric columns of token_df that default to 0 for tokens without metrics
+FILLED_METRICS = ('usens', 'dsens', 'beta', 'change24h', 'change7d', 'overbought_coef')
+
+
+def build_token_df(metadata_df, token_metrics_df):
+    # Merge token metrics with metadata
+    token_df = pd.merge(
+        metadata_df,
+        token_metrics_df,
+        on='id',
+        how='left'
+    )
+
+    # Fill NaN values with defaults
+    for column in FILLED_METRICS:
+        token_df[column] = token_df[column].fillna(0)
+    return token_df
+
+
+def update_token_df(token_df, token_metrics_df, ids):
+    """
+    ``build_token_df`` result with the metrics of the tokens in ``ids`` replaced.
+
+    Rows keep their order, so a ``TokenIndex`` of the old frame can be
+    updated in place of a rebuild (see ``TokenIndex.updated``).
+
+    Returns:
+        A new DataFrame; ``token_df`` is left as it is
+    """
+    token_df = token_df.copy()
+    rows = token_df['id'].isin(ids).to_numpy()
+    metrics = token_metrics_df[token_metrics_df['id'].isin(ids)].set_index('id')
+    row_ids = token_df['id'].to_numpy()[rows]
+    for column in metrics.columns:
+        values = metrics[column].reindex(row_ids)
+        if column in FILLED_METRICS:
+            values = values.fillna(0)
+        token_df.loc[rows, column] = values.to_numpy()
+    return token_df
+
+
+# Market heatmap data - calculated from real market data
+def build_heatmap_markets(tag_indices):
+    heatmap_markets = []
+    all_market_ids = list(good_tags.keys())
+    for market_id in all_market_ids:
+        # Use the trending_markets and underradar_markets to build the heatmap
+        # Get market data from precalculations based on tags
+        market_data = tag_indices.get(market_id, pd.DataFrame())
+        if not market_data.empty:
+            # Get the latest market cap and 24h change (last rows only, read from the arrays)
+            index_values = market_data['index_value'].to_numpy()
+            latest_value = index_values[-1]
+            prev_value = index_values[-2] if len(index_values) > 1 else latest_value
+
+            # Calculate 24h change percentage
+            change_24h = ((latest_value - prev_value) / prev_value) * 100
+            last_total_mcap = market_data['total_mcap'].to_numpy()[-1]
+
+            heatmap_markets.append({
+                "id": market_id,
+                "name": market_id,
+                "size": (last_total_mcap / 1e9) / 3 + 2,
+                "marketCap": market_data['total_market_cap'].to_numpy()[-1],
+                "change24h": change_24h
+            })
+    return heatmap_markets
+
+
+def encode_records(df):
+    """``df.to_dict(orient="records")`` encoded the way FastAPI would serve it."""
+    records = df.to_dict(orient="records")
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, pd.Timestamp):
+                record[key] = value.isoformat()
+            else:
+                record[key] = _native(value)
+    return dumps(records)
+
+
+def market_change_percent(overall_index):
+    # Sum of the last 8 three-hour returns, i.e. roughly the last 24h
+    return overall_index["index_return"].iloc[-8:].sum() * 100
+
+
+def build_best_performer(tag_indices):
+    # Find the best performing tag based on the most recent index return
+    best_tag = None
+    best_change24h = -float('inf')
+    best_change7d = -float('inf')
+
+    for tag, index_df in tag_indices.items():
+        if len(index_df) >= 2:  # Need at least 2 data points for 24h change
+            # Calculate 24h change (most recent return)
+            change24h = index_df["index_return"].iloc[-8:].sum() * 100
+
+            # Calculate 7d change (compound last 7 returns if available)
+            last_n = min(7, len(index_df))
+            change7d = ((1 + index_df["index_return"].iloc[-last_n:]).prod() - 1) * 100
+
+            # Update best performer if this tag has better 24h performance
+            if change24h > best_change24h:
+                best_tag = tag
+                best_change24h = change24h
+                best_change7d = change7d
+
+    if best_tag:
+        return {
+            "id": best_tag.lower().replace(" ", "-"),
+            "name": best_tag.title(),
+            "change24h": round(best_change24h, 2),
+            "change7d": round(best_change7d, 2)
+        }
+    # Fallback if no tags with sufficient data
+    return {
+        "id": "defi",
+        "name": "DeFi",
+        "change24h": 15.8,
+        "change7d": 42.3
+    }
+
+
+def listing_tags(metadata_df):
+    # Tags each token is listed under (its tags that are in good_tags) by id, first row wins
+    first_rows = metadata_df.drop_duplicates('id')
+    return {
+        token_id: tuple(tag.strip() for tag in tags.split(',') if tag.strip() in good_tags) if isinstance(tags, str) else ()
+        for token_id, tags in zip(first_rows['id'].tolist(), first_rows['tags'].tolist())
+    }
+
+
+def build_leaderboards(metadata_df, token_tags, token_metrics_df):
+    first_rows = metadata_df.drop_duplicates('id')
+    symbols = dict(zip(first_rows['id'].tolist(), first_rows['symbol'].tolist()))
+    leaderboards = OverboughtLeaderboards(symbols, token_tags)
+    leaderboards.update(token_metrics_df)
+    return leaderboards
+
+
+@dataclass(frozen=True)
+class ServedState:
+    """Everything the API serves that is derived from the price history."""
+    data_version: str
+    overall_index: pd.DataFrame
+    tag_indices: dict
+    token_metrics_df: pd.DataFrame
+    token_df: pd.DataFrame
+    token_index: TokenIndex
+    heatmap_markets: list
+    # Responses derived from the frames above, computed once per state so the
+    # request handlers do no pandas work on the event loop
+    overall_index_json: bytes
+    tag_index_json: dict
+    overall_series: IndexSeries
+    tag_series: dict
+    index_values: np.ndarray
+    market_change_percent: float
+    best_performer: dict
+    # (tag or None, largest) -> encoded overbought (largest) / oversold entries
+    leaderboards: dict
+    price_store: PriceStore
+    token_tags: dict
+
+
+class MarketData:
+    """
+    Inputs and incremental engine behind the served state.
+
+    Built once from the CSVs (or loaded from a snapshot, see snapshot.py) and
+    then kept current by tailing the price file: ``read_new_prices`` returns
+    rows appended since the last read and ``apply_new_prices`` folds them into
+    the engine, derives a fresh ``ServedState`` and only then moves the read
+    offset past them. Rows the engine or the price store reject leave the
+    offset where it was and mark the data for a full rebuild.
+    """
+
+    def __init__(self, metadata_df, engine, price_store, prices_path, prices_offset, metadata_path,
+                 metadata_source, input_version):
+        self.metadata_df = metadata_df
+        self.engine = engine
+        self.price_store = price_store
+        self.prices_path = prices_path
+        # Bytes of the price file already loaded; later snapshots are appended after it
+        self.prices_offset = prices_offset
+        self.prices_identity = prices_identity(prices_path, prices_offset)
+        # Set when new rows couldn't be applied; only a rebuild reconciles the state with the file
+        self.diverged = False
+        self.metadata_path = metadata_path
+        self.metadata_source = metadata_source
+        self.input_version = input_version
+        self.updates = 0
+        self.token_tags = listing_tags(metadata_df)
+        self.leaderboards = build_leaderboards(metadata_df, self.token_tags, engine.token_metrics_df)
+        self.state = self._serve()
+
+    @classmethod
+    def build(cls, prices_path=PRICES_PATH, metadata_path=METADATA_PATH):
+        """Compute everything from the CSVs (through the frame cache)."""
+        solprices_df, prices_source = load_frame(prices_path, prepare_prices, hash_contents=True)
+        metadata_df, metadata_source = load_frame(metadata_path, prepare_metadata, hash_contents=True)
+
+        all_tags = collect_tags(metadata_df)
+        engine = IncrementalEngine(solprices_df, metadata_df, [tag for tag in all_tags if tag in good_tags])
+        version = input_version(prices_source, metadata_source)
+        price_store = PriceStore.from_frame(solprices_df)
+        return cls(metadata_df, engine, price_store, prices_path, prices_source["size"], metadata_path,
+                   metadata_source, version)
+
+    def _serve(self, previous=None, touched=None):
+        """
+        Derive a ``ServedState`` from the engine.
+
+        Args:
+            previous: State to update instead of building from scratch
+            touched: Token ids whose metrics changed since ``previous``
+
+        Index bodies, series and frames come from the engine's buffers, which
+        only rebuild them for indices that got rows; with ``previous``, only
+        the touched tokens are re-merged and re-encoded.
+        """
+        engine = self.engine
+        if previous is None:
+            token_df = build_token_df(self.metadata_df, engine.token_metrics_df)
+            token_index = TokenIndex(token_df, good_tags)
+        else:
+            token_df = update_token_df(previous.token_df, engine.token_metrics_df, touched)
+            token_index = previous.token_index.updated(token_df, touched)
+        tag_indices = engine.tag_indices
+        overall_index = engine.overall_index
+        return ServedState(
+            data_version=f"{self.input_version}-{self.updates}",
+            overall_index=overall_index,
+            tag_indices=tag_indices,
+            token_metrics_df=engine.token_metrics_df,
+            token_df=token_df,
+            token_index=token_index,
+            heatmap_markets=build_heatmap_markets(tag_indices),
+            overall_index_json=engine.overall.to_json(),
+            tag_index_json={tag: buffer.to_json() for tag, buffer in engine.tag_buffers.items()},
+            overall_series=engine.overall.series(),
+            tag_series={tag: buffer.series() for tag, buffer in engine.tag_buffers.items()},
+            index_values=engine.overall.series().columns["index_value"],
+            market_change_percent=market_change_percent(overall_index),
+            best_performer=build_best_performer(tag_indices),
+            leaderboards=self.leaderboards.lists(),
+            price_store=self.price_store,
+            token_tags=self.token_tags,
+        )
+
+    def needs_rebuild(self):
+        """
+        Whether the inputs changed in a way incremental updates can't follow.
+
+        Appending to the price file is handled by ``read_new_prices``; a
+        rewritten price file (shrunk, or with different bytes before the
+        loaded offset), changed metadata or rejected new rows need a full
+        rebuild.
+        """
+        if self.diverged or self._prices_rewritten():
+            return True
+        return source_fingerprint(self.metadata_path, hash_contents=True)["sha256"] != self.metadata_source["sha256"]
+
+    def _prices_rewritten(self):
+        if os.path.getsize(self.prices_path) < self.prices_offset:
+            return True
+        return prices_identity(self.prices_path, self.prices_offset) != self.prices_identity
+
+    def read_new_prices(self):
+        """
+        Read the price rows appended to the price file since it was last read.
+
+        Only whole snapshots are consumed, so one that is still being written
+        is picked up by a later call: the rows up to the size recorded in the
+        ``.committed`` marker when the writer keeps one, otherwise every row
+        before the last timestamp (that one is complete once a later snapshot
+        shows up). The read offset doesn't move until the rows are applied
+        (see ``apply_new_prices``).
+
+        Returns:
+            Tuple of a DataFrame in the ``solprices_df`` schema (empty when
+            nothing was appended) and the file offset just past its rows
+        """
+        if self._prices_rewritten():
+            raise ValueError(f"{self.prices_path} was rewritten since it was loaded; rebuild to reload it")
+        end = committed_size(self.prices_path)
+        with open(self.prices_path, "rb") as prices_file:
+            header = prices_file.readline()
+            prices_file.seek(self.prices_offset)
+            chunk = prices_file.read(max(end - self.prices_offset, 0) if end is not None else -1)
+        chunk = chunk[:chunk.rfind(b"\n") + 1]
+        if end is None and chunk.strip():
+            chunk = _complete_snapshots(header, chunk)
+        offset = self.prices_offset + len(chunk)
+        if not chunk.strip():
+            return pd.DataFrame(columns=pd.read_csv(io.BytesIO(header)).columns), offset
+        return pd.read_csv(io.BytesIO(header + chunk)), offset
+
+    def apply_new_prices(self, rows, offset):
+        """
+        Fold new price rows into the engine, publish a new ``ServedState`` and
+        move the read offset to ``offset``.
+
+        If the engine or the price store rejects the rows (e.g. timestamps
+        that aren't newer, from a rerun of the ETL), the offset stays where it
+        was and ``needs_rebuild`` turns true, since the engine may have taken
+        part of them already.
+
+        Returns:
+            Set of token ids that had a row in the new data
+        """
+        if rows.empty:
+            self._advance(offset)
+            return set()
+        try:
+            touched = self.engine.append(rows)
+            self.price_store = self.price_store.append(rows)
+        except Exception:
+            self.diverged = True
+            raise
+        self.leaderboards.update(self.engine.token_metrics_df, touched)
+        self.updates += 1
+        self.state = self._serve(self.state, touched)
+        self._advance(offset)
+        return touched
+
+    def _advance(self, offset):
+        self.prices_offset = offset
+        self.prices_identity = prices_identity(self.prices_path, offset)
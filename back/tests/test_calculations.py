@@ -0,0 +1,40 @@
+"""The vectorized engines against the original implementations in benchmarks/reference.py."""
+import pytest
+
+from calculations import mcap_weighted_index, mcap_weighted_tag_indices, token_metrics
+from benchmarks import reference
+from benchmarks.bench_index import assert_same_index
+from benchmarks.bench_metrics import assert_same_metrics, make_edge_cases
+from benchmarks.bench_tags import per_tag_loop
+from benchmarks.synthetic import make_metadata, make_prices, make_tags
+
+# The reference implementations use deprecated pandas behaviour
+pytestmark = [pytest.mark.filterwarnings("ignore::FutureWarning"), pytest.mark.filterwarnings("ignore::DeprecationWarning")]
+
+
+@pytest.fixture(scope="module")
+def prices():
+    return make_edge_cases(make_prices(40, 150))
+
+
+def test_index_matches_reference(prices):
+    assert_same_index(reference.calculate_mcap_weighted_index(prices), mcap_weighted_index(prices))
+
+
+def test_metrics_match_reference(prices):
+    market_index = mcap_weighted_index(prices)
+    expected = reference.calculate_token_metrics(market_index, prices)
+    actual = token_metrics(prices, market_index)
+    assert_same_metrics(expected, actual)
+    # The constant-price token has metrics; the one seen once has none
+    assert 7 in set(actual['id']) and 6 not in set(actual['id'])
+
+
+def test_tag_indices_match_per_tag_loop(prices):
+    metadata = make_metadata(40, n_tags=6)
+    tags = make_tags(6) + ["no-such-tag"]
+    expected = per_tag_loop(prices, metadata, tags)
+    actual = mcap_weighted_tag_indices(prices, metadata, tags)
+    assert list(expected) == list(actual)
+    for tag in expected:
+        assert_same_index(expected[tag], actual[tag])
@@ -0,0 +1,30 @@
+"""Appending snapshots to ``IncrementalEngine`` against a batch recomputation."""
+import pandas as pd
+import pytest
+
+from incremental import IncrementalEngine
+from benchmarks.bench_incremental import check_against_batch
+from benchmarks.synthetic import make_metadata, make_prices, make_tags
+
+
+@pytest.mark.parametrize("history", [1, 20, 100])
+def test_appended_snapshots_match_batch(history):
+    metadata = make_metadata(40, n_tags=6)
+    tags = make_tags(6)
+    prices = make_prices(40, history + 30)
+    timestamps = pd.to_datetime(prices['timestamp'])
+    cut = timestamps.drop_duplicates().sort_values().iloc[history]
+
+    engine = IncrementalEngine(prices[timestamps < cut], metadata, tags)
+    for _, snapshot in prices[timestamps >= cut].groupby('timestamp', sort=True):
+        engine.append(snapshot)
+    check_against_batch(engine, prices, metadata, tags)
+
+
+def test_empty_append_changes_nothing():
+    metadata = make_metadata(20, n_tags=4)
+    tags = make_tags(4)
+    prices = make_prices(20, 60)
+    engine = IncrementalEngine(prices, metadata, tags)
+    engine.append(prices.iloc[:0])
+    check_against_batch(engine, prices, metadata, tags)
@@ -0,0 +1,123 @@
+"""Snapshots written by the ETL reaching the served state through the price tailer."""
+import asyncio
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+from calculations import mcap_weighted_index
+from state import MarketData, good_tags
+from benchmarks.bench_index import assert_same_index
+from benchmarks.synthetic import make_metadata, make_prices, write_dataset
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "data_processing"))
+from mock_rpc import start_mock_rpc  # noqa: E402
+from solana_etl import CSVPriceSink, SolanaETL  # noqa: E402
+
+pytestmark = pytest.mark.filterwarnings("ignore::FutureWarning")
+
+SNAPSHOT = "2024-02-01 00:00:00"
+
+
+@pytest.fixture
+def market(tmp_path):
+    prices_path, metadata_path = write_dataset(str(tmp_path), 30, 40, n_tags=4, tags=list(good_tags)[:4])
+    return MarketData.build(prices_path, metadata_path)
+
+
+class TailingSink(CSVPriceSink):
+    """CSV sink that runs the API's price tailer after every batch it takes, like a poll landing mid-snapshot."""
+
+    def __init__(self, path, market):
+        super().__init__(path)
+        self.market = market
+
+    def write(self, rows):
+        super().write(rows)
+        self.market.apply_new_prices(*self.market.read_new_prices())
+
+
+async def etl_snapshot(market, timestamp, sink=None, **options):
+    runner, url, _ = await start_mock_rpc()
+    try:
+        tokens = {f"mint{token_id}": token_id for token_id in market.metadata_df["id"].tolist()}
+        etl = SolanaETL([url], tokens, sink or CSVPriceSink(market.prices_path), **options)
+        return await etl.run_snapshot(timestamp)
+    finally:
+        await runner.cleanup()
+
+
+def test_multi_batch_snapshot_applies_in_one_update(market):
+    n_points = len(market.state.overall_index)
+    sink = TailingSink(market.prices_path, market)
+    stats = asyncio.run(etl_snapshot(market, SNAPSHOT, sink, batch_size=4, concurrency=4, write_rows=4))
+    assert stats.batches > 1 and stats.writes > 1 and stats.rows == 30
+
+    rows, offset = market.read_new_prices()
+    assert len(rows) == 30
+    market.apply_new_prices(rows, offset)
+    assert not market.needs_rebuild()
+    assert market.updates == 1
+    assert len(market.state.overall_index) == n_points + 1
+    assert market.state.overall_index["timestamp"].iloc[-1] == pd.Timestamp(SNAPSHOT)
+    assert market.read_new_prices()[0].empty
+
+
+def test_failed_snapshot_leaves_nothing_behind(market):
+    size = os.path.getsize(market.prices_path)
+    sink = CSVPriceSink(market.prices_path)
+    sink.write([[market.metadata_df["id"].iloc[0], SNAPSHOT, 1.0, 1.0, 1.0]])
+    assert os.path.getsize(market.prices_path) == size
+
+    # The next snapshot drops the rows staged by the one that failed
+    asyncio.run(etl_snapshot(market, "2024-02-01 03:00:00", batch_size=8))
+    rows, offset = market.read_new_prices()
+    assert rows["timestamp"].unique().tolist() == ["2024-02-01 03:00:00"]
+    market.apply_new_prices(rows, offset)
+    assert not market.needs_rebuild()
+
+
+@pytest.fixture
+def history(tmp_path):
+    """Market built on the first 40 of 42 snapshots, and the full price frame"""
+    prices = make_prices(30, 42)
+    prices_path, metadata_path = str(tmp_path / "solprices_df.csv"), str(tmp_path / "metadata_df.csv")
+    times = sorted(prices["timestamp"].unique())
+    prices[prices["timestamp"] < times[40]].to_csv(prices_path, index=False)
+    make_metadata(30, tags=list(good_tags)[:4]).to_csv(metadata_path, index=False)
+    return MarketData.build(prices_path, metadata_path), prices, times
+
+
+def append_rows(path, rows):
+    rows.to_csv(path, mode="a", header=False, index=False)
+
+
+def test_last_timestamp_waits_for_the_next_one(history):
+    market, prices, times = history
+    snapshot = prices[prices["timestamp"] == times[40]]
+    append_rows(market.prices_path, snapshot.iloc[:15])
+    assert market.read_new_prices()[0].empty
+    append_rows(market.prices_path, snapshot.iloc[15:])
+    assert market.read_new_prices()[0].empty
+
+    append_rows(market.prices_path, prices[prices["timestamp"] == times[41]].iloc[:10])
+    rows, offset = market.read_new_prices()
+    assert rows["timestamp"].unique().tolist() == [times[40]] and len(rows) == len(snapshot)
+    market.apply_new_prices(rows, offset)
+    assert not market.needs_rebuild()
+    assert_same_index(mcap_weighted_index(prices[prices["timestamp"] <= times[40]]), market.state.overall_index)
+
+
+def test_rows_past_the_committed_marker_wait(history):
+    market, prices, times = history
+    append_rows(market.prices_path, prices[prices["timestamp"] == times[40]])
+    with open(market.prices_path + ".committed", "w") as marker:
+        marker.write(str(os.path.getsize(market.prices_path)))
+    append_rows(market.prices_path, prices[prices["timestamp"] == times[41]].iloc[:15])
+
+    rows, offset = market.read_new_prices()
+    assert rows["timestamp"].unique().tolist() == [times[40]]
+    market.apply_new_prices(rows, offset)
+    assert market.read_new_prices()[0].empty
+    assert not market.needs_rebuild()
@@ -0,0 +1,47 @@
+"""Snapshots are keyed on the contents of the input CSVs."""
+import os
+import shutil
+
+import pytest
+
+from snapshot import current_version, load_or_build, load_snapshot
+from state import good_tags
+from benchmarks.synthetic import write_dataset
+
+pytestmark = pytest.mark.filterwarnings("ignore::FutureWarning")
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    return write_dataset(str(tmp_path / "build"), 20, 30, n_tags=4, tags=list(good_tags)[:4])
+
+
+def test_snapshot_matches_copied_inputs(inputs, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshots")
+    market = load_or_build(*inputs, snapshot_dir=snapshot_dir)
+
+    # A checkout on another host: same bytes, other paths and mtimes
+    copies = []
+    for path in inputs:
+        copy = str(tmp_path / os.path.basename(path))
+        shutil.copyfile(path, copy)
+        os.utime(copy, ns=(1, 1))
+        copies.append(copy)
+    assert current_version(*copies) == market.input_version
+    loaded = load_snapshot(*copies, snapshot_dir=snapshot_dir)
+    assert loaded is not None and loaded.input_version == market.input_version
+    assert not loaded.needs_rebuild()
+
+
+def test_same_size_rewrite_changes_version(inputs):
+    prices_path, metadata_path = inputs
+    version = current_version(prices_path, metadata_path)
+    stat = os.stat(prices_path)
+    with open(prices_path, "r+b") as prices_file:
+        prices_file.seek(-3, os.SEEK_END)
+        last = prices_file.read(2)
+        prices_file.seek(-3, os.SEEK_END)
+        prices_file.write(b"00" if last != b"00" else b"11")
+    os.utime(prices_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.path.getsize(prices_path) == stat.st_size
+    assert current_version(prices_path, metadata_path) != version
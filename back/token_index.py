@@ -0,0 +1,293 @@
+import copy
+import json
+import math
+
+import numpy as np
+
+# Listing fields /api/tokens can sort and filter by
+SORT_FIELDS = ("underScore", "change24h", "change7d", "beta", "usens", "dsens", "fdv", "overboughtOversold")
+# (field, descending) keys; the listing itself is stored in this order
+DEFAULT_SORT = (("underScore", True),)
+
+
+def dumps(content) -> bytes:
+    """Encode ``content`` exactly like FastAPI's default JSONResponse does."""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _native(value):
+    # Missing values become null instead of invalid JSON
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def score_rating(usens):
+    return "Great" if usens > 0.7 else "Good" if usens > 0.5 else "Fair"
+
+
+def beta_desc(beta):
+    return "HR" if beta > 2.0 else "MR" if beta > 1.0 else "LR"
+
+
+def parse_sort(sort: str):
+    """
+    Parse ``field[:asc|desc],...`` (ascending by default) into sort keys.
+
+    Returns:
+        Tuple of (field, descending) pairs, most significant first
+    """
+    keys = []
+    for item in sort.split(","):
+        field, _, direction = item.strip().partition(":")
+        if field not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort by {field!r}; use one of {', '.join(SORT_FIELDS)}")
+        if direction not in ("", "asc", "desc"):
+            raise ValueError(f"Sort direction must be asc or desc, not {direction!r}")
+        keys.append((field, direction == "desc"))
+    return tuple(keys)
+
+
+def _dense_rank(values):
+    # Equal values share a rank; missing values get -1
+    ranks = np.full(len(values), -1, dtype=np.int64)
+    present = ~np.isnan(values)
+    ranks[present] = np.unique(values[present], return_inverse=True)[1].ravel()
+    return ranks
+
+
+def format_listing_token(row, good_tags):
+    """Token record as served by ``GET /api/tokens``."""
+    return {
+        "id": row['id'],
+        "name": row['name'],
+        "symbol": row['symbol'],
+        "fdv": row['fdv'] if 'fdv' in row else 0,
+        "change24h": row['change24h'],
+        "change7d": row['change7d'],
+        "underScore": int(row['usens'] * 100),
+        "scoreRating": score_rating(row['usens']),
+        "tags": [tag.strip() for tag in row['tags'].split(',') if tag.strip() in good_tags] if isinstance(row['tags'], str) else [],
+        "usens": row['usens'],
+        "dsens": row['dsens'],
+        "beta": row['beta'],
+        "betaDesc": beta_desc(row['beta']),
+        "overboughtOversold": row['overbought_coef']
+    }
+
+
+def format_token(row):
+    """Token record as served by ``GET /api/tokens/{token_id}``."""
+    return {
+        "id": row['id'],
+        "name": row['name'],
+        "symbol": row['symbol'],
+        "fdv": row['fdv'] if 'fdv' in row else 0,
+        "change24h": row['change24h'],
+        "change7d": row['change7d'],
+        "underScore": int(row['usens'] * 100) if 'usens' in row else 0,
+        "scoreRating": score_rating(row['usens']),
+        "tags": row['tags'].split(',') if isinstance(row['tags'], str) else [],
+        "usens": row['usens'],
+        "dsens": row['dsens'],
+        "beta": row['beta'],
+        "betaDesc": beta_desc(row['beta']),
+        "overboughtOversold": row['overbought_coef']
+    }
+
+
+class TokenIndex:
+    """
+    Serving index over ``token_df``.
+
+    Built once whenever ``token_df`` is (re)computed: every token is formatted
+    and JSON encoded up front and the listing is kept pre-sorted by underScore,
+    so a request only slices and joins already encoded bytes. Single tokens are
+    served from an id-keyed dict of encoded payloads. After an incremental
+    update, ``updated`` re-encodes only the tokens that changed.
+
+    Filtered and re-sorted listings (``select``) work on listing positions:
+    the sortable fields are kept as arrays with their dense ranks and a
+    precomputed permutation per field and direction, and every tag has a
+    membership bitset (boolean mask over the listing) plus its ranked token
+    list: the tag's positions in underScore order, so the top K tokens of a
+    market are its first K entries. A query starts from the smallest tag
+    list (or a whole-listing permutation), ANDs the masks and lexsorts the
+    matching positions by the ranks only when they aren't in order already.
+    """
+
+    def __init__(self, token_df, good_tags):
+        self.good_tags = good_tags
+        # Per token_df row, in row order; the listing is a permutation of these
+        self.ids = token_df['id'].to_numpy()
+        rows = self._records(token_df)
+        self.row_listing = [format_listing_token(row, good_tags) for row in rows]
+        self.row_json = [dumps(token) for token in self.row_listing]
+        self.row_columns = {
+            field: np.array([np.nan if token[field] is None else token[field] for token in self.row_listing], dtype=float)
+            for field in SORT_FIELDS
+        }
+        self.row_beta_desc = np.array([token["betaDesc"] for token in self.row_listing], dtype=object)
+        # Tags come from the metadata, so they don't change with updates
+        self.row_tag_masks = {}
+        for row, token in enumerate(self.row_listing):
+            for tag in token["tags"]:
+                self.row_tag_masks.setdefault(tag, np.zeros(len(rows), dtype=bool))[row] = True
+
+        # First row wins for duplicated ids, like the boolean scan it replaces
+        self.by_id = {}
+        for row in rows:
+            if row['id'] not in self.by_id:
+                self.by_id[row['id']] = dumps(format_token(row))
+        self._index()
+
+    @staticmethod
+    def _records(token_df):
+        return [{key: _native(value) for key, value in row.items()} for row in token_df.to_dict(orient="records")]
+
+    def _index(self):
+        # Sort tokens by underScore in descending order (stable, like sorted(..., reverse=True))
+        order = np.argsort(-self.row_columns["underScore"], kind="stable")
+        rows = order.tolist()
+        self.listing = [self.row_listing[row] for row in rows]
+        self.listing_json = [self.row_json[row] for row in rows]
+        self.total = len(rows)
+
+        self.columns = {field: values[order] for field, values in self.row_columns.items()}
+        self.beta_desc = self.row_beta_desc[order]
+        tag_masks = {tag: mask[order] for tag, mask in self.row_tag_masks.items()}
+        self.tag_positions = {tag: np.flatnonzero(mask) for tag, mask in tag_masks.items()}
+        # Tags in the order they first appear in the listing
+        def first_appearance(tag):
+            position = self.tag_positions[tag][0]
+            return position, self.listing[position]["tags"].index(tag)
+        self.tag_masks = {tag: tag_masks[tag] for tag in sorted(tag_masks, key=first_appearance)}
+        self.ranks = {field: _dense_rank(values) for field, values in self.columns.items()}
+        positions = np.arange(self.total)
+        self.orders = {
+            (field, descending): self._sort(((field, descending),), positions)
+            for field in SORT_FIELDS for descending in (False, True)
+        }
+
+    def updated(self, token_df, ids):
+        """
+        Index of ``token_df`` where only the rows of tokens in ``ids`` changed.
+
+        Only those rows are formatted and encoded again; the listing order,
+        tag masks and sort permutations are rebuilt with array operations.
+        ``token_df`` must have the same rows in the same order as the frame
+        this index was built from (see state.update_token_df).
+
+        Returns:
+            A new TokenIndex; this one is left as it is
+        """
+        changed = np.flatnonzero(np.isin(self.ids, list(ids)))
+        index = copy.copy(self)
+        index.row_listing = list(self.row_listing)
+        index.row_json = list(self.row_json)
+        index.row_columns = {field: values.copy() for field, values in self.row_columns.items()}
+        index.row_beta_desc = self.row_beta_desc.copy()
+        index.by_id = dict(self.by_id)
+        first_rows = set()
+        for row, record in zip(changed.tolist(), self._records(token_df.iloc[changed])):
+            token = format_listing_token(record, self.good_tags)
+            index.row_listing[row] = token
+            index.row_json[row] = dumps(token)
+            for field in SORT_FIELDS:
+                index.row_columns[field][row] = np.nan if token[field] is None else token[field]
+            index.row_beta_desc[row] = token["betaDesc"]
+            if record['id'] not in first_rows:
+                first_rows.add(record['id'])
+                index.by_id[record['id']] = dumps(format_token(record))
+        index._index()
+        return index
+
+    def page(self, skip: int = 0, limit: int = 30):
+        """Tokens ``skip:skip+limit`` of the underScore ranking."""
+        return {"tokens": self.listing[skip:skip + limit], "total": self.total}
+
+    def page_json(self, skip: int = 0, limit: int = 30) -> bytes:
+        """Same as ``page`` but returns the encoded JSON response body."""
+        return b'{"tokens":[' + b",".join(self.listing_json[skip:skip + limit]) + b'],"total":' + str(self.total).encode() + b'}'
+
+    def page_columns(self, skip: int = 0, limit: int = 30):
+        """Same page as ``page`` as a dict of field name to values (see columnar.encode_columns)."""
+        tokens = self.listing[skip:skip + limit]
+        fields = list(self.listing[0]) if self.listing else []
+        return {field: [token[field] for token in tokens] for field in fields}
+
+    def _sort(self, keys, positions):
+        # np.lexsort's last key is the most significant; listing order breaks ties
+        sort_keys = [positions]
+        for field, descending in reversed(keys):
+            ranks = self.ranks[field][positions]
+            key = -ranks if descending else ranks.copy()
+            key[ranks < 0] = self.total  # missing values last either way
+            sort_keys.append(key)
+        return positions[np.lexsort(sort_keys)]
+
+    def select(self, tags=(), beta_desc=(), change24h=(None, None), overbought=(None, None), sort=DEFAULT_SORT):
+        """
+        Listing positions of the tokens matching every filter, in ``sort`` order.
+
+        Args:
+            tags: Tags the token must all have
+            beta_desc: Accepted ``betaDesc`` buckets (HR/MR/LR), any if empty
+            change24h: Inclusive (min, max) range of ``change24h``, None for open ends
+            overbought: Inclusive (min, max) range of ``overboughtOversold``
+            sort: (field, descending) keys, most significant first (see ``parse_sort``)
+
+        Returns:
+            Array of positions into ``listing``
+        """
+        if any(tag not in self.tag_masks for tag in tags):
+            return np.arange(0)
+        if tags:
+            # The smallest tag's ranked list is already in the default order
+            positions = min((self.tag_positions[tag] for tag in tags), key=len)
+            ordered = sort == DEFAULT_SORT
+        else:
+            positions = self.orders[sort[0]] if len(sort) == 1 else np.arange(self.total)
+            ordered = len(sort) == 1
+
+        mask = np.ones(len(positions), dtype=bool)
+        for tag in tags:
+            mask &= self.tag_masks[tag][positions]
+        if beta_desc:
+            mask &= np.isin(self.beta_desc[positions], list(beta_desc))
+        for field, (low, high) in (("change24h", change24h), ("overboughtOversold", overbought)):
+            if low is not None:
+                mask &= self.columns[field][positions] >= low
+            if high is not None:
+                mask &= self.columns[field][positions] <= high
+        positions = positions[mask]
+        return positions if ordered else self._sort(sort, positions)
+
+    def top_json(self, tag: str, limit: int = 3) -> bytes:
+        """Encoded list of the ``limit`` highest-underScore tokens with ``tag``, ``[]`` for unknown tags."""
+        positions = self.tag_positions.get(tag, ())
+        return b"[" + b",".join([self.listing_json[position] for position in positions[:limit]]) + b"]"
+
+    def positions_json(self, positions, skip: int = 0, limit: int = 30) -> bytes:
+        """Encoded page ``skip:skip+limit`` of ``positions``, with their count as ``total``."""
+        tokens = b",".join([self.listing_json[position] for position in positions[skip:skip + limit]])
+        return b'{"tokens":[' + tokens + b'],"total":' + str(len(positions)).encode() + b'}'
+
+    def positions_columns(self, positions, skip: int = 0, limit: int = 30):
+        """Page ``skip:skip+limit`` of ``positions`` as a dict of field name to values."""
+        tokens = [self.listing[position] for position in positions[skip:skip + limit]]
+        fields = list(self.listing[0]) if self.listing else []
+        return {field: [token[field] for token in tokens] for field in fields}
+
+    def get_json(self, token_id: str):
+        """Encoded record of ``token_id``, or None for unknown or non-numeric ids."""
+        try:
+            return self.by_id.get(int(token_id))
+        except ValueError:
+            return None
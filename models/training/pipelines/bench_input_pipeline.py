@@ -0,0 +1,91 @@
+"""
+Samples/sec of the classifier's input pipeline alone, on CPU, with no model.
+
+Writes ``--rows`` synthetic feature vectors and labels with
+``write_feature_dataset`` to a temporary directory, then reads one epoch of
+shuffled batches through:
+
+- ``TensorDataset``: everything loaded into memory first, ``DataLoader``
+  collating one row at a time (the old ``_load_training_data`` path)
+- ``MemmapFeatureDataset``: random batches gathered from the memmap, one
+  fancy index per batch, with 0, 2 and 4 DataLoader workers
+- ``ShuffledBlockDataset``: block-shuffled batches read sequentially from the
+  memmap, with 0, 2 and 4 DataLoader workers
+
+Every epoch is checked to cover each row exactly once.
+
+Run from this directory::
+
+    python bench_input_pipeline.py
+    python bench_input_pipeline.py --rows 5000000 --features 128 --batch-size 256
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from feature_dataset import (MemmapFeatureDataset, ShuffledBlockDataset, make_batch_loader, make_block_loader,
+                             open_feature_dataset, write_feature_dataset)
+
+
+def synthetic_batches(rows, n_features, batch=100_000, seed=0):
+    """(features, labels) batches whose first feature is the row number, to check coverage"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        features = rng.normal(size=(count, n_features)).astype(np.float32)
+        features[:, 0] = np.arange(start, start + count)
+        yield features, (rng.random(count) < 0.1).astype(np.float32)
+
+
+def epoch(loader, rows):
+    start = time.perf_counter()
+    seen = []
+    for features, labels in loader:
+        assert len(features) == len(labels)
+        seen.append(features[:, 0].numpy().astype(np.int64))
+    seconds = time.perf_counter() - start
+    seen = np.concatenate(seen)
+    assert len(seen) == rows and np.array_equal(np.sort(seen), np.arange(rows))
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--features", type=int, default=53, help="the engineer's 3 numeric + 50 text features")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--block-size", type=int, default=4096)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4])
+    args = parser.parse_args()
+    torch.manual_seed(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_feature_dataset(tmp, synthetic_batches(args.rows, args.features))
+        print(f"{args.rows} rows x {args.features} float32 features, batches of {args.batch_size}, "
+              f"{torch.get_num_threads()} torch threads")
+        print(f"{'pipeline':<36} {'seconds':>8} {'samples/s':>10}")
+
+        def report(label, seconds):
+            print(f"{label:<36} {seconds:>8.2f} {args.rows / seconds:>10.0f}")
+
+        features, labels = open_feature_dataset(tmp)
+        in_memory = TensorDataset(torch.from_numpy(np.array(features)), torch.from_numpy(np.array(labels)))
+        report("TensorDataset, in memory (before)",
+               epoch(DataLoader(in_memory, batch_size=args.batch_size, shuffle=True), args.rows))
+        del in_memory, features, labels
+
+        for workers in args.workers:
+            loader = make_batch_loader(MemmapFeatureDataset(tmp), args.batch_size, num_workers=workers)
+            report(f"MemmapFeatureDataset, {workers} workers", epoch(loader, args.rows))
+        for workers in args.workers:
+            dataset = ShuffledBlockDataset(tmp, args.batch_size, args.block_size)
+            report(f"ShuffledBlockDataset, {workers} workers",
+                   epoch(make_block_loader(dataset, num_workers=workers), args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+On-disk, memory-mapped training set of feature vectors and risk labels.
+
+``FeatureDatasetWriter`` appends batches of (features, labels) to two raw
+files in a directory and records their shape in ``meta.json``; nothing but
+the current batch is held in memory. ``open_feature_dataset`` maps them back
+read-only, so every DataLoader worker shares the page cache instead of its
+own copy.
+
+Two torch datasets read from it:
+
+- ``MemmapFeatureDataset``: map-style; indexed with a list of rows (e.g. by
+  a ``BatchSampler``) it gathers the whole batch with one fancy index
+- ``ShuffledBlockDataset``: iterable; shuffles the order of contiguous
+  blocks of rows, then rows within a buffer of a few blocks, and splits the
+  blocks over DataLoader workers. Reads stay sequential, so it also works
+  when the files are much larger than RAM
+
+torch is only needed for the datasets and loaders; writing, opening and
+iterating a dataset with numpy works without it.
+"""
+import json
+import os
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import torch
+    from torch.utils.data import BatchSampler, DataLoader, Dataset, IterableDataset, RandomSampler, get_worker_info
+except ImportError:
+    torch = None
+    Dataset = IterableDataset = object
+
+FEATURES_FILE = "features.f32"
+LABELS_FILE = "labels.f32"
+META_FILE = "meta.json"
+FEATURE_DTYPE = np.float32
+
+
+class FeatureDatasetWriter:
+    """Append (features, labels) batches to a feature dataset directory
+
+    Use as a context manager; ``meta.json`` is written on a clean exit only,
+    so a half-written dataset can't be opened.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.rows = 0
+        self.n_features = None
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        self._features = open(os.path.join(directory, FEATURES_FILE), "wb")
+        self._labels = open(os.path.join(directory, LABELS_FILE), "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._features.close()
+        self._labels.close()
+        if exc_type is None:
+            with open(os.path.join(self.directory, META_FILE), "w") as meta:
+                json.dump({"rows": self.rows, "n_features": self.n_features,
+                           "dtype": np.dtype(FEATURE_DTYPE).name}, meta)
+
+    def write(self, features: np.ndarray, labels: np.ndarray):
+        features = np.ascontiguousarray(features, dtype=FEATURE_DTYPE)
+        labels = np.ascontiguousarray(labels, dtype=FEATURE_DTYPE).reshape(-1)
+        if features.ndim != 2 or len(features) != len(labels):
+            raise ValueError(f"Expected (rows, n_features) features and one label per row, "
+                             f"got {features.shape} and {labels.shape}")
+        if self.n_features is None:
+            self.n_features = features.shape[1]
+        elif features.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features per row, got {features.shape[1]}")
+        features.tofile(self._features)
+        labels.tofile(self._labels)
+        self.rows += len(labels)
+
+
+def write_feature_dataset(directory: str, batches: Iterable[Tuple[np.ndarray, np.ndarray]]) -> int:
+    """Write every (features, labels) batch to ``directory``; returns the number of rows"""
+    with FeatureDatasetWriter(directory) as writer:
+        for features, labels in batches:
+            writer.write(features, labels)
+    return writer.rows
+
+
+def open_feature_dataset(directory: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Read-only memmaps of a dataset's features (rows, n_features) and labels (rows,)"""
+    with open(os.path.join(directory, META_FILE)) as meta_file:
+        meta = json.load(meta_file)
+    rows, n_features = meta["rows"], meta["n_features"] or 0
+    if rows == 0:
+        return np.empty((0, n_features), FEATURE_DTYPE), np.empty(0, FEATURE_DTYPE)
+    features = np.memmap(os.path.join(directory, FEATURES_FILE), dtype=meta["dtype"], mode="r",
+                         shape=(rows, n_features))
+    labels = np.memmap(os.path.join(directory, LABELS_FILE), dtype=meta["dtype"], mode="r", shape=(rows,))
+    return features, labels
+
+
+def split_blocks(rows: int, block_size: int, val_fraction: float, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Randomly assign whole blocks of rows to a train and a validation set
+
+    Returns:
+        Tuple of (train block ids, validation block ids)
+    """
+    blocks = np.random.default_rng(seed).permutation(-(-rows // block_size))
+    n_val = int(round(len(blocks) * val_fraction))
+    return np.sort(blocks[n_val:]), np.sort(blocks[:n_val])
+
+
+def iter_shuffled_batches(features: np.ndarray, labels: np.ndarray, batch_size: int, block_size: int = 4096,
+                          blocks: Optional[Sequence[int]] = None, shuffle: bool = True, buffer_blocks: int = 8,
+                          seed: int = 0, drop_last: bool = False) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Batches of (features, labels) from the given blocks, read a buffer of blocks at a time
+
+    With ``shuffle``, the blocks are visited in a random order and the rows of
+    every ``buffer_blocks`` blocks are shuffled together; rows left over from
+    one buffer are carried into the next so every batch is full.
+    """
+    rng = np.random.default_rng(seed)
+    if blocks is None:
+        blocks = np.arange(-(-len(labels) // block_size))
+    blocks = rng.permutation(blocks) if shuffle else np.asarray(blocks)
+    carry_x = np.empty((0, features.shape[1]), features.dtype)
+    carry_y = np.empty(0, labels.dtype)
+    for first in range(0, len(blocks), buffer_blocks):
+        ranges = [(block * block_size, min((block + 1) * block_size, len(labels)))
+                  for block in blocks[first:first + buffer_blocks]]
+        x = np.concatenate([carry_x] + [features[start:stop] for start, stop in ranges])
+        y = np.concatenate([carry_y] + [labels[start:stop] for start, stop in ranges])
+        if shuffle:
+            order = rng.permutation(len(y))
+            x, y = x[order], y[order]
+        full = len(y) - len(y) % batch_size
+        for start in range(0, full, batch_size):
+            yield x[start:start + batch_size], y[start:start + batch_size]
+        carry_x, carry_y = x[full:], y[full:]
+    if len(carry_y) and not drop_last:
+        yield carry_x, carry_y
+
+
+def _require_torch():
+    if torch is None:
+        raise ImportError("torch is required for the feature datasets and loaders")
+
+
+class MemmapFeatureDataset(Dataset):
+    """Map-style dataset over a feature dataset directory
+
+    The memmaps are opened lazily in each process, so the dataset pickles to
+    DataLoader workers as just its directory. Indexing with a list of rows
+    returns the whole batch as two tensors (see ``make_batch_loader``).
+    """
+
+    def __init__(self, directory: str, rows: Optional[np.ndarray] = None):
+        _require_torch()
+        self.directory = directory
+        self.rows = rows
+        self._arrays = None
+
+    def _open(self):
+        if self._arrays is None:
+            self._arrays = open_feature_dataset(self.directory)
+        return self._arrays
+
+    def __getstate__(self):
+        return {**self.__dict__, "_arrays": None}
+
+    def __len__(self) -> int:
+        return len(self.rows) if self.rows is not None else len(self._open()[1])
+
+    def __getitem__(self, index):
+        features, labels = self._open()
+        if self.rows is not None:
+            index = self.rows[index]
+        if not np.isscalar(index):
+            # Sorted gathers walk the file forwards; the batch order is put back after
+            index = np.asarray(index)
+            order = np.argsort(index, kind="stable")
+            batch = np.empty(len(index), dtype=np.intp)
+            batch[order] = np.arange(len(index))
+            sorted_index = index[order]
+            return (torch.from_numpy(np.asarray(features[sorted_index])[batch]),
+                    torch.from_numpy(np.asarray(labels[sorted_index])[batch]))
+        return torch.from_numpy(np.array(features[index])), torch.tensor(labels[index])
+
+
+class ShuffledBlockDataset(IterableDataset):
+    """Iterable dataset of shuffled batches, with the blocks split over DataLoader workers
+
+    Yields whole batches, so use it with ``DataLoader(batch_size=None)`` (see
+    ``make_block_loader``). Call ``set_epoch`` before each epoch for a new
+    shuffle.
+    """
+
+    def __init__(self, directory: str, batch_size: int, block_size: int = 4096,
+                 blocks: Optional[Sequence[int]] = None, shuffle: bool = True, buffer_blocks: int = 8,
+                 seed: int = 0, drop_last: bool = False):
+        _require_torch()
+        self.directory = directory
+        self.batch_size = batch_size
+        self.block_size = block_size
+        self.blocks = blocks
+        self.shuffle = shuffle
+        self.buffer_blocks = buffer_blocks
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __iter__(self):
+        features, labels = open_feature_dataset(self.directory)
+        blocks = self.blocks if self.blocks is not None else np.arange(-(-len(labels) // self.block_size))
+        # Every worker draws the same block permutation and takes its own share of it
+        blocks = np.random.default_rng((self.seed, self.epoch)).permutation(blocks) if self.shuffle else blocks
+        worker = get_worker_info()
+        if worker is not None:
+            blocks = blocks[worker.id::worker.num_workers]
+        for x, y in iter_shuffled_batches(features, labels, self.batch_size, self.block_size, blocks,
+                                          self.shuffle, self.buffer_blocks,
+                                          seed=(self.seed, self.epoch, worker.id if worker else 0),
+                                          drop_last=self.drop_last):
+            yield torch.from_numpy(x), torch.from_numpy(y)
+
+
+def make_batch_loader(dataset: MemmapFeatureDataset, batch_size: int, shuffle: bool = True,
+                      num_workers: int = 0, **options) -> "DataLoader":
+    """DataLoader that fetches each batch of a ``MemmapFeatureDataset`` with one index"""
+    sampler = RandomSampler(dataset) if shuffle else range(len(dataset))
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False), batch_size=None,
+                      num_workers=num_workers, persistent_workers=num_workers > 0, **options)
+
+
+def make_block_loader(dataset: ShuffledBlockDataset, num_workers: int = 0, **options) -> "DataLoader":
+    """DataLoader over a ``ShuffledBlockDataset``'s ready-made batches"""
+    return DataLoader(dataset, batch_size=None, num_workers=num_workers, **options)
@@ -0,0 +1,44 @@
+"""Every row of a feature dataset is read exactly once per epoch."""
+import numpy as np
+import pytest
+
+from feature_dataset import iter_shuffled_batches, open_feature_dataset, split_blocks, write_feature_dataset
+
+ROWS = 10_000
+BLOCK_SIZE = 512
+
+
+@pytest.fixture(scope="module")
+def dataset_dir(tmp_path_factory):
+    """Dataset whose first feature is the row number"""
+    directory = str(tmp_path_factory.mktemp("features"))
+    features = np.random.default_rng(0).normal(size=(ROWS, 4)).astype(np.float32)
+    features[:, 0] = np.arange(ROWS)
+    write_feature_dataset(directory, [(features[:6000], np.zeros(6000)), (features[6000:], np.ones(ROWS - 6000))])
+    return directory
+
+
+def test_shuffled_batches_cover_split(dataset_dir):
+    features, labels = open_feature_dataset(dataset_dir)
+    train_blocks, val_blocks = split_blocks(ROWS, BLOCK_SIZE, val_fraction=0.2)
+    seen = []
+    for blocks in (train_blocks, val_blocks):
+        for x, y in iter_shuffled_batches(features, labels, 64, BLOCK_SIZE, blocks, buffer_blocks=3):
+            assert len(x) == len(y) <= 64
+            seen.append(x[:, 0].astype(np.int64))
+    assert np.array_equal(np.sort(np.concatenate(seen)), np.arange(ROWS))
+
+
+def test_block_loader_workers_cover_every_row_once(dataset_dir):
+    pytest.importorskip("torch")
+    from feature_dataset import ShuffledBlockDataset, make_block_loader
+
+    dataset = ShuffledBlockDataset(dataset_dir, batch_size=64, block_size=BLOCK_SIZE, buffer_blocks=3)
+    loader = make_block_loader(dataset, num_workers=2)
+    orders = []
+    for epoch in range(2):
+        dataset.set_epoch(epoch)
+        seen = np.concatenate([x[:, 0].numpy().astype(np.int64) for x, _ in loader])
+        assert len(seen) == ROWS and np.array_equal(np.sort(seen), np.arange(ROWS))
+        orders.append(seen)
+    assert not np.array_equal(orders[0], orders[1])
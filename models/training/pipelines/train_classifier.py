@@ -1,32 +1,52 @@
-import torch
+import os
+
 import numpy as np
-from torch.utils.data import DataLoader, TensorDataset
-from sklearn.model_selection import train_test_split
 from src.core.processing.feature_extractor import TransactionFeatureEngineer
 from src.connectors.storage.postgres_client import PostgresClient
-from src.models.token_classification.transformer_model import RiskClassifier
+from feature_dataset import (FeatureDatasetWriter, ShuffledBlockDataset, make_block_loader,
+                             open_feature_dataset, split_blocks)
+
+# Building the dataset needs numpy only; training needs torch
+try:
+    import torch
+    from src.models.token_classification.transformer_model import RiskClassifier
+except ImportError:
+    torch = None
 
 class ModelTrainer:
-    def __init__(self, db_client: PostgresClient):
+    def __init__(self, db_client: PostgresClient, dataset_dir: str = "data/processed/training_v2",
+                 num_workers: int = 4, block_size: int = 4096):
         self.db = db_client
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.device = None
+        if torch is not None:
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.feature_engineer = TransactionFeatureEngineer()
+        # Memory-mapped copy of training_data, built once by _build_training_dataset
+        self.dataset_dir = dataset_dir
+        self.num_workers = num_workers
+        self.block_size = block_size
         
-    async def train(self, epochs: int = 30, batch_size: int = 64):
-        data = await self._load_training_data()
-        X_train, X_val, y_train, y_val = train_test_split(
-            data['features'], data['labels'], test_size=0.2
+    async def train(self, epochs: int = 30, batch_size: int = 64, rebuild: bool = False):
+        if torch is None:
+            raise ImportError("torch is required for training")
+        if rebuild or not os.path.exists(os.path.join(self.dataset_dir, "meta.json")):
+            await self._build_training_dataset()
+        features, labels = open_feature_dataset(self.dataset_dir)
+        # 80/20 split by whole blocks, so both sets keep sequential reads
+        train_blocks, val_blocks = split_blocks(len(labels), self.block_size, val_fraction=0.2)
+        train_set = ShuffledBlockDataset(self.dataset_dir, batch_size, self.block_size, train_blocks)
+        train_loader = make_block_loader(train_set, num_workers=self.num_workers,
+                                         pin_memory=self.device.type == "cuda")
+        val_loader = make_block_loader(
+            ShuffledBlockDataset(self.dataset_dir, batch_size, self.block_size, val_blocks, shuffle=False),
+            num_workers=self.num_workers,
         )
         
-        train_loader = self._create_dataloader(X_train, y_train, batch_size)
-        val_loader = self._create_dataloader(X_val, y_val, batch_size)
-        
-        optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4)
-        
         criterion = torch.nn.BCELoss()
-        model = RiskClassifier(input_dim=X_train.shape[1]).to(self.device)
+        model = RiskClassifier(input_dim=features.shape[1]).to(self.device)
+        optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4)
         for epoch in range(epochs):
-            
+            train_set.set_epoch(epoch)
             for batch in train_loader:
                 pass
                 # Training loop logic
@@ -36,10 +56,31 @@ class ModelTrainer:
             
         torch.save(model.state_dict(), "models/weights/classifier_latest.pt")
 
-    async def _load_training_data(self) -> dict:
+    async def _build_training_dataset(self, page_size: int = 50_000) -> int:
+        """Copy training_data into the memory-mapped dataset, one page of rows at a time
+
+        training_data has no key known to be unique and indexed, so the pages
+        follow the physical row address (``ctid``), which every Postgres table
+        has; ``ctid >`` is a TID range scan (Postgres 14+), so each page reads
+        only its own rows. The rows must not be updated while it runs.
+
+        Returns:
+            Number of rows written
+        """
         query = """
-            SELECT features, risk_label 
-            FROM training_data 
-            WHERE partition = 'v2'
+            SELECT ctid::text AS row_key, features, risk_label
+            FROM training_data
+            WHERE partition = 'v2' AND ctid > %s::tid
+            ORDER BY ctid
+            LIMIT %s
         """
-        results = await self.db.execute(query)
+        last_key = "(0,0)"
+        with FeatureDatasetWriter(self.dataset_dir) as writer:
+            while True:
+                results = await self.db.execute(query, (last_key, page_size))
+                if not results:
+                    break
+                writer.write(np.stack([np.frombuffer(row['features']) for row in results]),
+                             np.array([row['risk_label'] for row in results]))
+                last_key = results[-1]['row_key']
+        return writer.rows
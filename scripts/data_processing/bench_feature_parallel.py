@@ -0,0 +1,64 @@
+"""
+Scaling of TransactionFeatureEngineer.transform_parallel over worker processes.
+
+Fits the engineer on ``--transactions`` synthetic transactions (see
+bench_feature_pipeline.py), then featurizes the same frame with plain
+``transform`` on one core and with ``transform_parallel`` over 1, 2, 4 and 8
+workers, into an in-memory array and into a memory-mapped ``.npy`` file.
+Every parallel result is checked against the serial one. Speed-ups are
+bounded by the cores available (printed on the first line).
+
+Run from the repository root::
+
+    python scripts/data_processing/bench_feature_parallel.py
+    python scripts/data_processing/bench_feature_parallel.py --transactions 1000000 --chunk-size 20000 --sparse
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_feature_pipeline import write_transactions
+from feature_engineering import TransactionFeatureEngineer, iter_transaction_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--transactions", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--components", type=int, default=50)
+    parser.add_argument("--sparse", action="store_true", help="hashing + IncrementalPCA instead of TF-IDF + PCA")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_transactions(tmp, args.transactions)
+        X = pd.concat(iter_transaction_chunks(os.path.join(tmp, "*.jsonl")), ignore_index=True)
+        engineer = TransactionFeatureEngineer(args.components, sparse=args.sparse)
+        engineer.fit(X)
+
+        print(f"{args.transactions} transactions, {'sparse' if args.sparse else 'dense'} mode, "
+              f"chunks of {args.chunk_size}, {os.cpu_count()} CPU(s)")
+        print(f"{'run':<26} {'seconds':>8} {'rows/s':>9} {'speed-up':>9}")
+        start = time.perf_counter()
+        expected = engineer.transform(X)
+        serial = time.perf_counter() - start
+        print(f"{'transform (before)':<26} {serial:>8.2f} {len(X) / serial:>9.0f} {1:>8.2f}x")
+
+        for workers in args.workers:
+            for target in ("array", "memmap"):
+                out = os.path.join(tmp, f"features-{workers}.npy") if target == "memmap" else None
+                start = time.perf_counter()
+                features = engineer.transform_parallel(X, n_jobs=workers, chunk_size=args.chunk_size, out=out)
+                seconds = time.perf_counter() - start
+                assert np.allclose(features, expected)
+                del features
+                label = f"{workers} worker(s), {target}"
+                print(f"{label:<26} {seconds:>8.2f} {len(X) / seconds:>9.0f} {serial / seconds:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Peak memory and time of the dense vs. sparse streaming transaction feature pipelines.
+
+Writes ``--transactions`` synthetic transactions as JSONL files (the layout of
+``data/raw/solana_transactions``) and featurizes them, each mode in a fresh
+process so its peak RSS is its own:
+
+- ``dense``: load every transaction, TF-IDF + PCA fit and transform (before)
+- ``sparse svd``: load every transaction, hashing + TruncatedSVD on the sparse matrix
+- ``sparse ipca, streamed``: ``fit_stream`` and ``transform_chunks`` over
+  ``iter_transaction_chunks``; only one chunk is in memory at a time
+
+Run from the repository root::
+
+    python scripts/data_processing/bench_feature_pipeline.py
+    python scripts/data_processing/bench_feature_pipeline.py --transactions 1000000 --chunk-size 20000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_engineering import TransactionFeatureEngineer, iter_transaction_chunks
+
+MEMOS = ["Token swap", "NFT mint", "Transfer", "Stake", "Unstake", "Add liquidity", "Remove liquidity", "Vote"]
+
+
+def write_transactions(directory, n_transactions, files=4, vocabulary=20_000, seed=0):
+    """Write synthetic transactions as ``files`` JSONL files under ``directory``."""
+    rng = np.random.default_rng(seed)
+    tokens = [f"TOK{i}" for i in range(vocabulary)]
+    per_file = -(-n_transactions // files)
+    for index in range(files):
+        count = min(per_file, n_transactions - index * per_file)
+        with open(os.path.join(directory, f"transactions_{index:03d}.jsonl"), "w") as out:
+            for block in range(index * per_file, index * per_file + count):
+                metadata = {f"k{key}": tokens[token] for key, token in
+                            zip(range(rng.integers(1, 5)), rng.zipf(1.2, 4) % vocabulary)}
+                out.write(json.dumps({
+                    "block": 100_000 + block,
+                    "signers": [f"S{signer}" for signer in rng.integers(0, 10_000, rng.integers(1, 4))],
+                    "value": float(rng.lognormal(0, 2)),
+                    "memo": MEMOS[rng.integers(len(MEMOS))],
+                    "metadata": metadata,
+                }) + "\n")
+
+
+def run_mode(mode, pattern, n_components, chunk_size):
+    """Featurize everything in one mode; returns (seconds, rows, peak RSS MB above the start)."""
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    rows = 0
+    if mode == "sparse ipca, streamed":
+        engineer = TransactionFeatureEngineer(n_components, sparse=True, reducer="ipca")
+        engineer.fit_stream(iter_transaction_chunks(pattern, chunk_size))
+        for features in engineer.transform_chunks(iter_transaction_chunks(pattern, chunk_size)):
+            rows += len(features)
+    else:
+        X = pd.concat(iter_transaction_chunks(pattern, chunk_size), ignore_index=True)
+        engineer = TransactionFeatureEngineer(n_components, sparse=mode == "sparse svd", reducer="svd")
+        rows = len(engineer.fit(X).transform(X))
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return seconds, rows, (peak - start_rss) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--transactions", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--components", type=int, default=50)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        write_transactions(tmp, args.transactions)
+        pattern = os.path.join(tmp, "*.jsonl")
+        print(f"{args.transactions} transactions, {args.components} components, chunks of {args.chunk_size}")
+        print(f"{'mode':<24} {'seconds':>8} {'rows/s':>9} {'peak MB':>8}")
+        for mode in ("dense", "sparse svd", "sparse ipca, streamed"):
+            with context.Pool(1) as pool:
+                seconds, rows, peak = pool.apply(run_mode, (mode, pattern, args.components, args.chunk_size))
+            assert rows == args.transactions
+            print(f"{mode:<24} {seconds:>8.2f} {rows / seconds:>9.0f} {peak:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+FeatureStore read/write cost against an in-process PostgreSQL stand-in.
+
+``InProcessPostgres`` answers the feature store's queries from a dict and
+charges ``--latency`` seconds per round trip (plus ``--row-cost`` per row),
+standing in for a database on the network. On a Zipf-skewed read workload
+(a few hot tokens, a long tail, like the API's lookups), the original store
+(one SELECT per lookup, nothing cached on a miss) is compared with the LRU/TTL
+cache and with batched ``get_features_many`` calls. Per-row upserts are
+compared with ``update_features_many``.
+
+Run from the repository root::
+
+    python scripts/data_processing/bench_feature_store.py
+    python scripts/data_processing/bench_feature_store.py --addresses 50000 --lookups 100000 --cache 5000
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from feature_engineering import FeatureStore
+
+
+class InProcessPostgres:
+    """Dict-backed stand-in for the ``token_features`` table, with a round-trip cost per query."""
+
+    def __init__(self, latency=0.0005, row_cost=0.000002):
+        self.latency = latency
+        self.row_cost = row_cost
+        self.rows = {}
+        self.queries = 0
+
+    async def execute(self, query, params=()):
+        self.queries += 1
+        statement = " ".join(query.split())
+        if statement.startswith("INSERT"):
+            triples = [params[i:i + 3] for i in range(0, len(params), 3)]
+            for address, version, features in triples:
+                self.rows[(address, version)] = bytes(features)
+            result = []
+        elif "ANY(" in statement:
+            addresses, version = params
+            result = [{"address": address, "features": self.rows[(address, version)]}
+                      for address in addresses if (address, version) in self.rows]
+        else:
+            address, version = params
+            result = [{"features": self.rows[(address, version)]}] if (address, version) in self.rows else []
+        await asyncio.sleep(self.latency + self.row_cost * max(len(result), len(params) // 3))
+        return result
+
+
+class LegacyFeatureStore:
+    """The store as it was: one SELECT per read, only writes fill the unbounded cache"""
+
+    def __init__(self, db_client):
+        self.db = db_client
+        self.cache = {}
+
+    async def get_features(self, token_address):
+        cached = self.cache.get(token_address)
+        if cached:
+            return cached
+        query = """
+            SELECT features FROM token_features
+            WHERE address = %s AND version = %s
+        """
+        result = await self.db.execute(query, (token_address, "v2"))
+        if result:
+            return np.frombuffer(result[0]['features'])
+        raise ValueError("Features not found in store")
+
+    async def update_features(self, token_address, features):
+        self.cache[token_address] = features
+        query = """
+            INSERT INTO token_features (address, version, features)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (address) DO UPDATE SET
+                features = EXCLUDED.features,
+                updated_at = NOW()
+        """
+        await self.db.execute(query, (token_address, "v2", features.tobytes()))
+
+
+async def timed(coroutine):
+    start = time.perf_counter()
+    result = await coroutine
+    return time.perf_counter() - start, result
+
+
+async def run(args):
+    rng = np.random.default_rng(0)
+    addresses = [f"Mint{i:08d}" for i in range(args.addresses)]
+    vectors = rng.normal(size=(args.addresses, args.dim))
+    # Zipf-ranked popularity over a shuffled address order
+    ranks = np.minimum(rng.zipf(args.zipf, size=args.lookups), args.addresses) - 1
+    popularity = rng.permutation(args.addresses)
+    lookups = [addresses[i] for i in popularity[ranks]]
+
+    print(f"{args.addresses} addresses x {args.dim} floats, {args.lookups} lookups (zipf {args.zipf}), "
+          f"cache {args.cache} entries, {args.latency * 1000:.2f} ms per query")
+    print(f"{'scenario':<38} {'seconds':>8} {'ops/s':>9} {'queries':>8} {'hit rate':>9}")
+
+    def report(label, seconds, operations, db, store=None):
+        hit_rate = f"{store.cache.stats()['hit_rate']:.1%}" if store is not None else "-"
+        print(f"{label:<38} {seconds:>8.3f} {operations / seconds:>9.0f} {db.queries:>8} {hit_rate:>9}")
+
+    # Writes
+    items = dict(zip(addresses, vectors))
+    db = InProcessPostgres(args.latency, args.row_cost)
+    legacy = LegacyFeatureStore(db)
+
+    async def write_each():
+        for address, features in items.items():
+            await legacy.update_features(address, features)
+
+    seconds, _ = await timed(write_each())
+    report("upsert, one row per query (before)", seconds, len(items), db)
+
+    db = InProcessPostgres(args.latency, args.row_cost)
+    store = FeatureStore(db, max_entries=args.cache, ttl=args.ttl)
+    seconds, _ = await timed(store.update_features_many(items))
+    report("update_features_many", seconds, len(items), db)
+    rows = db.rows
+
+    # Reads, starting from a cold cache
+    def fresh_db():
+        db = InProcessPostgres(args.latency, args.row_cost)
+        db.rows = rows
+        return db
+
+    db = fresh_db()
+    legacy = LegacyFeatureStore(db)
+
+    async def read_each(store):
+        return [await store.get_features(address) for address in lookups]
+
+    seconds, before = await timed(read_each(legacy))
+    report("get_features (before)", seconds, len(lookups), db)
+
+    db = fresh_db()
+    store = FeatureStore(db, max_entries=args.cache, ttl=args.ttl)
+    seconds, after = await timed(read_each(store))
+    report("get_features, LRU cache", seconds, len(lookups), db, store)
+    assert all(np.array_equal(a, b) for a, b in zip(before, after))
+
+    db = fresh_db()
+    store = FeatureStore(db, max_entries=args.cache, ttl=args.ttl)
+
+    async def read_batches():
+        found = {}
+        for start in range(0, len(lookups), args.batch):
+            found.update(await store.get_features_many(lookups[start:start + args.batch]))
+        return found
+
+    seconds, found = await timed(read_batches())
+    report(f"get_features_many, batches of {args.batch}", seconds, len(lookups), db, store)
+    assert all(np.array_equal(found[address], items[address]) for address in found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--addresses", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--zipf", type=float, default=1.3, help="Zipf exponent of the lookup distribution")
+    parser.add_argument("--cache", type=int, default=2_000, help="cache entries")
+    parser.add_argument("--ttl", type=float, default=300.0)
+    parser.add_argument("--batch", type=int, default=100, help="addresses per get_features_many call")
+    parser.add_argument("--latency", type=float, default=0.0005, help="seconds per query round trip")
+    parser.add_argument("--row-cost", type=float, default=0.000002, help="seconds per row read or written")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Throughput and backpressure of the Solana ETL against local mock RPC endpoints.
+
+Starts mock_rpc.py servers in subprocesses (so they don't share the ETL's
+event loop) and runs one snapshot of ``--tokens`` synthetic mints per
+scenario into a temporary CSV:
+
+- endpoints: the same load over 1, 2 and 4 endpoints
+- batch size: 1, 10 and 100 mints per JSON-RPC batch
+- faults: endpoints failing 5% of requests with 503 and rate-limiting with 429
+- backpressure: a store that takes ``--slow-write`` seconds per append behind
+  a small queue; fetchers should wait on the queue instead of buffering
+
+Every run checks that each mint with data ended up in the CSV exactly once.
+
+Run from the repository root::
+
+    python scripts/data_processing/bench_solana_etl.py
+    python scripts/data_processing/bench_solana_etl.py --tokens 50000 --latency 0.02
+"""
+import argparse
+import asyncio
+import csv
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from solana_etl import CSVPriceSink, SolanaETL
+
+MOCK_RPC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_rpc.py")
+
+
+class SlowSink(CSVPriceSink):
+    """CSV sink that takes ``delay`` extra seconds per append, like a loaded database."""
+
+    def __init__(self, path, delay):
+        super().__init__(path)
+        self.delay = delay
+
+    def write(self, rows):
+        time.sleep(self.delay)
+        super().write(rows)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mocks(count, *options):
+    """Start ``count`` mock RPC servers; returns their processes and URLs once they accept connections."""
+    ports = [free_port() for _ in range(count)]
+    processes = [
+        subprocess.Popen([sys.executable, MOCK_RPC, "--port", str(port), *options],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for port in ports
+    ]
+    for port in ports:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"mock RPC on port {port} did not start")
+                time.sleep(0.05)
+    return processes, [f"http://127.0.0.1:{port}/" for port in ports]
+
+
+def run_scenario(label, tokens, endpoints=1, mock_options=(), sink_delay=0.0, **etl_options):
+    processes, urls = start_mocks(endpoints, *mock_options)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "solprices_df.csv")
+            sink = SlowSink(path, sink_delay) if sink_delay else CSVPriceSink(path)
+            etl = SolanaETL(urls, tokens, sink, **etl_options)
+            stats = asyncio.run(etl.run_snapshot("2025-01-01 00:00:00"))
+            with open(path, newline="") as store:
+                ids = [int(row["id"]) for row in csv.DictReader(store)]
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+    assert len(ids) == len(set(ids)) == stats.rows, (len(ids), len(set(ids)), stats.rows)
+    assert stats.rows + stats.tokens_missing == len(tokens) or stats.failed_batches, stats
+    print(f"{label:<34} {stats.rows:>7} {stats.rows_per_second:>9.0f} {stats.requests:>6} {stats.retries:>7} "
+          f"{stats.writes:>6} {stats.max_queue_depth:>6} {stats.backpressure_seconds:>7.2f}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.01, help="mock RPC latency per request, seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--slow-write", type=float, default=0.05, help="seconds per append in the backpressure run")
+    args = parser.parse_args()
+
+    tokens = {f"Mint{i:08d}": 10_000 + i for i in range(args.tokens)}
+    latency = ("--latency", str(args.latency), "--jitter", str(args.latency))
+    common = dict(concurrency=args.concurrency, connections_per_endpoint=args.concurrency)
+    print(f"{args.tokens} mints, {args.latency * 1000:.0f}-{args.latency * 2000:.0f} ms per RPC request, "
+          f"{args.concurrency} batches in flight")
+    print(f"{'scenario':<34} {'rows':>7} {'rows/s':>9} {'reqs':>6} {'retries':>7} {'writes':>6} {'queue':>6} {'waited':>7}")
+    for endpoints in (1, 2, 4):
+        run_scenario(f"{endpoints} endpoint(s), batch 100", tokens, endpoints, latency, batch_size=100, **common)
+    for batch_size in (1, 10):
+        run_scenario(f"2 endpoints, batch {batch_size}", tokens, 2, latency, batch_size=batch_size, **common)
+    run_scenario("2 endpoints, 5% 503s", tokens, 2, (*latency, "--error-rate", "0.05"), batch_size=100,
+                 backoff=0.01, max_retries=8, **common)
+    run_scenario("2 endpoints, 429 above 4 in flight", tokens, 2, (*latency, "--max-in-flight", "4"), batch_size=100,
+                 backoff=0.01, max_retries=20, **common)
+    run_scenario(f"slow store ({args.slow_write * 1000:.0f} ms/append), queue 4", tokens, 2, latency,
+                 sink_delay=args.slow_write, batch_size=100, queue_size=4, write_rows=1000, **common)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,371 @@
+import glob
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Mapping, Optional, Tuple
+
 import numpy as np
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.pipeline import Pipeline
-from sklearn.decomposition import PCA
-from sklearn.feature_extraction.text import TfidfVectorizer
-from src.connectors.storage.postgres_client import PostgresClient
+from sklearn.decomposition import PCA, IncrementalPCA, TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+
+if TYPE_CHECKING:
+    from src.connectors.storage.postgres_client import PostgresClient
+
+TRANSACTIONS_GLOB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+                                 "data", "raw", "solana_transactions", "*.jsonl")
+NUMERIC_COLUMNS = ['value', 'block', 'signer_count']
+
+
+def _transaction_row(record: dict) -> dict:
+    # Memo plus "key=value" tokens of the metadata object, as one text field
+    metadata = record.get('metadata') or {}
+    if isinstance(metadata, dict):
+        metadata = " ".join(f"{key}={value}" for key, value in metadata.items())
+    return {
+        'value': record.get('value'),
+        'block': record.get('block'),
+        'signer_count': len(record.get('signers') or ()),
+        'metadata': " ".join(part for part in (record.get('memo'), metadata) if part),
+    }
+
+
+def iter_transaction_chunks(pattern: str = TRANSACTIONS_GLOB, chunk_size: int = 10_000) -> Iterator[pd.DataFrame]:
+    """Stream raw transaction JSONL files as DataFrames of at most ``chunk_size`` rows
+
+    Each frame has the columns ``TransactionFeatureEngineer`` reads: value,
+    block, signer_count and metadata (memo and metadata fields as text).
+    Only one chunk of records is held at a time.
+    """
+    rows = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as transactions:
+            for line in transactions:
+                if line.strip():
+                    rows.append(_transaction_row(json.loads(line)))
+                if len(rows) == chunk_size:
+                    yield pd.DataFrame(rows)
+                    rows = []
+    if rows:
+        yield pd.DataFrame(rows)
+
+
+# The fitted engineer in each transform_parallel worker, set once by its initializer
+_worker_engineer = None
+
+
+def _init_transform_worker(engineer: "TransactionFeatureEngineer"):
+    global _worker_engineer
+    _worker_engineer = engineer
+
+
+def _transform_chunk(chunk: pd.DataFrame, start: int, out: Optional[str]) -> Tuple[int, Optional[np.ndarray]]:
+    features = _worker_engineer.transform(chunk)
+    if out is None:
+        return start, features
+    # Write straight into the parent's .npy file instead of sending the rows back
+    output = np.load(out, mmap_mode='r+')
+    output[start:start + len(features)] = features
+    output.flush()
+    return start, None
+
 
 class TransactionFeatureEngineer(BaseEstimator, TransformerMixin):
-    """Feature engineering pipeline for raw Solana transactions"""
+    """Feature engineering pipeline for raw Solana transactions
+
+    The default (dense) mode fits a TF-IDF vocabulary and a PCA on the whole
+    frame. With ``sparse=True`` the text is hashed (``HashingVectorizer``, no
+    vocabulary to fit) and reduced with a reducer that takes sparse input:
+
+    - ``reducer='ipca'``: ``IncrementalPCA``; supports ``partial_fit`` over
+      chunks (see ``fit_stream``), densifying ``ipca_batch_size`` rows of
+      ``n_hash_features`` columns at a time
+    - ``reducer='svd'``: ``TruncatedSVD`` on the sparse matrix; ``fit`` only
+
+    ``transform_chunks`` transforms a stream of chunks lazily, so with
+    ``iter_transaction_chunks`` peak memory is bounded by the chunk size.
+    ``transform_parallel`` spreads the chunks of one frame over a process pool.
+    """
     
-    def __init__(self, n_components: int = 50, text_features: bool = True):
-        self.text_pipeline = Pipeline([
-            ('tfidf', TfidfVectorizer(max_features=1000)),
-            ('pca', PCA(n_components=n_components))
-        ])
+    def __init__(self, n_components: int = 50, text_features: bool = True, sparse: bool = False,
+                 reducer: str = 'ipca', n_hash_features: int = 2 ** 10, ipca_batch_size: Optional[int] = None):
+        self.n_components = n_components
         self.text_features = text_features
+        self.sparse = sparse
+        self.reducer = reducer
+        self.n_hash_features = n_hash_features
+        self.ipca_batch_size = ipca_batch_size
+        if not sparse:
+            self.text_pipeline = Pipeline([
+                ('tfidf', TfidfVectorizer(max_features=1000)),
+                ('pca', PCA(n_components=n_components))
+            ])
+        elif reducer in ('ipca', 'svd'):
+            reduce = IncrementalPCA(n_components=n_components) if reducer == 'ipca' else TruncatedSVD(n_components=n_components)
+            self.text_pipeline = Pipeline([
+                ('hash', HashingVectorizer(n_features=n_hash_features, alternate_sign=False, norm='l2')),
+                (reducer, reduce),
+            ])
+        else:
+            raise ValueError(f"reducer must be 'ipca' or 'svd', got {reducer!r}")
         
     def fit(self, X: pd.DataFrame, y=None):
         if self.text_features:
             self.text_pipeline.fit(X['metadata'].fillna(''))
         return self
+
+    def partial_fit(self, X: pd.DataFrame, y=None):
+        """Update the reducer with one chunk (sparse mode with ``reducer='ipca'`` only)
+
+        Every chunk needs at least ``n_components`` rows; ``fit_stream``
+        takes care of that for a stream of chunks.
+        """
+        if not (self.sparse and self.reducer == 'ipca'):
+            raise ValueError("partial_fit needs sparse=True and reducer='ipca'")
+        if self.text_features:
+            hashed = self.text_pipeline.named_steps['hash'].transform(X['metadata'].fillna(''))
+            # Each IPCA update is an SVD as wide as n_hash_features, so short
+            # batches (IncrementalPCA's own default of 5 * n_components) are
+            # much cheaper than one per chunk, and densify less
+            batch_size = max(self.ipca_batch_size or 5 * self.n_components, self.n_components)
+            bounds = np.linspace(0, hashed.shape[0], max(1, hashed.shape[0] // batch_size) + 1, dtype=int)
+            ipca = self.text_pipeline.named_steps['ipca']
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                ipca.partial_fit(hashed[start:stop].toarray())
+        return self
+
+    def fit_stream(self, chunks: Iterable[pd.DataFrame]):
+        """``partial_fit`` over a stream of chunks, e.g. from ``iter_transaction_chunks``
+
+        Each chunk is fitted once the next one arrives; a chunk smaller than
+        ``n_components`` rows (like the tail of the stream) is merged into
+        the one before it, so every update is a valid IPCA batch.
+        """
+        pending = None
+        for chunk in chunks:
+            if pending is None:
+                pending = chunk
+            elif len(pending) >= self.n_components and len(chunk) >= self.n_components:
+                self.partial_fit(pending)
+                pending = chunk
+            else:
+                pending = pd.concat([pending, chunk], ignore_index=True)
+        if pending is None or len(pending) < self.n_components:
+            raise ValueError(f"Need at least n_components={self.n_components} transactions to fit")
+        self.partial_fit(pending)
+        return self
     
     def transform(self, X: pd.DataFrame) -> np.ndarray:
-        numeric_features = X[['value', 'block', 'signer_count']].values
+        numeric_features = X[NUMERIC_COLUMNS].values
         if not self.text_features:
             return numeric_features
             
-        text_features = self.text_pipeline.transform(X['metadata'].fillna(''))
+        text = X['metadata'].fillna('')
+        if self.sparse and self.reducer == 'ipca':
+            # (X - mean) @ components.T without densifying the hashed matrix
+            ipca = self.text_pipeline.named_steps['ipca']
+            hashed = self.text_pipeline.named_steps['hash'].transform(text)
+            text_features = np.asarray(hashed @ ipca.components_.T) - ipca.mean_ @ ipca.components_.T
+        else:
+            text_features = self.text_pipeline.transform(text)
         return np.hstack([numeric_features, text_features])
 
+    def transform_chunks(self, chunks: Iterable[pd.DataFrame]) -> Iterator[np.ndarray]:
+        """Transform a stream of chunks lazily, yielding one feature array per chunk"""
+        for chunk in chunks:
+            yield self.transform(chunk)
+
+    def transform_parallel(self, X: pd.DataFrame, n_jobs: Optional[int] = None, chunk_size: int = 10_000,
+                           out: Optional[str] = None) -> np.ndarray:
+        """``transform`` over chunks of ``X`` in a pool of worker processes
+
+        The fitted engineer is pickled to each worker once, by the pool's
+        initializer; tasks only carry their rows. At most two chunks per
+        worker are queued at a time, so the input isn't copied all at once.
+
+        Args:
+            X: Transactions with the columns ``transform`` reads
+            n_jobs: Worker processes, defaults to the number of CPUs
+            chunk_size: Rows per task
+            out: Path of a ``.npy`` file to write the features into; workers
+                write their rows into it directly through a memory map
+
+        Returns:
+            Array of shape (len(X), n_features), the same as ``transform(X)``;
+            a read-write memmap of ``out`` when given
+        """
+        n_features = len(NUMERIC_COLUMNS) + (self.n_components if self.text_features else 0)
+        if out is None:
+            result = np.empty((len(X), n_features))
+        else:
+            result = np.lib.format.open_memmap(out, mode='w+', dtype=np.float64, shape=(len(X), n_features))
+        columns = NUMERIC_COLUMNS + (['metadata'] if self.text_features else [])
+        n_jobs = n_jobs or os.cpu_count() or 1
+
+        def collect(done):
+            for future in done:
+                start, features = future.result()
+                if features is not None:
+                    result[start:start + len(features)] = features
+
+        # Spawned, not forked: the caller may have threads running (BLAS pools, event loops)
+        with ProcessPoolExecutor(n_jobs, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_transform_worker, initargs=(self,)) as pool:
+            pending = set()
+            for start in range(0, len(X), chunk_size):
+                if len(pending) >= 2 * n_jobs:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(_transform_chunk, X.iloc[start:start + chunk_size][columns], start, out))
+            collect(wait(pending).done)
+        if out is not None:
+            result.flush()
+        return result
+
+class FeatureCache:
+    """Bounded LRU cache of feature vectors with a TTL and hit/miss counters"""
+
+    def __init__(self, max_entries: int = 10_000, ttl: Optional[float] = 300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= self.clock():
+            del self.entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: np.ndarray):
+        expires_at = self.clock() + self.ttl if self.ttl is not None else float("inf")
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        self.entries.pop(key, None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _frozen(features: np.ndarray) -> np.ndarray:
+    # Cached vectors are handed to every caller, so they must not change under the cache
+    features = np.array(features, dtype=np.float64)
+    features.flags.writeable = False
+    return features
+
+
 class FeatureStore:
-    """Feature store for caching processed transaction features"""
-    
-    def __init__(self, db_client: PostgresClient):
+    """Feature store for caching processed transaction features
+
+    Reads go through a bounded LRU cache with a TTL (``cache.stats()`` has the
+    hit/miss counters); misses are stored in it too. ``get_features_many`` and
+    ``update_features_many`` read and upsert many addresses per query.
+    """
+
+    def __init__(self, db_client: "PostgresClient", max_entries: int = 10_000, ttl: Optional[float] = 300.0,
+                 version: str = "v2", max_batch: int = 1000):
         self.db = db_client
-        self.cache = {}
-        
+        self.cache = FeatureCache(max_entries, ttl)
+        self.version = version
+        # Addresses per SELECT / rows per INSERT in the batched calls
+        self.max_batch = max_batch
+
     async def get_features(self, token_address: str) -> np.ndarray:
         cached = self.cache.get(token_address)
-        if cached:
+        if cached is not None:
             return cached
-            
+
         query = """
             SELECT features FROM token_features 
             WHERE address = %s AND version = %s
         """
-        result = await self.db.execute(query, (token_address, "v2"))
+        result = await self.db.execute(query, (token_address, self.version))
         if result:
-            return np.frombuffer(result[0]['features'])
+            features = _frozen(np.frombuffer(result[0]['features']))
+            self.cache.put(token_address, features)
+            return features
             
         raise ValueError("Features not found in store")
 
-    async def update_features(self, token_address: str, features: np.ndarray):
-        self.cache[token_address] = features
+    async def get_features_many(self, token_addresses: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Features of many addresses, fetching all cache misses with one query per ``max_batch``
+
+        Returns:
+            Dict of address to features; addresses without stored features are left out
+        """
+        found = {}
+        missing = []
+        for address in dict.fromkeys(token_addresses):
+            cached = self.cache.get(address)
+            if cached is not None:
+                found[address] = cached
+            else:
+                missing.append(address)
+
         query = """
-            INSERT INTO token_features (address, version, features)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (address) DO UPDATE SET
-                features = EXCLUDED.features,
-                updated_at = NOW()
+            SELECT address, features FROM token_features
+            WHERE address = ANY(%s) AND version = %s
         """
-        await self.db.execute(
-            query, 
-            (token_address, "v2", features.tobytes())
-        )
+        for start in range(0, len(missing), self.max_batch):
+            rows = await self.db.execute(query, (missing[start:start + self.max_batch], self.version))
+            for row in rows or ():
+                features = _frozen(np.frombuffer(row['features']))
+                self.cache.put(row['address'], features)
+                found[row['address']] = features
+        return found
+
+    async def update_features(self, token_address: str, features: np.ndarray):
+        await self.update_features_many({token_address: features})
+
+    async def update_features_many(self, features_by_address: Mapping[str, np.ndarray]):
+        """Upsert many addresses' features, ``max_batch`` rows per INSERT"""
+        items = [(address, _frozen(features)) for address, features in features_by_address.items()]
+        for start in range(0, len(items), self.max_batch):
+            batch = items[start:start + self.max_batch]
+            values = ", ".join(["(%s, %s, %s)"] * len(batch))
+            query = f"""
+                INSERT INTO token_features (address, version, features)
+                VALUES {values}
+                ON CONFLICT (address) DO UPDATE SET
+                    features = EXCLUDED.features,
+                    updated_at = NOW()
+            """
+            params = tuple(value for address, features in batch
+                           for value in (address, self.version, features.tobytes()))
+            await self.db.execute(query, params)
+            for address, features in batch:
+                self.cache.put(address, features)
@@ -0,0 +1,137 @@
+"""
+Local stand-in for the Solana RPC endpoints the ETL reads market data from.
+
+Answers JSON-RPC requests (single or batched) for ``getTokenMarketData`` with
+a price, market cap and 24h volume per token mint that follow a random walk
+between calls. Latency, failures and overload can be dialled in, so the ETL's
+throughput, retries and backpressure can be exercised offline:
+
+- ``latency``/``jitter``: seconds added to every HTTP request
+- ``error_rate``: fraction of requests answered with 503
+- ``max_in_flight``: concurrent requests above which the server answers 429
+  with ``Retry-After``, like a rate-limited public node
+- ``missing_rate``: fraction of mints without market data (``result: null``)
+
+Standalone::
+
+    python scripts/data_processing/mock_rpc.py --port 8899 --latency 0.02 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+
+from aiohttp import web
+
+MARKET_DATA_METHOD = "getTokenMarketData"
+
+
+class MockRPC:
+    """JSON-RPC handler with deterministic per-mint market data and injectable faults."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, max_in_flight=None, missing_rate=0.0,
+                 retry_after=0.05, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_in_flight = max_in_flight
+        self.missing_rate = missing_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.in_flight = 0
+        self.prices = {}
+        self.requests = 0
+        self.calls = 0
+        self.rejected = 0
+
+    def _market_data(self, mint):
+        digest = hashlib.sha256(f"{self.seed}:{mint}".encode()).digest()
+        unit = int.from_bytes(digest[:8], "big") / 2 ** 64
+        if unit < self.missing_rate:
+            return None
+        supply = 10 ** (6 + 6 * int.from_bytes(digest[8:12], "big") / 2 ** 32)
+        price = self.prices.get(mint) or 10 ** (-6 + 8 * unit)
+        price *= math.exp(self.rng.gauss(0, 0.02))
+        self.prices[mint] = price
+        market_cap = price * supply
+        return {"price": price, "marketCap": market_cap, "volume24h": market_cap * self.rng.uniform(0.01, 0.5)}
+
+    def _answer(self, call):
+        answer = {"jsonrpc": "2.0", "id": call.get("id")}
+        if call.get("method") != MARKET_DATA_METHOD:
+            answer["error"] = {"code": -32601, "message": "Method not found"}
+        elif not call.get("params"):
+            answer["error"] = {"code": -32602, "message": "Invalid params"}
+        else:
+            answer["result"] = self._market_data(call["params"][0])
+        return answer
+
+    async def handle(self, request):
+        self.requests += 1
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            return web.json_response({"error": "Too many requests"}, status=429,
+                                     headers={"Retry-After": str(self.retry_after)})
+        self.in_flight += 1
+        try:
+            if self.latency or self.jitter:
+                await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+            if self.rng.random() < self.error_rate:
+                self.rejected += 1
+                return web.json_response({"error": "Service unavailable"}, status=503)
+            payload = await request.json()
+            calls = payload if isinstance(payload, list) else [payload]
+            self.calls += len(calls)
+            answers = [self._answer(call) for call in calls]
+            return web.json_response(answers if isinstance(payload, list) else answers[0])
+        finally:
+            self.in_flight -= 1
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/", self.handle)
+        return app
+
+
+async def start_mock_rpc(host="127.0.0.1", port=0, **options):
+    """
+    Serve a ``MockRPC`` on the running event loop.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind, 0 for any free one
+        **options: ``MockRPC`` options
+
+    Returns:
+        Tuple of the AppRunner (``await runner.cleanup()`` stops it), the
+        endpoint URL and the MockRPC, for its counters
+    """
+    mock = MockRPC(**options)
+    runner = web.AppRunner(mock.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    # (host, port) of the bound socket, so port=0 resolves to the one picked
+    port = runner.addresses[0][1]
+    return runner, f"http://{host}:{port}/", mock
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Solana RPC market data endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-in-flight", type=int)
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockRPC(args.latency, args.jitter, args.error_rate, args.max_in_flight, args.missing_rate)
+    web.run_app(mock.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
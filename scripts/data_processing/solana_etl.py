@@ -1,5 +1,453 @@
-from src.connectors.solana.rpc_client import SolanaRPCClient
+"""
+Streaming ETL of token market data from Solana RPC endpoints.
 
+Every snapshot asks the configured JSON-RPC endpoints for the price, market
+cap and 24h volume of each tracked token and appends the normalized rows, in
+the ``solprices_df`` schema (``id,timestamp,price,market_cap,volume_24h``),
+to an append-only store. The default store is the CSV the API tails, so new
+snapshots reach it through its incremental updates (see back/state.py).
+
+- Requests are JSON-RPC batches of ``batch_size`` tokens, spread over the
+  endpoints by least in-flight requests. One pooled keep-alive session is
+  shared by all of them, with at most ``connections_per_endpoint``
+  connections to each endpoint and ``concurrency`` batches in flight in total.
+- Failed batches (connection errors, timeouts, malformed bodies, 429 and
+  5xx) are retried with exponential backoff and full jitter, on another
+  endpoint where possible, honouring ``Retry-After``. An endpoint that keeps
+  failing is skipped for a cool-down. Other 4xx answers mean the request
+  itself is wrong: that batch is given up at once and the endpoint isn't
+  held responsible.
+- Fetchers hand rows to a single writer through a bounded queue. When the
+  store falls behind, the queue fills up and fetchers wait before issuing
+  more requests, so memory stays bounded by ``queue_size`` batches.
+- The writer stages a snapshot's rows in the sink, which only publishes them
+  to the store, in one append, once the whole snapshot is fetched. A reader
+  tailing the store never sees part of a snapshot as a complete one.
+
+Run against the local stand-in (mock_rpc.py) with::
+
+    python scripts/data_processing/mock_rpc.py --port 8899 &
+    python scripts/data_processing/solana_etl.py --endpoint http://127.0.0.1:8899 \\
+        --metadata back/metadata_df.csv --output /tmp/solprices_df.csv
+"""
+import argparse
 import asyncio
+import csv
+import io
+import math
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import aiohttp
+
+SOLPRICES_COLUMNS = ["id", "timestamp", "price", "market_cap", "volume_24h"]
+# JSON-RPC method returning {"price", "marketCap", "volume24h"} for a token mint
+MARKET_DATA_METHOD = "getTokenMarketData"
+# Snapshots are aligned to the 3-hour grid of solprices_df
+SNAPSHOT_SECONDS = 3 * 60 * 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """A batch failed in a way another attempt may fix."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, endpoint=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.endpoint = endpoint
+
+
+class RPCRequestError(Exception):
+    """An endpoint rejected a batch as a bad request (4xx other than 429); retrying won't help."""
+
+
+@dataclass
+class ETLStats:
+    """Counters of one snapshot (or of a whole benchmark run)."""
+    rows: int = 0
+    tokens_missing: int = 0
+    batches: int = 0
+    requests: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+    writes: int = 0
+    max_queue_depth: int = 0
+    # Seconds fetchers spent waiting for room in the write queue
+    backpressure_seconds: float = 0.0
+    seconds: float = 0.0
+    per_endpoint: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class _Endpoint:
+    url: str
+    semaphore: asyncio.Semaphore
+    in_flight: int = 0
+    failures: int = 0
+    cooling_until: float = 0.0
+
+
+class RPCEndpointPool:
+    """
+    JSON-RPC batches over a pooled session shared by several endpoints.
+
+    Each call goes to the endpoint with the fewest requests in flight among
+    those not cooling down. An endpoint's connections (and concurrent
+    requests) are capped by ``connections_per_endpoint``; after
+    ``max_failures`` consecutive failures it is skipped for ``cooldown``
+    seconds.
+    """
+
+    def __init__(self, endpoints: Sequence[str], connections_per_endpoint: int = 8, timeout: float = 10.0,
+                 max_failures: int = 3, cooldown: float = 5.0):
+        if not endpoints:
+            raise ValueError("At least one RPC endpoint is required")
+        self.endpoints = [_Endpoint(url, asyncio.Semaphore(connections_per_endpoint)) for url in endpoints]
+        self.connections_per_endpoint = connections_per_endpoint
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.request_ids = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.connections_per_endpoint * len(self.endpoints),
+            limit_per_host=self.connections_per_endpoint,
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    def _pick(self, avoid: Optional[_Endpoint] = None) -> _Endpoint:
+        now = time.monotonic()
+        available = [endpoint for endpoint in self.endpoints if endpoint.cooling_until <= now] or self.endpoints
+        if avoid is not None and len(available) > 1:
+            available = [endpoint for endpoint in available if endpoint is not avoid]
+        return min(available, key=lambda endpoint: endpoint.in_flight)
+
+    async def call_batch(self, method: str, params: Sequence[list], avoid: Optional[_Endpoint] = None):
+        """
+        Send one JSON-RPC batch of ``method`` calls.
+
+        Args:
+            method: JSON-RPC method of every call
+            params: Params list of each call
+            avoid: Endpoint to steer away from (the one that just failed)
+
+        Returns:
+            Tuple of the endpoint used and the list of results (None where the
+            call returned an error), in ``params`` order
+
+        Raises:
+            RetryableError: On connection errors, timeouts, malformed bodies,
+                429 and 5xx answers
+            RPCRequestError: On any other 4xx answer
+        """
+        endpoint = self._pick(avoid)
+        first_id = self.request_ids
+        self.request_ids += len(params)
+        payload = [
+            {"jsonrpc": "2.0", "id": first_id + offset, "method": method, "params": call_params}
+            for offset, call_params in enumerate(params)
+        ]
+        endpoint.in_flight += 1
+        try:
+            async with endpoint.semaphore:
+                async with self.session.post(endpoint.url, json=payload) as response:
+                    if response.status in RETRY_STATUSES:
+                        retry_after = response.headers.get("Retry-After")
+                        raise RetryableError(f"{endpoint.url} answered {response.status}",
+                                             float(retry_after) if retry_after else None, endpoint)
+                    if 400 <= response.status < 500:
+                        # The endpoint is fine, the request isn't: not its failure
+                        raise RPCRequestError(f"{endpoint.url} answered {response.status}")
+                    response.raise_for_status()
+                    answers = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, RetryableError) as exc:
+            endpoint.failures += 1
+            if endpoint.failures >= self.max_failures:
+                endpoint.cooling_until = time.monotonic() + self.cooldown
+            if isinstance(exc, RetryableError):
+                raise
+            raise RetryableError(f"{endpoint.url}: {exc!r}", endpoint=endpoint) from exc
+        finally:
+            endpoint.in_flight -= 1
+        endpoint.failures = 0
+
+        by_id = {answer.get("id"): answer for answer in answers} if isinstance(answers, list) else {}
+        return endpoint, [by_id.get(first_id + offset, {}).get("result") for offset in range(len(params))]
+
+
+def snapshot_time(now: Optional[float] = None) -> str:
+    """Start of the current 3-hour snapshot (UTC), formatted like ``solprices_df.csv``."""
+    now = time.time() if now is None else now
+    aligned = int(now // SNAPSHOT_SECONDS * SNAPSHOT_SECONDS)
+    return datetime.fromtimestamp(aligned, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def normalize(token_id: int, timestamp: str, result: Optional[dict]) -> Optional[list]:
+    """
+    Row in the ``solprices_df`` schema from one market data result.
+
+    Returns:
+        ``[id, timestamp, price, market_cap, volume_24h]``, or None when the
+        token has no (finite, positive) price
+    """
+    if not result:
+        return None
+    try:
+        price = float(result["price"])
+        market_cap = float(result.get("marketCap") or 0.0)
+        volume = float(result.get("volume24h") or 0.0)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not math.isfinite(price) or price <= 0:
+        return None
+    return [token_id, timestamp, price,
+            market_cap if math.isfinite(market_cap) else 0.0,
+            volume if math.isfinite(volume) else 0.0]
+
+
+class CSVPriceSink:
+    """
+    Append-only CSV store in the ``solprices_df`` schema.
+
+    ``write`` stages rows in ``<path>.staging``; ``commit`` appends everything
+    staged to the store in one ``write`` call and then records the store's
+    size in ``<path>.committed``, the end-of-snapshot marker the API's tailer
+    reads up to (see back/state.py), and ``discard`` drops rows staged by a
+    snapshot that didn't finish. The header is written when the store is new.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.staging_path = f"{path}.staging"
+        self.committed_path = f"{path}.committed"
+        self.fsync = fsync
+
+    def write(self, rows: List[list]):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        with open(self.staging_path, "a", newline="") as staging:
+            staging.write(buffer.getvalue())
+
+    def commit(self):
+        if not os.path.exists(self.staging_path):
+            return
+        with open(self.staging_path, newline="") as staging:
+            staged = staging.read()
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            staged = ",".join(SOLPRICES_COLUMNS) + "\n" + staged
+        with open(self.path, "a", newline="") as store:
+            store.write(staged)
+            store.flush()
+            if self.fsync:
+                os.fsync(store.fileno())
+            size = os.fstat(store.fileno()).st_size
+        tmp_path = f"{self.committed_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as marker:
+            marker.write(str(size))
+        os.replace(tmp_path, self.committed_path)
+        os.remove(self.staging_path)
+
+    def discard(self):
+        if os.path.exists(self.staging_path):
+            os.remove(self.staging_path)
+
+
 class SolanaETL:
-    def __init__(self, rpc_endpoints):
+    """
+    Fetches market snapshots of the tracked tokens and streams them into a sink.
+
+    Args:
+        rpc_endpoints: JSON-RPC endpoint URLs
+        tokens: Dict of token mint address to the ``id`` used in ``solprices_df``
+        sink: Object with blocking ``write(rows)``, ``commit()`` and ``discard()`` (see
+            ``CSVPriceSink``); runs in a worker thread
+        batch_size: Tokens per JSON-RPC batch
+        concurrency: Batches in flight across all endpoints
+        connections_per_endpoint: Pooled connections (and in-flight requests) per endpoint
+        queue_size: Batches of rows buffered for the writer before fetchers wait
+        write_rows: Rows the writer gathers before staging them in the sink
+        max_retries: Attempts per batch after the first one
+        backoff: Base delay of the exponential backoff, in seconds
+        max_backoff: Cap of a single backoff delay
+        method: JSON-RPC method returning a token's market data
+    """
+
+    def __init__(self, rpc_endpoints: Sequence[str], tokens: Dict[str, int], sink, batch_size: int = 100,
+                 concurrency: int = 16, connections_per_endpoint: int = 8, queue_size: int = 64,
+                 write_rows: int = 5000, max_retries: int = 5, backoff: float = 0.1, max_backoff: float = 5.0,
+                 method: str = MARKET_DATA_METHOD, timeout: float = 10.0):
+        self.rpc_endpoints = list(rpc_endpoints)
+        self.tokens = tokens
+        self.sink = sink
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.connections_per_endpoint = connections_per_endpoint
+        self.queue_size = queue_size
+        self.write_rows = write_rows
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.method = method
+        self.timeout = timeout
+
+    @classmethod
+    def from_metadata(cls, rpc_endpoints: Sequence[str], metadata_path: str, sink, **options):
+        """ETL for every token of a ``metadata_df.csv`` that has a mint address."""
+        with open(metadata_path, newline="") as metadata_file:
+            tokens = {row["token_address"]: int(row["id"]) for row in csv.DictReader(metadata_file) if row.get("token_address")}
+        return cls(rpc_endpoints, tokens, sink, **options)
+
+    def _batches(self) -> Iterable[list]:
+        items = list(self.tokens.items())
+        for start in range(0, len(items), self.batch_size):
+            yield items[start:start + self.batch_size]
+
+    async def _fetch_batch(self, pool: RPCEndpointPool, batch: list, stats: ETLStats):
+        params = [[address] for address, _ in batch]
+        avoid = None
+        for attempt in range(self.max_retries + 1):
+            stats.requests += 1
+            try:
+                endpoint, results = await pool.call_batch(self.method, params, avoid)
+            except RetryableError as exc:
+                if attempt == self.max_retries:
+                    raise
+                stats.retries += 1
+                avoid = exc.endpoint
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                await asyncio.sleep(max(delay, exc.retry_after or 0.0))
+                continue
+            stats.per_endpoint[endpoint.url] = stats.per_endpoint.get(endpoint.url, 0) + 1
+            return results
+
+    async def _fetcher(self, pool: RPCEndpointPool, batches, queue: asyncio.Queue, timestamp: str, stats: ETLStats):
+        for batch in batches:
+            try:
+                results = await self._fetch_batch(pool, batch, stats)
+            except (RetryableError, RPCRequestError) as exc:
+                stats.failed_batches += 1
+                print(f"Giving up on a batch of {len(batch)} tokens: {exc}")
+                continue
+            stats.batches += 1
+            rows = []
+            for (_, token_id), result in zip(batch, results):
+                row = normalize(token_id, timestamp, result)
+                if row is None:
+                    stats.tokens_missing += 1
+                else:
+                    rows.append(row)
+            if not rows:
+                continue
+            if queue.full():
+                start = time.perf_counter()
+                await queue.put(rows)
+                stats.backpressure_seconds += time.perf_counter() - start
+            else:
+                queue.put_nowait(rows)
+            stats.max_queue_depth = max(stats.max_queue_depth, queue.qsize())
+
+    async def _writer(self, queue: asyncio.Queue, stats: ETLStats):
+        pending = []
+        while True:
+            rows = await queue.get()
+            done = rows is None
+            if not done:
+                pending.extend(rows)
+            # Gather whatever is already queued into one append
+            while not done and len(pending) < self.write_rows and not queue.empty():
+                rows = queue.get_nowait()
+                done = rows is None
+                if not done:
+                    pending.extend(rows)
+            if pending:
+                await asyncio.to_thread(self.sink.write, pending)
+                stats.rows += len(pending)
+                stats.writes += 1
+                pending = []
+            if done:
+                return
+
+    async def run_snapshot(self, timestamp: Optional[str] = None) -> ETLStats:
+        """
+        Fetch every token once and append the rows under one snapshot timestamp.
+
+        The rows reach the store in one commit at the end; a snapshot that
+        fails part way leaves nothing behind.
+
+        Args:
+            timestamp: Snapshot time as written to the store; defaults to the
+                start of the current 3-hour snapshot
+
+        Returns:
+            ETLStats of the snapshot
+        """
+        timestamp = timestamp or snapshot_time()
+        stats = ETLStats()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        batches = iter(self._batches())
+        start = time.perf_counter()
+        pool = RPCEndpointPool(self.rpc_endpoints, self.connections_per_endpoint, self.timeout)
+        # Rows staged by an earlier snapshot that failed part way
+        await asyncio.to_thread(self.sink.discard)
+        async with pool:
+            writer = asyncio.create_task(self._writer(queue, stats))
+            # Fetchers share one iterator of batches, so at most ``concurrency`` are in flight
+            fetchers = [asyncio.create_task(self._fetcher(pool, batches, queue, timestamp, stats))
+                        for _ in range(self.concurrency)]
+            try:
+                await asyncio.gather(*fetchers)
+                await queue.put(None)
+                await writer
+                await asyncio.to_thread(self.sink.commit)
+            finally:
+                # If one task failed, don't leave the others running against a closed pool
+                for task in (*fetchers, writer):
+                    task.cancel()
+                await asyncio.gather(*fetchers, writer, return_exceptions=True)
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    async def run(self, interval: float = SNAPSHOT_SECONDS):
+        """Take a snapshot every ``interval`` seconds, aligned to the snapshot grid."""
+        while True:
+            stats = await self.run_snapshot()
+            print(f"Appended {stats.rows} rows in {stats.seconds:.1f}s ({stats.rows_per_second:.0f} rows/s, "
+                  f"{stats.retries} retries, {stats.tokens_missing} tokens without data)")
+            await asyncio.sleep(interval - time.time() % interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream token market data from Solana RPC endpoints into solprices_df.csv")
+    parser.add_argument("--endpoint", action="append", required=True, help="JSON-RPC endpoint URL (repeatable)")
+    parser.add_argument("--metadata", required=True, help="metadata_df.csv with the id and token_address of each token")
+    parser.add_argument("--output", required=True, help="solprices_df.csv to append to")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--once", action="store_true", help="take a single snapshot and exit")
+    args = parser.parse_args()
+
+    etl = SolanaETL.from_metadata(args.endpoint, args.metadata, CSVPriceSink(args.output),
+                                  batch_size=args.batch_size, concurrency=args.concurrency)
+    if args.once:
+        stats = asyncio.run(etl.run_snapshot())
+        print(f"Appended {stats.rows} rows in {stats.seconds:.2f}s ({stats.rows_per_second:.0f} rows/s)")
+    else:
+        asyncio.run(etl.run())
+
+
+if __name__ == "__main__":
+    main()